@@ -1,7 +1,7 @@
 from aiogram import Router, types, F
 from aiogram.filters import Command
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 import json
+from bot.locales import locales, MEDALS
 
 router = Router()
 db = None
@@ -12,147 +12,72 @@ async def cmd_start(message: types.Message):
     
     if not user:
         # Выбор языка для новых пользователей
-        mk = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text="🇷🇺 Русский",
-                    callback_data="ru"
-                ),
-                InlineKeyboardButton(
-                    text="🇺🇸 English",
-                    callback_data="en"
-                )
-            ]
-        ])
-        await message.answer("🇷🇺 Выберите язык:\n🇺🇸 Choose language:", reply_markup=mk)
+        await message.answer(locales.choose_text, reply_markup=locales.choose_keyboard)
     else:
-        # Кнопка для открытия Mini App
-        webapp_url = "https://your-domain.com/webapp"  # Замените на ваш URL
-        
-        webapp_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text="🎮 Играть",
-                    web_app=WebAppInfo(url=webapp_url)
-                )
-            ],
-            [
-                InlineKeyboardButton(
-                    text="📊 Статистика",
-                    callback_data="stats"
-                ),
-                InlineKeyboardButton(
-                    text="🏆 Рейтинг",
-                    callback_data="leaderboard"
-                )
-            ]
-        ])
-        
-        if user[1] == "ru":
-            await message.answer(
-                f"🎲 С возвращением, {message.from_user.first_name}!\n\n"
-                f"Выберите действие:",
-                reply_markup=webapp_keyboard
-            )
-        elif user[1] == "en":
-            await message.answer(
-                f"🎲 Welcome back, {message.from_user.first_name}!\n\n"
-                f"Choose an action:",
-                reply_markup=webapp_keyboard
-            )
+        locale = locales.for_user(user)
+        await message.answer(
+            locale.text('menu', name=message.from_user.first_name),
+            reply_markup=locale.keyboards['menu']
+        )
 
-@router.callback_query(lambda c: c.data in ["ru", "en"])
+@router.callback_query(lambda c: c.data in locales)
 async def set_language(callback: types.CallbackQuery):
     await db.add_user(callback.from_user.id, callback.data)
     
-    # Кнопка для открытия Mini App
-    webapp_url = "https://your-domain.com/webapp"  # Замените на ваш URL
-    
-    webapp_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(
-                text="🎮 Играть" if callback.data == "ru" else "🎮 Play",
-                web_app=WebAppInfo(url=webapp_url)
-            )
-        ]
-    ])
-    
     if callback.message:
-        if callback.data == "ru":
-            await callback.message.answer(
-                "✅ Язык установлен на русский\n\n"
-                "Нажмите кнопку ниже, чтобы начать играть!",
-                reply_markup=webapp_keyboard
-            )
-        elif callback.data == "en":
-            await callback.message.answer(
-                "✅ Language set to English\n\n"
-                "Press the button below to start playing!",
-                reply_markup=webapp_keyboard
-            )
+        locale = locales.get(callback.data)
+        await callback.message.answer(locale.text('language_ready'), reply_markup=locale.keyboards['play'])
     
     await callback.answer()
 
 @router.callback_query(lambda c: c.data == "stats")
 async def show_stats(callback: types.CallbackQuery):
     stats = await db.get_user_stats(callback.from_user.id)
+    rank = await db.get_user_rank(callback.from_user.id)
+    locale = locales.for_user(await db.get_user(callback.from_user.id))
     
     if stats:
-        await callback.message.answer(
-            f"📊 Ваша статистика:\n\n"
-            f"🏆 Побед: {stats['wins']}\n"
-            f"😔 Поражений: {stats['losses']}\n"
-            f"🤝 Ничьих: {stats['draws']}\n"
-            f"⭐ Рейтинг: {stats['rating']}\n"
-            f"🎮 Всего игр: {stats['total_games']}"
-        )
+        await callback.message.answer(locale.text('stats', rank=rank or '-', **stats))
     else:
-        await callback.message.answer("Статистика пока пуста. Сыграйте первую игру!")
+        await callback.message.answer(locale.text('stats_empty'))
     
     await callback.answer()
 
 @router.callback_query(lambda c: c.data == "leaderboard")
 async def show_leaderboard(callback: types.CallbackQuery):
     top_players = await db.get_leaderboard(limit=10)
+    locale = locales.for_user(await db.get_user(callback.from_user.id))
     
     if top_players:
-        text = "🏆 Топ-10 игроков:\n\n"
+        text = locale.text('leaderboard_title')
         for i, player in enumerate(top_players, 1):
-            emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-            text += f"{emoji} {player['username']} - {player['rating']} ⭐\n"
+            place = MEDALS[i - 1] if i <= len(MEDALS) else f"{i}."
+            text += locale.text('leaderboard_row', place=place, username=player['username'], rating=player['rating'])
         
         await callback.message.answer(text)
     else:
-        await callback.message.answer("Рейтинг пока пуст!")
+        await callback.message.answer(locale.text('leaderboard_empty'))
     
     await callback.answer()
 
 # Обработка данных от WebApp
 @router.message(F.web_app_data)
 async def handle_webapp_data(message: types.Message):
+    locale = locales.for_user(await db.get_user(message.from_user.id))
     try:
         data = json.loads(message.web_app_data.data)
         action = data.get('action')
         
         if action == 'game_completed':
-            # Обновляем статистику после игры
-            result = data.get('result')
-            await db.update_stats(message.from_user.id, result)
+            # Результат и рейтинг уже записал сервер игр, присланным данным не верим
+            stats = await db.get_user_stats(message.from_user.id)
             
-            await message.answer(
-                f"✅ Игра завершена!\n"
-                f"Результат: {result.get('outcome')}\n"
-                f"Рейтинг: {result.get('rating_change', 0):+d}"
-            )
+            await message.answer(locale.text('game_completed', rating=stats['rating'] if stats else 1000))
         
         elif action == 'share_game':
             game_code = data.get('code')
-            await message.answer(
-                f"🎮 Приглашение в игру!\n"
-                f"Код: {game_code}\n\n"
-                f"Друг может присоединиться, введя этот код в приложении."
-            )
+            await message.answer(locale.text('game_invite', code=game_code))
     
     except Exception as e:
         print(f"Error handling webapp data: {e}")
-        await message.answer("Произошла ошибка при обработке данных.")
\ No newline at end of file
+        await message.answer(locale.text('error'))
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""
+Память на одну активную игру: старые вложенные словари против Game.
+Запуск из backend/: python -m benchmarks.game_memory
+"""
+import tracemalloc
+from datetime import datetime
+
+from games.models import Game, Player, Board
+
+GAMES = 10000
+
+BOARD = [
+    ['r', 'n', 'b', 'q', 'k', 'b', 'n', 'r'],
+    ['p', 'p', 'p', 'p', 'p', 'p', 'p', 'p'],
+    [' ', ' ', ' ', ' ', ' ', ' ', ' ', ' '],
+    [' ', ' ', ' ', ' ', 'P', ' ', ' ', ' '],
+    [' ', ' ', ' ', ' ', ' ', ' ', ' ', ' '],
+    [' ', ' ', ' ', ' ', ' ', ' ', ' ', ' '],
+    ['P', 'P', 'P', 'P', ' ', 'P', 'P', 'P'],
+    ['R', 'N', 'B', 'Q', 'K', 'B', 'N', 'R']
+]
+
+
+def dict_game(i):
+    # Ход приходит из JSON, поэтому доска - новые списки на каждую игру
+    board = [list(''.join(row)) for row in BOARD]
+    return {
+        'id': f'chess_{i}',
+        'type': 'chess',
+        'player1': {'id': i, 'username': f'Player{i}'},
+        'player2': {'id': i + 1, 'username': f'Player{i + 1}'},
+        'status': 'active',
+        'currentPlayer': i,
+        'created_at': datetime.now().isoformat(),
+        'state': {'from': {'row': 6, 'col': 4}, 'to': {'row': 4, 'col': 4}, 'board': board}
+    }
+
+
+def slotted_game(i):
+    game = Game(f'chess_{i}', 'chess', Player(i), Player(i + 1), status='active', current_player=i)
+    game.board = Board.from_rows(BOARD)
+    game.last_move = {'from': {'row': 6, 'col': 4}, 'to': {'row': 4, 'col': 4}}
+    return game
+
+
+def measure(factory):
+    tracemalloc.start()
+    games = [factory(i) for i in range(GAMES)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del games
+    return size / GAMES
+
+
+if __name__ == "__main__":
+    before = measure(dict_game)
+    after = measure(slotted_game)
+    print(f"dict:  {before:.0f} байт на игру")
+    print(f"Game:  {after:.0f} байт на игру")
+    print(f"экономия: {1 - after / before:.0%}")
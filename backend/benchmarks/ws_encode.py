@@ -0,0 +1,51 @@
+"""
+Стоимость кодирования исходящих сообщений WebSocket.
+Было: send_json на каждого получателя (json.dumps как в Starlette).
+Стало: один Encoded на рассылку, orjson если установлен.
+Запуск из backend/: python -m benchmarks.ws_encode
+"""
+import json
+import timeit
+
+from games.moves import initial_board
+from realtime import codec
+from realtime.codec import Encoded
+
+RUNS = 20000
+
+MESSAGES = {
+    'opponent_move': {
+        'type': 'opponent_move',
+        'move': {'from': {'row': 6, 'col': 4}, 'to': {'row': 4, 'col': 4}, 'seq': 1, 'hash': 2899473311}
+    },
+    'game_sync': {
+        'type': 'game_sync',
+        'state': {'board': initial_board('chess').to_rows(), 'seq': 12, 'currentPlayer': 1}
+    },
+    'chat_message': {'type': 'chat_message', 'sender': 'Player1', 'text': 'Хорошая партия!'},
+}
+
+
+def starlette_send_json(message, recipients):
+    for _ in range(recipients):
+        json.dumps(message, separators=(',', ':'), ensure_ascii=False)
+
+
+def encode_once(message, recipients):
+    encoded = Encoded(message)
+    for _ in range(recipients):
+        encoded.text
+
+
+def report(name, message, recipients):
+    before = timeit.timeit(lambda: starlette_send_json(message, recipients), number=RUNS) / RUNS
+    after = timeit.timeit(lambda: encode_once(message, recipients), number=RUNS) / RUNS
+    print(f"{name:14} x{recipients}: {before * 1e6:6.2f} мкс -> {after * 1e6:6.2f} мкс ({before / after:.1f}x)")
+
+
+if __name__ == "__main__":
+    print(f"orjson: {'да' if codec.orjson else 'нет'}, msgpack: {'да' if codec.msgpack else 'нет'}")
+    for name, message in MESSAGES.items():
+        # 1 - личное сообщение, 2 - рассылка обоим игрокам
+        for recipients in (1, 2):
+            report(name, message, recipients)
@@ -0,0 +1,41 @@
+"""
+Клиент Bot API и диспетчер для бота в обоих режимах.
+TELEGRAM_API_URL направляет запросы на свой Bot API сервер или на локальную
+заглушку Telegram, запросы в чаты идут через SendScheduler.
+"""
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.client.telegram import TelegramAPIServer
+
+from config import BOT_TOKEN, TELEGRAM_API_URL
+
+
+class SendLimiter(BaseRequestMiddleware):
+    """Запросы с chat_id - через планировщик, остальные (getMe, answerCallbackQuery...) - сразу"""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            return await make_request(bot, method)
+        return await self.scheduler.submit(chat_id, lambda: make_request(bot, method))
+
+
+def create_bot(token=BOT_TOKEN, api_url=TELEGRAM_API_URL, scheduler=None):
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api_url)) if api_url else AiohttpSession()
+    if scheduler is not None:
+        session.middleware(SendLimiter(scheduler))
+    return Bot(token=token, session=session)
+
+
+def create_dispatcher(db):
+    """Обработчики бота поверх базы бота: одинаковые в polling и webhook"""
+    from handlers import start
+
+    start.db = db
+    dp = Dispatcher()
+    dp.include_router(start.router)
+    return dp
@@ -0,0 +1,84 @@
+"""
+Тексты и клавиатуры бота на всех языках.
+
+Все загружается один раз при импорте из locales/<язык>.json, клавиатуры
+собираются сразу и потом переиспользуются. Новый язык - новый файл,
+код не меняется. На каждый запрос форматируются только поля
+пользователя (имя, статистика).
+"""
+import json
+import os
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+
+from config import DEFAULT_LANGUAGE, WEBAPP_URL
+
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'locales')
+MEDALS = ("🥇", "🥈", "🥉")
+
+
+def build_keyboard(rows):
+    """Клавиатура из описания: {'text', 'callback'} или {'text', 'web_app': true}"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [
+            InlineKeyboardButton(text=button['text'], web_app=WebAppInfo(url=WEBAPP_URL))
+            if button.get('web_app') else
+            InlineKeyboardButton(text=button['text'], callback_data=button['callback'])
+            for button in row
+        ]
+        for row in rows
+    ])
+
+
+class Locale:
+    __slots__ = ('code', 'name', 'texts', 'keyboards')
+
+    def __init__(self, code, data):
+        self.code = code
+        self.name = data['name']
+        self.texts = data['texts']
+        self.keyboards = {name: build_keyboard(rows) for name, rows in data['keyboards'].items()}
+
+    def text(self, key, **fields):
+        text = self.texts[key]
+        return text.format(**fields) if fields else text
+
+
+class Locales:
+    def __init__(self, locales, default=DEFAULT_LANGUAGE):
+        # Порядок языков - как в кнопках выбора языка
+        self.locales = locales
+        self.default = locales[default] if default in locales else next(iter(locales.values()))
+        # Выбор языка для новых пользователей - сразу на всех языках
+        self.choose_text = "\n".join(locale.text('choose_language') for locale in locales.values())
+        self.choose_keyboard = InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text=locale.name, callback_data=code)
+            for code, locale in locales.items()
+        ]])
+
+    @classmethod
+    def load(cls, directory=LOCALES_DIR, default=DEFAULT_LANGUAGE):
+        locales = {}
+        # Язык по умолчанию первым, остальные по алфавиту
+        names = sorted(os.listdir(directory), key=lambda name: (name != f"{default}.json", name))
+        for name in names:
+            code, ext = os.path.splitext(name)
+            if ext != '.json':
+                continue
+            with open(os.path.join(directory, name), encoding='utf-8') as f:
+                locales[code] = Locale(code, json.load(f))
+        return cls(locales, default)
+
+    def __contains__(self, code):
+        return code in self.locales
+
+    def get(self, code):
+        """Язык по коду, неизвестный или пустой - язык по умолчанию"""
+        return self.locales.get(code, self.default)
+
+    def for_user(self, user):
+        """Язык пользователя по строке users (язык - второй столбец)"""
+        return self.get(user[1] if user else None)
+
+
+locales = Locales.load()
@@ -0,0 +1,256 @@
+"""
+Планировщик исходящих запросов бота к Telegram.
+
+Telegram ограничивает отправку (около 30 сообщений в секунду на бота и
+около одного в секунду в чат), сверх лимита отвечает 429 с retry_after.
+Запросы с chat_id идут через SendScheduler:
+  - общее ведро токенов и ведро на каждый чат;
+  - полосы приоритета: ответы пользователю (INTERACTIVE) уходят раньше
+    рассылок (BULK, внутри with bulk():);
+  - в полосе чаты идут по кругу, у одного чата - один запрос в полете,
+    порядок запросов чата сохраняется;
+  - 429 останавливает только свой чат на retry_after, запрос повторяется первым.
+Пакетной отправки в Bot API нет: планировщик отправляет запросы по одному,
+не дожидаясь ответов на предыдущие.
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import time
+from collections import deque
+
+from config import SEND_GLOBAL_RATE, SEND_CHAT_RATE, SEND_CHAT_BURST, SEND_MAX_RETRIES
+
+INTERACTIVE = 0
+BULK = 1
+LANES = (INTERACTIVE, BULK)
+# Раз в столько секунд забываются чаты без запросов
+PRUNE_INTERVAL = 60
+
+# Полоса запросов текущей задачи
+send_lane = contextvars.ContextVar('send_lane', default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def bulk():
+    """Запросы внутри блока - рассылка, пропускают ответы пользователям вперед"""
+    token = send_lane.set(BULK)
+    try:
+        yield
+    finally:
+        send_lane.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst, now=None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Через сколько секунд будет токен, 0 - есть сейчас"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def full(self, now):
+        self._refill(now)
+        return self.tokens >= self.burst
+
+
+class _Chat:
+    __slots__ = ('id', 'bucket', 'jobs', 'queued', 'busy', 'blocked_until')
+
+    def __init__(self, chat_id, bucket):
+        self.id = chat_id
+        self.bucket = bucket
+        # Запросы по полосам: [call, future, попытки]
+        self.jobs = [deque() for _ in LANES]
+        # Чат стоит в очереди полосы
+        self.queued = [False for _ in LANES]
+        # Запрос чата в полете
+        self.busy = False
+        # До этого момента чат не отправляет (ведро пусто или 429)
+        self.blocked_until = 0.0
+
+
+class SendScheduler:
+    def __init__(self, rate=SEND_GLOBAL_RATE, chat_rate=SEND_CHAT_RATE,
+                 chat_burst=SEND_CHAT_BURST, max_retries=SEND_MAX_RETRIES):
+        # Общий лимит без запаса: в любом окне в секунду не больше rate запросов
+        self.bucket = TokenBucket(rate, 1)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._chats = {}
+        # Полоса -> чаты, готовые отправлять
+        self._lanes = [deque() for _ in LANES]
+        # Заблокированные чаты: (момент пробуждения, n, chat_id)
+        self._sleeping = []
+        self._order = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._pending = 0
+        self._inflight = set()
+        self._pruned = time.monotonic()
+        self._task = None
+
+    def __len__(self):
+        return self._pending
+
+    async def submit(self, chat_id, call, priority=None):
+        """
+        Выполнить запрос в свою очередь и вернуть его результат.
+        call - функция без аргументов, возвращающая корутину запроса (для повторов)
+        """
+        priority = send_lane.get() if priority is None else priority
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = self._chats[chat_id] = _Chat(chat_id, TokenBucket(self.chat_rate, self.chat_burst))
+        future = asyncio.get_running_loop().create_future()
+        chat.jobs[priority].append([call, future, 0])
+        self._pending += 1
+        self._activate(chat, time.monotonic())
+        return await future
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        tasks = list(self._inflight)
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for chat in self._chats.values():
+            for jobs in chat.jobs:
+                for _, future, _ in jobs:
+                    future.cancel()
+        self._chats.clear()
+        self._pending = 0
+
+    def _activate(self, chat, now):
+        """Поставить чат в очереди полос, где у него есть запросы"""
+        if chat.busy or chat.blocked_until > now:
+            return
+        for lane in LANES:
+            if chat.jobs[lane] and not chat.queued[lane]:
+                chat.queued[lane] = True
+                self._lanes[lane].append(chat.id)
+        self._wakeup.set()
+
+    def _block(self, chat, until):
+        chat.blocked_until = until
+        heapq.heappush(self._sleeping, (until, next(self._order), chat.id))
+
+    def _next_chat(self, now):
+        """Первый чат, готовый отправлять, по приоритету полос: (чат, полоса) или None"""
+        for lane in LANES:
+            chats = self._lanes[lane]
+            while chats:
+                chat = self._chats.get(chats[0])
+                if chat is None:
+                    chats.popleft()
+                    continue
+                jobs = chat.jobs[lane]
+                # Отправитель больше не ждет ответа
+                while jobs and jobs[0][1].done():
+                    jobs.popleft()
+                    self._pending -= 1
+                if not jobs or chat.busy or chat.blocked_until > now:
+                    # Вернется в очередь, когда освободится
+                    chats.popleft()
+                    chat.queued[lane] = False
+                    continue
+                wait = chat.bucket.delay(now)
+                if wait > 0:
+                    chats.popleft()
+                    chat.queued[lane] = False
+                    self._block(chat, now + wait)
+                    continue
+                return chat, lane
+        return None
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._sleeping and self._sleeping[0][0] <= now:
+                _, _, chat_id = heapq.heappop(self._sleeping)
+                chat = self._chats.get(chat_id)
+                if chat is not None:
+                    self._activate(chat, now)
+            if now - self._pruned >= PRUNE_INTERVAL:
+                self._prune(now)
+
+            found = self._next_chat(now)
+            if found is None:
+                timeout = self._sleeping[0][0] - now if self._sleeping else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            wait = self.bucket.delay(now)
+            if wait > 0:
+                # Общий лимит: чат остается первым, за это время может прийти запрос важнее
+                await asyncio.sleep(wait)
+                continue
+
+            chat, lane = found
+            self._lanes[lane].popleft()
+            chat.queued[lane] = False
+            self.bucket.take(now)
+            chat.bucket.take(now)
+            chat.busy = True
+            task = asyncio.create_task(self._send(chat, lane, chat.jobs[lane].popleft()))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, chat, lane, job):
+        call, future, attempts = job
+        try:
+            result = await call()
+        except Exception as e:
+            retry_after = getattr(e, 'retry_after', None)
+            if retry_after is not None and attempts < self.max_retries and not future.done():
+                # 429: чат ждет retry_after, запрос повторится первым в своей полосе
+                job[2] += 1
+                chat.jobs[lane].appendleft(job)
+                chat.busy = False
+                self._block(chat, time.monotonic() + retry_after)
+                self._wakeup.set()
+                return
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        self._pending -= 1
+        chat.busy = False
+        self._activate(chat, time.monotonic())
+
+    def _prune(self, now):
+        """Забыть чаты без запросов с полным ведром - их состояние не нужно"""
+        self._pruned = now
+        idle = [
+            chat_id for chat_id, chat in self._chats.items()
+            if not chat.busy and not any(chat.jobs) and chat.blocked_until <= now and chat.bucket.full(now)
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
@@ -0,0 +1,100 @@
+"""
+Пул обработки обновлений бота.
+
+Обновления одного чата выполняются строго по очереди, разные чаты -
+параллельно, но не больше workers сразу. Чат с очередью стоит в общей
+очереди готовых ровно один раз; после каждого обновления он уходит
+в ее конец, поэтому медленный чат не задерживает остальные.
+"""
+import asyncio
+from collections import deque
+
+from config import BOT_WORKERS, BOT_QUEUE_SIZE, BOT_DRAIN_TIMEOUT
+
+
+def update_chat_id(update):
+    """Чат (или пользователь) обновления Telegram по сырому JSON, None - не определить"""
+    for field, value in update.items():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get('chat') or (value.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+        user = value.get('from') or value.get('user')
+        if user:
+            return user['id']
+    return None
+
+
+class UpdatePool:
+    def __init__(self, handler=None, workers=BOT_WORKERS, maxsize=BOT_QUEUE_SIZE):
+        # async handler(update)
+        self.handler = handler
+        self.workers = workers
+        # Максимум принятых, но еще не обработанных обновлений
+        self.maxsize = maxsize
+        # chat_id -> очередь обновлений; первое в очереди сейчас обрабатывается
+        self._chats = {}
+        self._ready = asyncio.Queue()
+        self._pending = 0
+        self._tasks = []
+        # Пул останавливается: новые обновления не принимаются
+        self._closing = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def __len__(self):
+        return self._pending
+
+    def submit(self, chat_id, update):
+        """Принять обновление; False - пул переполнен или останавливается"""
+        if self._closing or self._pending >= self.maxsize:
+            return False
+        self._pending += 1
+        self._idle.clear()
+        queue = self._chats.get(chat_id)
+        if queue is None:
+            self._chats[chat_id] = deque((update,))
+            self._ready.put_nowait(chat_id)
+        else:
+            # Чат уже в работе или ждет воркера - дойдет до этого обновления сам
+            queue.append(update)
+        return True
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self, timeout=BOT_DRAIN_TIMEOUT):
+        """
+        Доработать принятые обновления и остановиться. На них Telegram уже
+        получил ответ 200 и повторно их не пришлет
+        """
+        self._closing = True
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout)
+            except asyncio.TimeoutError:
+                print(f"Update pool closed with {self._pending} unprocessed updates")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            queue = self._chats[chat_id]
+            try:
+                await self.handler(queue[0])
+            except Exception as e:
+                print(f"Error handling update for chat {chat_id}: {e}")
+            finally:
+                queue.popleft()
+                self._pending -= 1
+                if queue:
+                    self._ready.put_nowait(chat_id)
+                else:
+                    del self._chats[chat_id]
+                if not self._pending:
+                    self._idle.set()
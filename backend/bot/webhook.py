@@ -0,0 +1,89 @@
+"""
+Бот в режиме вебхука (BOT_MODE=webhook) на том же FastAPI-приложении,
+что и игровой сервер.
+
+Telegram присылает обновление POST-запросом на WEBHOOK_PATH, ответ уходит
+сразу после постановки в UpdatePool, сами обработчики выполняются в пуле.
+Ответы уходят через SendScheduler с лимитами Telegram. Обработчики и база
+бота те же, что в polling (main.py): режим меняет только способ доставки.
+"""
+import hmac
+
+from fastapi import Request, Response
+
+from bot.client import create_bot, create_dispatcher
+from bot.sender import SendScheduler
+from databases.dbs import Database
+from bot.updates import UpdatePool, update_chat_id
+from config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, BOT_WORKERS, BOT_QUEUE_SIZE, BOT_DATABASE
+from realtime.codec import loads
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class TelegramWebhook:
+    def __init__(self, bot, dp, scheduler=None, db=None, path=WEBHOOK_PATH, url=WEBHOOK_URL,
+                 secret=WEBHOOK_SECRET, workers=BOT_WORKERS, maxsize=BOT_QUEUE_SIZE):
+        self.bot = bot
+        self.dp = dp
+        # База обработчиков, если вебхук ее открывает и закрывает сам
+        self.db = db
+        # Планировщик исходящих запросов бота, если он подключен
+        self.scheduler = scheduler
+        self.path = path
+        # Публичный адрес сервера; пустой - вебхук уже настроен снаружи
+        self.url = url
+        self.secret = secret
+        self.pool = UpdatePool(self._feed, workers, maxsize)
+
+    def mount(self, app):
+        app.add_api_route(self.path, self.handle, methods=['POST'], include_in_schema=False)
+
+    async def start(self):
+        if self.db is not None:
+            await self.db.init_db()
+        if self.scheduler is not None:
+            self.scheduler.start()
+        self.pool.start()
+        if self.url:
+            await self.bot.set_webhook(
+                self.url.rstrip('/') + self.path,
+                secret_token=self.secret or None,
+                allowed_updates=self.dp.resolve_used_update_types()
+            )
+
+    async def close(self):
+        # Принятые обновления Telegram уже не пришлет повторно - дорабатываем их
+        await self.pool.close()
+        if self.scheduler is not None:
+            await self.scheduler.close()
+        await self.bot.session.close()
+        if self.db is not None:
+            await self.db.close()
+
+    async def handle(self, request: Request):
+        if self.secret and not hmac.compare_digest(request.headers.get(SECRET_HEADER, ''), self.secret):
+            return Response(status_code=403)
+        try:
+            update = loads(await request.body())
+        except ValueError:
+            return Response(status_code=400)
+
+        chat_id = update_chat_id(update)
+        if chat_id is None:
+            # Без чата порядок не важен - у каждого обновления своя очередь
+            chat_id = ('update', update.get('update_id'))
+        if not self.pool.submit(chat_id, update):
+            # Telegram повторит доставку позже
+            return Response(status_code=503)
+        return Response(status_code=200)
+
+    async def _feed(self, update):
+        await self.dp.feed_raw_update(self.bot, update)
+
+
+def create_webhook():
+    """Вебхук с теми же обработчиками и базой бота, что и в polling"""
+    db = Database(BOT_DATABASE)
+    scheduler = SendScheduler()
+    return TelegramWebhook(create_bot(scheduler=scheduler), create_dispatcher(db), scheduler, db)
@@ -0,0 +1,118 @@
+import os
+
+# Пул соединений SQLite: один писатель и несколько читателей
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+# Таймаут ожидания блокировки базы (мс)
+DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", "5000"))
+
+# Размер кэша страниц на соединение (КБ) и объем mmap (байты)
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+
+# Отложенная запись: сброс каждые N мс или после M операций
+DB_FLUSH_INTERVAL_MS = int(os.getenv("DB_FLUSH_INTERVAL_MS", "50"))
+DB_FLUSH_BATCH = int(os.getenv("DB_FLUSH_BATCH", "256"))
+# Максимум операций в очереди, после которого вызывающие ждут
+DB_WRITE_QUEUE_SIZE = int(os.getenv("DB_WRITE_QUEUE_SIZE", "10000"))
+
+# Кэш пользователей и статистики в памяти процесса
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "50000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+
+# Фоновые миграции: строк games за одну короткую транзакцию
+MIGRATION_CHUNK_SIZE = int(os.getenv("MIGRATION_CHUNK_SIZE", "2000"))
+
+# Подбор соперника: допустимая разница рейтинга растет с временем ожидания
+MATCH_BASE_WINDOW = int(os.getenv("MATCH_BASE_WINDOW", "50"))
+MATCH_WINDOW_GROWTH = float(os.getenv("MATCH_WINDOW_GROWTH", "10"))  # за секунду
+MATCH_MAX_WINDOW = int(os.getenv("MATCH_MAX_WINDOW", "500"))
+# Сколько секунд игрок может висеть в очереди и как часто идет подбор пачкой
+MATCH_QUEUE_TTL = float(os.getenv("MATCH_QUEUE_TTL", "300"))
+MATCH_TICK_INTERVAL = float(os.getenv("MATCH_TICK_INTERVAL", "1"))
+
+# Исходящие сообщения WebSocket: очередь на соединение, при переполнении -
+# одна попытка пересинхронизации, при повторном - отключение клиента
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# Предел памяти под неотправленные кадры одного клиента (байты)
+WS_MAX_QUEUED_BYTES = int(os.getenv("WS_MAX_QUEUED_BYTES", str(1024 * 1024)))
+
+# Несколько воркеров: memory - один процесс, redis - общее состояние и pub/sub
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Имя воркера, по умолчанию хост:pid
+WORKER_ID = os.getenv("WORKER_ID", "")
+# Ожидание ответа другого воркера и срок аренды очереди подбора (секунды)
+BACKEND_REQUEST_TIMEOUT = float(os.getenv("BACKEND_REQUEST_TIMEOUT", "2"))
+MATCHMAKER_LEASE = float(os.getenv("MATCHMAKER_LEASE", "10"))
+
+# Очередь действий одной игры; при переполнении новые действия отбрасываются
+GAME_INBOX_SIZE = int(os.getenv("GAME_INBOX_SIZE", "64"))
+
+# Снимки активных игр для восстановления после перезапуска: раз в N секунд,
+# только игры, изменившиеся с прошлого снимка
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "5"))
+
+# Колесо таймеров: длина тика (секунды) и число слотов
+TIMER_TICK = float(os.getenv("TIMER_TICK", "0.1"))
+TIMER_SLOTS = int(os.getenv("TIMER_SLOTS", "512"))
+
+# Сколько секунд игра ждет отключившегося игрока
+# и сколько пропущенных сообщений игры для него хранится
+RECONNECT_GRACE = float(os.getenv("RECONNECT_GRACE", "60"))
+REPLAY_BUFFER_SIZE = int(os.getenv("REPLAY_BUFFER_SIZE", "32"))
+
+# Пинг клиентов раз в N секунд; соединение без входящих кадров дольше таймаута закрывается
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "25"))
+HEARTBEAT_TIMEOUT = float(os.getenv("HEARTBEAT_TIMEOUT", "60"))
+# Сколько секунд игра по коду ждет второго игрока
+WAITING_GAME_TTL = float(os.getenv("WAITING_GAME_TTL", "600"))
+
+# Контроль времени для игр из подбора (секунды): 0 - без часов
+CLOCK_INITIAL = float(os.getenv("CLOCK_INITIAL", "0"))
+CLOCK_INCREMENT = float(os.getenv("CLOCK_INCREMENT", "0"))
+CLOCK_DELAY = float(os.getenv("CLOCK_DELAY", "0"))
+
+# Рейтинг: elo или glicko2, коэффициент K для Эло и tau для Glicko-2
+RATING_SYSTEM = os.getenv("RATING_SYSTEM", "elo")
+ELO_K = float(os.getenv("ELO_K", "32"))
+GLICKO_TAU = float(os.getenv("GLICKO_TAU", "0.5"))
+
+# Бот: polling (main.py) или webhook (на FastAPI-приложении websocket_server.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+BOT_TOKEN = os.getenv("TOKEN")
+# Свой Bot API сервер или локальная заглушка Telegram; пусто - api.telegram.org
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+# Публичный адрес сервера (пусто - вебхук не регистрируется при старте), путь и секрет вебхука
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Обработчики обновлений: сколько чатов сразу и сколько обновлений ждут в очереди
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "16"))
+BOT_QUEUE_SIZE = int(os.getenv("BOT_QUEUE_SIZE", "1000"))
+# База бота (пользователи и язык) - одна и та же в обоих режимах
+BOT_DATABASE = os.getenv("BOT_DATABASE", "database.db")
+# Сколько секунд при остановке дорабатываются уже принятые обновления
+BOT_DRAIN_TIMEOUT = float(os.getenv("BOT_DRAIN_TIMEOUT", "10"))
+
+# Адрес Mini App для кнопок бота и язык по умолчанию (файл locales/<язык>.json)
+WEBAPP_URL = os.getenv("WEBAPP_URL", "https://brdly.space")
+DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "ru")
+
+# Исходящие запросы бота: сообщений в секунду всего и в один чат, запас ведра чата
+# и сколько раз повторять запрос после ответа 429
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "3"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+
+# Сколько секунд итоги законченного турнира отдаются из памяти (дальше - только в базе)
+TOURNAMENT_RESULTS_TTL = float(os.getenv("TOURNAMENT_RESULTS_TTL", "3600"))
+
+# Зрители: задержка трансляции (секунды), сколько сообщений может ждать в очереди
+# соединения зрителя (дальше промежуточные состояния пропускаются), через сколько
+# секунд повторить отстающим и сколько зрителей обходить без передышки
+SPECTATOR_DELAY = float(os.getenv("SPECTATOR_DELAY", "0"))
+SPECTATOR_QUEUE_SIZE = int(os.getenv("SPECTATOR_QUEUE_SIZE", "4"))
+SPECTATOR_RETRY = float(os.getenv("SPECTATOR_RETRY", "0.5"))
+SPECTATOR_BATCH = int(os.getenv("SPECTATOR_BATCH", "64"))
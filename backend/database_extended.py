@@ -1,75 +1,151 @@
-import aiosqlite
+import json
 from datetime import datetime
+from databases.pool import ConnectionPool
+from databases.write_queue import WriteBehindQueue
+from databases.cache import LRUCache, MISSING
+from databases.leaderboard import Leaderboard
+from databases.migrations import Migrator
+from games.ratings import PlayerRating, DEFAULT_RATING, DEFAULT_RD, DEFAULT_VOLATILITY, rate
+from config import DB_POOL_SIZE, RATING_SYSTEM
 
 class Database:
-    def __init__(self, db_path="backend/databases/database.db"):
+    def __init__(self, db_path="backend/databases/database.db", pool_size=DB_POOL_SIZE):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, pool_size)
+        # Результаты игр и статистика пишутся пачками
+        self.writes = WriteBehindQueue(self.pool)
+        self.migrator = Migrator(self.pool)
+        # Кэш строк users и статистики по user_id
+        self.user_cache = LRUCache()
+        self.stats_cache = LRUCache()
+        # Рейтинг с отклонением и волатильностью (PlayerRating) по user_id
+        self.rating_cache = LRUCache()
+        # Рейтинг игроков и таблицы по каждой игре, загружаются в init_db
+        self.leaderboard = Leaderboard(key=lambda e: -e['rating'])
+        self.game_leaderboards = {}
+        self.leaderboards_loaded = False
     
     async def init_db(self):
-        async with aiosqlite.connect(self.db_path) as db:
-            # Таблица пользователей
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    language TEXT,
-                    username TEXT,
-                    rating INTEGER DEFAULT 1000,
-                    wins INTEGER DEFAULT 0,
-                    losses INTEGER DEFAULT 0,
-                    draws INTEGER DEFAULT 0,
-                    registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Таблица игр
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS games (
-                    game_id TEXT PRIMARY KEY,
-                    game_type TEXT,
-                    player1_id INTEGER,
-                    player2_id INTEGER,
-                    winner_id INTEGER,
-                    status TEXT,
-                    moves_count INTEGER DEFAULT 0,
-                    duration INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    finished_at TIMESTAMP,
-                    FOREIGN KEY (player1_id) REFERENCES users (user_id),
-                    FOREIGN KEY (player2_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            # Таблица статистики по играм
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS game_stats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    game_type TEXT,
-                    wins INTEGER DEFAULT 0,
-                    losses INTEGER DEFAULT 0,
-                    draws INTEGER DEFAULT 0,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id),
-                    UNIQUE(user_id, game_type)
-                )
-            """)
+        await self.pool.open()
+        # Схема и индексы - миграциями, заполнение новых таблиц идет фоном
+        await self.migrator.run(on_complete=self._load_leaderboards)
+        
+        self.writes.start()
+        await self._load_leaderboards()
+    
+    async def _load_leaderboards(self):
+        await self._before_read()
+        async with self.pool.reader() as db:
+            async with db.execute("""
+                SELECT user_id, username, rating, wins, losses, draws
+                FROM users
+                ORDER BY rating DESC
+            """) as cursor:
+                self.leaderboard.load([
+                    {
+                        'user_id': row[0],
+                        'username': row[1],
+                        'rating': row[2],
+                        'wins': row[3],
+                        'losses': row[4],
+                        'draws': row[5]
+                    }
+                    async for row in cursor
+                ])
             
-            await db.commit()
+            entries = {}
+            async with db.execute("""
+                SELECT user_id, game_type, wins, losses, draws
+                FROM game_stats
+            """) as cursor:
+                async for row in cursor:
+                    entries.setdefault(row[1], []).append({
+                        'user_id': row[0],
+                        'wins': row[2],
+                        'losses': row[3],
+                        'draws': row[4]
+                    })
+        
+        for game_type, game_entries in entries.items():
+            self._game_leaderboard(game_type).load(game_entries)
+        self.leaderboards_loaded = True
+    
+    def _game_leaderboard(self, game_type):
+        if game_type not in self.game_leaderboards:
+            # По игре: больше побед выше, при равенстве - меньше поражений
+            self.game_leaderboards[game_type] = Leaderboard(key=lambda e: (-e['wins'], e['losses']))
+        return self.game_leaderboards[game_type]
+    
+    async def flush(self):
+        """Дождаться записи всех отложенных изменений"""
+        await self.writes.flush()
+    
+    async def close(self):
+        await self.migrator.close()
+        await self.writes.close()
+        await self.pool.close()
+    
+    def cache_stats(self):
+        return {
+            'users': self.user_cache.stats(),
+            'stats': self.stats_cache.stats(),
+            'ratings': self.rating_cache.stats()
+        }
+    
+    async def _before_read(self):
+        # Перед чтением с диска дописываем отложенные изменения
+        if self.writes.pending:
+            await self.writes.flush()
     
     async def add_user(self, user_id, language, username=None):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute(
                 "INSERT OR REPLACE INTO users (user_id, language, username) VALUES (?, ?, ?)", 
                 (user_id, language, username or f"Player{user_id}")
             )
             await db.commit()
+        
+        # INSERT OR REPLACE сбрасывает всю строку, проще перечитать при следующем запросе
+        self.user_cache.invalidate(user_id)
+        self.stats_cache.invalidate(user_id)
+        # Рейтинг и RD тоже сброшены: иначе следующая партия запишет старый рейтинг поверх
+        self.rating_cache.invalidate(user_id)
+        self.leaderboard.put({
+            'user_id': user_id,
+            'username': username or f"Player{user_id}",
+            'rating': 1000,
+            'wins': 0,
+            'losses': 0,
+            'draws': 0
+        })
     
     async def get_user(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        user = self.user_cache.get(user_id)
+        if user is not MISSING:
+            return user
+        
+        epoch = self.user_cache.epoch
+        await self._before_read()
+        async with self.pool.reader() as db:
             async with db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)) as cursor:
-                return await cursor.fetchone()
+                user = await cursor.fetchone()
+        
+        self.user_cache.set(user_id, user, epoch)
+        return user
     
     async def get_user_stats(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        stats = self.stats_cache.get(user_id)
+        if stats is not MISSING:
+            return dict(stats) if stats else None
+        
+        epoch = self.stats_cache.epoch
+        stats = await self._load_user_stats(user_id)
+        self.stats_cache.set(user_id, stats, epoch)
+        return dict(stats) if stats else None
+    
+    async def _load_user_stats(self, user_id):
+        await self._before_read()
+        async with self.pool.reader() as db:
             async with db.execute("""
                 SELECT 
                     rating,
@@ -91,38 +167,64 @@ class Database:
                     }
                 return None
     
-    async def update_stats(self, user_id, result):
+    async def update_stats(self, user_id, result, wait=False):
         """
         Обновление статистики после игры
         result = {'outcome': 'win'|'loss'|'draw', 'rating_change': int}
+        wait=True - дождаться записи в базу
         """
-        async with aiosqlite.connect(self.db_path) as db:
-            outcome = result.get('outcome')
-            rating_change = result.get('rating_change', 0)
-            
-            if outcome == 'win':
-                await db.execute("""
-                    UPDATE users 
-                    SET wins = wins + 1, rating = rating + ?
-                    WHERE user_id = ?
-                """, (rating_change, user_id))
-            elif outcome == 'loss':
-                await db.execute("""
-                    UPDATE users 
-                    SET losses = losses + 1, rating = rating + ?
-                    WHERE user_id = ?
-                """, (rating_change, user_id))
-            elif outcome == 'draw':
-                await db.execute("""
-                    UPDATE users 
-                    SET draws = draws + 1
-                    WHERE user_id = ?
-                """, (user_id,))
-            
-            await db.commit()
+        self._apply_stats_in_memory(user_id, result)
+        await self.writes.submit(self._stats_ops(user_id, result), wait=wait)
+    
+    def _apply_stats_in_memory(self, user_id, result):
+        """Та же правка, что и в базе, для кэша и рейтинга"""
+        outcome = result.get('outcome')
+        if outcome not in ('win', 'loss', 'draw'):
+            return
+        rating_change = result.get('rating_change', 0) if outcome != 'draw' else 0
+        column = {'win': 'wins', 'loss': 'losses', 'draw': 'draws'}[outcome]
+        
+        def update_stats(stats):
+            stats = dict(stats)
+            stats['rating'] += rating_change
+            stats[column] += 1
+            stats['total_games'] += 1
+            return stats
+        
+        # Порядок столбцов users зависит от миграций - строку перечитаем из базы
+        self.user_cache.invalidate(user_id)
+        self.stats_cache.update(user_id, update_stats)
+        self.leaderboard.update(user_id, rating=rating_change, **{column: 1})
+    
+    def _stats_ops(self, user_id, result):
+        outcome = result.get('outcome')
+        rating_change = result.get('rating_change', 0)
+        
+        if outcome == 'win':
+            return [("""
+                UPDATE users 
+                SET wins = wins + 1, rating = rating + ?
+                WHERE user_id = ?
+            """, (rating_change, user_id))]
+        elif outcome == 'loss':
+            return [("""
+                UPDATE users 
+                SET losses = losses + 1, rating = rating + ?
+                WHERE user_id = ?
+            """, (rating_change, user_id))]
+        elif outcome == 'draw':
+            return [("""
+                UPDATE users 
+                SET draws = draws + 1
+                WHERE user_id = ?
+            """, (user_id,))]
+        return []
     
     async def get_leaderboard(self, limit=10):
-        async with aiosqlite.connect(self.db_path) as db:
+        if self.leaderboards_loaded:
+            return self.leaderboard.top(limit)
+        
+        async with self.pool.reader() as db:
             async with db.execute("""
                 SELECT user_id, username, rating, wins, losses, draws
                 FROM users
@@ -142,80 +244,303 @@ class Database:
                     for row in rows
                 ]
     
-    async def save_game(self, game_data):
+    async def get_user_rank(self, user_id):
+        """Место игрока в общем рейтинге"""
+        return self.leaderboard.rank(user_id)
+    
+    async def get_game_leaderboard(self, game_type, limit=10):
+        """Лучшие игроки по конкретной игре"""
+        leaderboard = self.game_leaderboards.get(game_type)
+        if leaderboard is None:
+            return []
+        
+        top = leaderboard.top(limit)
+        for entry in top:
+            player = self.leaderboard.get(entry['user_id'])
+            entry['username'] = player['username'] if player else f"Player{entry['user_id']}"
+        return top
+    
+    async def save_game(self, game_data, wait=False):
         """Сохранение завершенной игры"""
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                INSERT INTO games (
-                    game_id, game_type, player1_id, player2_id, 
-                    winner_id, status, moves_count, duration, finished_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        await self.writes.submit(self._save_game_ops(game_data), wait=wait)
+    
+    def _save_game_ops(self, game_data):
+        finished_at = datetime.now().isoformat(sep=' ')
+        ops = [("""
+            INSERT INTO games (
+                game_id, game_type, player1_id, player2_id, 
+                winner_id, status, moves_count, duration, finished_at, tournament_id
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            game_data['game_id'],
+            game_data['game_type'],
+            game_data['player1_id'],
+            game_data['player2_id'],
+            game_data.get('winner_id'),
+            game_data['status'],
+            game_data.get('moves_count', 0),
+            game_data.get('duration', 0),
+            finished_at,
+            game_data.get('tournament_id')
+        ))]
+        
+        players = ((game_data['player1_id'], game_data['player2_id']),
+                   (game_data['player2_id'], game_data['player1_id']))
+        for player_id, opponent_id in players:
+            if player_id is None:
+                continue
+            ops.append(("""
+                INSERT INTO game_players (
+                    user_id, finished_at, game_id, opponent_id, game_type, winner_id
+                ) VALUES (?, ?, ?, ?, ?, ?)
             """, (
+                player_id,
+                finished_at,
                 game_data['game_id'],
+                opponent_id,
                 game_data['game_type'],
-                game_data['player1_id'],
-                game_data['player2_id'],
-                game_data.get('winner_id'),
-                game_data['status'],
-                game_data.get('moves_count', 0),
-                game_data.get('duration', 0),
-                datetime.now()
-            ))
-            await db.commit()
+                game_data.get('winner_id')
+            )))
+        return ops
     
-    async def get_user_game_history(self, user_id, limit=20):
+    async def get_user_game_history(self, user_id, limit=20, cursor=None):
         """Получить историю игр пользователя"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute("""
+        page = await self.get_user_game_history_page(user_id, limit, cursor)
+        return page['games']
+    
+    async def get_user_game_history_page(self, user_id, limit=20, cursor=None):
+        """
+        Страница истории игр, от новых к старым.
+        cursor - значение next_cursor с предыдущей страницы, неверный - ValueError
+        """
+        where = "gp.user_id = ?"
+        params = [user_id]
+        if cursor:
+            # Продолжаем сразу после последней игры предыдущей страницы
+            where += " AND (gp.finished_at, gp.game_id) < (?, ?)"
+            params.extend(self._parse_cursor(cursor))
+        await self._before_read()
+        params.append(limit)
+        
+        async with self.pool.reader() as db:
+            async with db.execute(f"""
                 SELECT 
-                    g.game_id,
-                    g.game_type,
-                    g.winner_id,
-                    g.finished_at,
+                    gp.game_id,
+                    gp.game_type,
+                    gp.winner_id,
+                    gp.finished_at,
                     u.username as opponent_name
-                FROM games g
-                LEFT JOIN users u ON (
-                    CASE 
-                        WHEN g.player1_id = ? THEN g.player2_id
-                        ELSE g.player1_id
-                    END = u.user_id
-                )
-                WHERE g.player1_id = ? OR g.player2_id = ?
-                ORDER BY g.finished_at DESC
+                FROM game_players gp
+                LEFT JOIN users u ON u.user_id = gp.opponent_id
+                WHERE {where}
+                ORDER BY gp.finished_at DESC, gp.game_id DESC
                 LIMIT ?
-            """, (user_id, user_id, user_id, limit)) as cursor:
-                rows = await cursor.fetchall()
-                return [
-                    {
-                        'game_id': row[0],
-                        'game_type': row[1],
-                        'result': 'win' if row[2] == user_id else 'loss' if row[2] else 'draw',
-                        'finished_at': row[3],
-                        'opponent_name': row[4]
-                    }
-                    for row in rows
-                ]
+            """, params) as db_cursor:
+                rows = await db_cursor.fetchall()
+        
+        games = [
+            {
+                'game_id': row[0],
+                'game_type': row[1],
+                'result': 'win' if row[2] == user_id else 'loss' if row[2] else 'draw',
+                'finished_at': row[3],
+                'opponent_name': row[4]
+            }
+            for row in rows
+        ]
+        next_cursor = None
+        if len(rows) == limit:
+            next_cursor = f"{rows[-1][3]}|{rows[-1][0]}"
+        
+        return {'games': games, 'next_cursor': next_cursor}
+    
+    @staticmethod
+    def _parse_cursor(cursor):
+        """Курсор приходит от клиента: 'finished_at|game_id' -> (finished_at, game_id)"""
+        finished_at, separator, game_id = str(cursor).partition('|')
+        if not separator or not game_id:
+            raise ValueError(f"Неверный курсор истории: {cursor!r}")
+        try:
+            datetime.fromisoformat(finished_at)
+        except ValueError:
+            raise ValueError(f"Неверный курсор истории: {cursor!r}") from None
+        return finished_at, game_id
     
-    async def update_game_stats(self, user_id, game_type, result):
+    async def update_game_stats(self, user_id, game_type, result, wait=False):
         """Обновление статистики по конкретной игре"""
-        async with aiosqlite.connect(self.db_path) as db:
+        self._apply_game_stats_in_memory(user_id, game_type, result)
+        await self.writes.submit(self._game_stats_ops(user_id, game_type, result), wait=wait)
+    
+    def _apply_game_stats_in_memory(self, user_id, game_type, result):
+        leaderboard = self._game_leaderboard(game_type)
+        if leaderboard.get(user_id) is None:
+            leaderboard.put({'user_id': user_id, 'wins': 0, 'losses': 0, 'draws': 0})
+        leaderboard.update(user_id, **{self._result_column(result): 1})
+    
+    @staticmethod
+    def _result_column(result):
+        if result == 'win':
+            return 'wins'
+        elif result == 'loss':
+            return 'losses'
+        return 'draws'
+    
+    def _game_stats_ops(self, user_id, game_type, result):
+        column = self._result_column(result)
+        return [
             # Создаем запись если её нет
-            await db.execute("""
+            ("""
                 INSERT OR IGNORE INTO game_stats (user_id, game_type)
                 VALUES (?, ?)
-            """, (user_id, game_type))
-            
-            if result == 'win':
-                column = 'wins'
-            elif result == 'loss':
-                column = 'losses'
-            else:
-                column = 'draws'
-            
-            await db.execute(f"""
+            """, (user_id, game_type)),
+            (f"""
                 UPDATE game_stats 
                 SET {column} = {column} + 1
                 WHERE user_id = ? AND game_type = ?
             """, (user_id, game_type))
-            
-            await db.commit()
\ No newline at end of file
+        ]
+    
+    async def get_player_rating(self, user_id):
+        """Рейтинг игрока вместе с RD и волатильностью; новичку - стартовый"""
+        rating = self.rating_cache.get(user_id)
+        if rating is not MISSING:
+            return rating
+        
+        epoch = self.rating_cache.epoch
+        await self._before_read()
+        async with self.pool.reader() as db:
+            async with db.execute(
+                "SELECT rating, rating_rd, rating_volatility FROM users WHERE user_id = ?",
+                (user_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+        
+        rating = PlayerRating(*row) if row is not None else PlayerRating()
+        self.rating_cache.set(user_id, rating, epoch)
+        return rating
+    
+    async def finish_game(self, game_data, wait=False):
+        """
+        Итог партии одной транзакцией: запись игры, рейтинг и статистика обоих игроков.
+        game_data - как у save_game, winner_id None - ничья.
+        Рейтинг считает сервер. Возвращает {user_id: изменение рейтинга}
+        """
+        player1_id = game_data['player1_id']
+        player2_id = game_data['player2_id']
+        winner_id = game_data.get('winner_id')
+        score = 0.5 if winner_id is None else (1.0 if winner_id == player1_id else 0.0)
+        
+        old1 = await self.get_player_rating(player1_id)
+        old2 = await self.get_player_rating(player2_id)
+        new1, new2 = rate(old1, old2, score)
+        
+        # Игрок мог зайти только в WebApp, минуя /start: строка users нужна до записи игры
+        ops = [
+            ("INSERT OR IGNORE INTO users (user_id, username) VALUES (?, ?)", (user_id, f"Player{user_id}"))
+            for user_id in (player1_id, player2_id)
+        ]
+        ops += self._save_game_ops(game_data)
+        changes = {}
+        for user_id, old, new in ((player1_id, old1, new1), (player2_id, old2, new2)):
+            outcome = 'draw' if winner_id is None else ('win' if winner_id == user_id else 'loss')
+            ops += self._rating_ops(user_id, new, outcome)
+            ops += self._game_stats_ops(user_id, game_data['game_type'], outcome)
+            changes[user_id] = round(new.rating) - round(old.rating)
+            self._apply_rating_in_memory(user_id, new, changes[user_id], outcome)
+            self._apply_game_stats_in_memory(user_id, game_data['game_type'], outcome)
+        
+        # Одна группа - одна транзакция: либо записано все, либо ничего
+        await self.writes.submit(ops, wait=wait)
+        return changes
+    
+    def _rating_ops(self, user_id, rating, outcome):
+        column = self._result_column(outcome)
+        return [(f"""
+            UPDATE users
+            SET rating = ?, rating_rd = ?, rating_volatility = ?, {column} = {column} + 1
+            WHERE user_id = ?
+        """, (round(rating.rating), rating.rd, rating.volatility, user_id))]
+    
+    def _apply_rating_in_memory(self, user_id, rating, change, outcome):
+        column = self._result_column(outcome)
+        self.rating_cache.set(user_id, rating)
+        # Порядок колонок строки users зависит от истории миграций - перечитаем
+        self.user_cache.invalidate(user_id)
+        
+        def update_stats(stats):
+            stats = dict(stats)
+            stats['rating'] += change
+            stats[column] += 1
+            stats['total_games'] += 1
+            return stats
+        
+        self.stats_cache.update(user_id, update_stats)
+        if self.leaderboard.get(user_id) is None:
+            self.leaderboard.put({
+                'user_id': user_id,
+                'username': f"Player{user_id}",
+                'rating': DEFAULT_RATING,
+                'wins': 0,
+                'losses': 0,
+                'draws': 0
+            })
+        self.leaderboard.update(user_id, rating=change, **{column: 1})
+    
+    async def save_tournament(self, tournament):
+        """Состояние турнира (Tournament); полная таблица - только у законченного"""
+        standings = json.dumps(tournament.table()) if tournament.status == 'finished' else None
+        await self.writes.submit([("""
+            INSERT INTO tournaments (tournament_id, name, game_type, format, status, round, rounds, players, standings)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (tournament_id) DO UPDATE SET
+                status = excluded.status,
+                round = excluded.round,
+                rounds = excluded.rounds,
+                players = excluded.players,
+                standings = excluded.standings,
+                updated_at = CURRENT_TIMESTAMP
+        """, (
+            tournament.id, tournament.name, tournament.game_type, tournament.format,
+            tournament.status, tournament.round, tournament.rounds, len(tournament), standings
+        ))])
+    
+    async def recompute_ratings(self, system=RATING_SYSTEM):
+        """
+        Пересчет рейтингов всех игроков по таблице games с начала, например
+        после смены формулы. Игры читаются одним курсором по порядку,
+        рейтинги записываются одной транзакцией. Возвращает число игр
+        """
+        await self.flush()
+        ratings = {}
+        games = 0
+        async with self.pool.reader() as db:
+            async with db.execute("""
+                SELECT player1_id, player2_id, winner_id
+                FROM games
+                WHERE finished_at IS NOT NULL
+                  AND player1_id IS NOT NULL AND player2_id IS NOT NULL
+                ORDER BY finished_at, rowid
+            """) as cursor:
+                async for player1_id, player2_id, winner_id in cursor:
+                    old1 = ratings.get(player1_id) or PlayerRating()
+                    old2 = ratings.get(player2_id) or PlayerRating()
+                    score = 0.5 if winner_id is None else (1.0 if winner_id == player1_id else 0.0)
+                    ratings[player1_id], ratings[player2_id] = rate(old1, old2, score, system)
+                    games += 1
+        
+        async with self.pool.writer() as db:
+            await db.execute(
+                "UPDATE users SET rating = ?, rating_rd = ?, rating_volatility = ?",
+                (DEFAULT_RATING, DEFAULT_RD, DEFAULT_VOLATILITY)
+            )
+            await db.executemany(
+                "UPDATE users SET rating = ?, rating_rd = ?, rating_volatility = ? WHERE user_id = ?",
+                [(round(r.rating), r.rd, r.volatility, user_id) for user_id, r in ratings.items()]
+            )
+            await db.commit()
+        
+        self.rating_cache.clear()
+        self.user_cache.clear()
+        self.stats_cache.clear()
+        await self._load_leaderboards()
+        return games
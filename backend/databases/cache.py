@@ -0,0 +1,73 @@
+import time
+from collections import OrderedDict
+
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+
+# Признак отсутствия записи (None тоже кэшируется: "пользователя нет")
+MISSING = object()
+
+
+class LRUCache:
+    """LRU кэш с ограничением размера и временем жизни записей"""
+
+    def __init__(self, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        # Увеличивается при каждом изменении данных в базе.
+        # Чтение, начатое до изменения, не должно попасть в кэш
+        self.epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            self.evictions += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, epoch=None):
+        """Сохранить значение. Если передан epoch и данные менялись с тех пор - пропускаем"""
+        if epoch is not None and epoch != self.epoch:
+            return
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key):
+        self.epoch += 1
+        self._data.pop(key, None)
+
+    def update(self, key, fn):
+        """Применить fn к закэшированному значению, не продлевая его жизнь"""
+        self.epoch += 1
+        entry = self._data.get(key)
+        if entry is not None and entry[0] is not None:
+            self._data[key] = (fn(entry[0]), entry[1])
+
+    def clear(self):
+        self.epoch += 1
+        self._data.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
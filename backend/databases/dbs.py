@@ -1,29 +1,45 @@
-import aiosqlite
+from databases.pool import ConnectionPool
+from databases.cache import LRUCache, MISSING
+from databases.migrations import Migrator
+from config import DB_POOL_SIZE
 
 class Database:
-    def __init__(self, db_path="backend/databases/database.db"):
+    def __init__(self, db_path="backend/databases/database.db", pool_size=DB_POOL_SIZE):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, pool_size)
+        self.user_cache = LRUCache()
+        self.migrator = Migrator(self.pool)
     
     async def init_db(self):
-        async with aiosqlite.connect(self.db_path) as db:
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    language TEXT,
-                    registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            await db.commit()
+        await self.pool.open()
+        # Общие миграции: схема users совпадает с database_extended.py
+        await self.migrator.run()
+    
+    async def close(self):
+        await self.migrator.close()
+        await self.pool.close()
     
     async def add_user(self, user_id, language):
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self.pool.writer() as db:
             await db.execute(
                 "INSERT OR REPLACE INTO users (user_id, language) VALUES (?, ?)", 
                 (user_id, language)
             )
             await db.commit()
+        self.user_cache.invalidate(user_id)
     
     async def get_user(self, user_id):
-        async with aiosqlite.connect(self.db_path) as db:
+        user = self.user_cache.get(user_id)
+        if user is not MISSING:
+            return user
+        
+        epoch = self.user_cache.epoch
+        async with self.pool.reader() as db:
             async with db.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)) as cursor:
-                return await cursor.fetchone()
\ No newline at end of file
+                user = await cursor.fetchone()
+        
+        self.user_cache.set(user_id, user, epoch)
+        return user
+    
+    def cache_stats(self):
+        return self.user_cache.stats()
\ No newline at end of file
@@ -0,0 +1,187 @@
+from bisect import bisect_left, bisect_right, insort
+
+# Максимальный размер корзины отсортированного списка
+BUCKET_SIZE = 512
+
+
+class SortedList:
+    """
+    Отсортированный список из корзин ограниченного размера.
+    Вставка и удаление - бинарный поиск + сдвиг внутри одной корзины,
+    позиция элемента - дерево Фенвика по размерам корзин.
+    """
+
+    def __init__(self, items=()):
+        items = sorted(items)
+        self._buckets = [items[i:i + BUCKET_SIZE] for i in range(0, len(items), BUCKET_SIZE)]
+        self._maxes = [bucket[-1] for bucket in self._buckets]
+        self._len = len(items)
+        self._build_index()
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for bucket in self._buckets:
+            yield from bucket
+
+    def _build_index(self):
+        # Дерево Фенвика по размерам корзин
+        self._tree = [0] * (len(self._buckets) + 1)
+        for i, bucket in enumerate(self._buckets, 1):
+            self._tree[i] += len(bucket)
+            parent = i + (i & -i)
+            if parent < len(self._tree):
+                self._tree[parent] += self._tree[i]
+
+    def _tree_add(self, pos, delta):
+        i = pos + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _tree_prefix(self, pos):
+        """Количество элементов в корзинах [0, pos)"""
+        total = 0
+        i = pos
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def add(self, item):
+        if not self._buckets:
+            self._buckets.append([item])
+            self._maxes.append(item)
+            self._len = 1
+            self._build_index()
+            return
+
+        pos = bisect_left(self._maxes, item)
+        if pos == len(self._maxes):
+            pos -= 1
+            self._buckets[pos].append(item)
+            self._maxes[pos] = item
+        else:
+            insort(self._buckets[pos], item)
+        self._len += 1
+
+        bucket = self._buckets[pos]
+        if len(bucket) > BUCKET_SIZE * 2:
+            # Делим переполненную корзину пополам
+            half = len(bucket) // 2
+            self._buckets[pos:pos + 1] = [bucket[:half], bucket[half:]]
+            self._maxes[pos:pos + 1] = [bucket[half - 1], bucket[-1]]
+            self._build_index()
+        else:
+            self._tree_add(pos, 1)
+
+    def remove(self, item):
+        pos = bisect_left(self._maxes, item)
+        if pos == len(self._maxes):
+            raise ValueError(f"{item!r} not in list")
+        bucket = self._buckets[pos]
+        i = bisect_left(bucket, item)
+        if i == len(bucket) or bucket[i] != item:
+            raise ValueError(f"{item!r} not in list")
+        del bucket[i]
+        self._len -= 1
+
+        if bucket:
+            self._maxes[pos] = bucket[-1]
+            self._tree_add(pos, -1)
+        else:
+            del self._buckets[pos]
+            del self._maxes[pos]
+            self._build_index()
+
+    def count_less(self, item):
+        """Сколько элементов строго меньше item"""
+        pos = bisect_left(self._maxes, item)
+        if pos == len(self._maxes):
+            return self._len
+        return self._tree_prefix(pos) + bisect_left(self._buckets[pos], item)
+
+    def prev(self, item):
+        """Наибольший элемент строго меньше item или None"""
+        pos = bisect_left(self._maxes, item)
+        if pos < len(self._buckets):
+            i = bisect_left(self._buckets[pos], item)
+            if i > 0:
+                return self._buckets[pos][i - 1]
+        # item меньше всех в корзине pos - ответ в конце предыдущей
+        return self._maxes[pos - 1] if pos > 0 else None
+
+    def next(self, item):
+        """Наименьший элемент строго больше item или None"""
+        pos = bisect_right(self._maxes, item)
+        if pos == len(self._buckets):
+            return None
+        bucket = self._buckets[pos]
+        return bucket[bisect_right(bucket, item)]
+
+    def first(self, limit):
+        result = []
+        for bucket in self._buckets:
+            result.extend(bucket[:limit - len(result)])
+            if len(result) >= limit:
+                break
+        return result
+
+
+class Leaderboard:
+    """
+    Рейтинговая таблица в памяти.
+    key(entry) задает порядок, entry - словарь с данными игрока.
+    """
+
+    def __init__(self, key):
+        self._key = key
+        self._entries = {}
+        self._order = SortedList()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, entries):
+        self._entries = {entry['user_id']: entry for entry in entries}
+        self._order = SortedList(
+            (self._key(entry), user_id) for user_id, entry in self._entries.items()
+        )
+
+    def get(self, user_id):
+        return self._entries.get(user_id)
+
+    def put(self, entry):
+        user_id = entry['user_id']
+        old = self._entries.get(user_id)
+        if old is not None:
+            self._order.remove((self._key(old), user_id))
+        self._entries[user_id] = entry
+        self._order.add((self._key(entry), user_id))
+
+    def update(self, user_id, **changes):
+        """Прибавить значения к полям игрока"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return
+        entry = dict(entry)
+        for field, delta in changes.items():
+            entry[field] = entry.get(field, 0) + delta
+        self.put(entry)
+
+    def remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._order.remove((self._key(entry), user_id))
+
+    def top(self, limit=10):
+        return [dict(self._entries[user_id]) for _, user_id in self._order.first(limit)]
+
+    def rank(self, user_id):
+        """Место игрока (с единицы). Игроки с равным счетом делят место"""
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        # Ключ без user_id: ищем первого с таким же счетом
+        return self._order.count_less((self._key(entry),)) + 1
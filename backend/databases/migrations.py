@@ -0,0 +1,376 @@
+import asyncio
+
+from config import MIGRATION_CHUNK_SIZE
+
+
+class SchemaMigration:
+    """Быстрая миграция: DDL в одной транзакции при старте"""
+
+    online = False
+
+    def __init__(self, version, name, statements):
+        self.version = version
+        self.name = name
+        self.statements = statements
+
+    async def apply(self, pool, chunk_size):
+        async with pool.writer() as db:
+            for sql in self.statements:
+                await db.execute(sql)
+            await Migrator.mark_applied(db, self)
+            await db.commit()
+
+
+class BackfillMigration:
+    """
+    Тяжелая миграция: обработка таблицы games кусками по rowid.
+    Каждый кусок - отдельная короткая транзакция, позиция сохраняется
+    в migration_progress, поэтому после перезапуска работа продолжается.
+
+    target(db) - верхняя граница rowid (0 - делать нечего), фиксируется
+    в prepare до того, как сервер начнет писать: все после нее учтет сам
+    сервер. chunk(db, start, end) обрабатывает (start, end].
+    """
+
+    online = True
+
+    def __init__(self, version, name, target, chunk):
+        self.version = version
+        self.name = name
+        self.target = target
+        self.chunk = chunk
+
+    async def prepare(self, pool):
+        """Зафиксировать границу в migration_progress: (позиция, граница)"""
+        async with pool.writer() as db:
+            async with db.execute(
+                "SELECT position, target FROM migration_progress WHERE version = ?",
+                (self.version,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row is None:
+                row = (0, await self.target(db))
+                await db.execute(
+                    "INSERT INTO migration_progress (version, position, target) VALUES (?, ?, ?)",
+                    (self.version, *row)
+                )
+                await db.commit()
+        return row
+
+    async def apply(self, pool, chunk_size):
+        position, target = await self.prepare(pool)
+
+        while position < target:
+            end = min(position + chunk_size, target)
+            async with pool.writer() as db:
+                await self.chunk(db, position, end)
+                await db.execute(
+                    "UPDATE migration_progress SET position = ? WHERE version = ?",
+                    (end, self.version)
+                )
+                await db.commit()
+            position = end
+            # Отдаем управление: писатель и цикл событий свободны между кусками
+            await asyncio.sleep(0)
+
+        async with pool.writer() as db:
+            await db.execute("DELETE FROM migration_progress WHERE version = ?", (self.version,))
+            await Migrator.mark_applied(db, self)
+            await db.commit()
+
+
+async def _max_game_rowid(db):
+    async with db.execute("SELECT COALESCE(MAX(rowid), 0) FROM games") as cursor:
+        return (await cursor.fetchone())[0]
+
+
+async def _backfill_game_players(db, start, end):
+    for player, opponent in (('player1_id', 'player2_id'), ('player2_id', 'player1_id')):
+        await db.execute(f"""
+            INSERT OR IGNORE INTO game_players
+            SELECT {player}, finished_at, game_id, {opponent}, game_type, winner_id
+            FROM games
+            WHERE rowid > ? AND rowid <= ?
+              AND finished_at IS NOT NULL AND {player} IS NOT NULL
+        """, (start, end))
+
+
+async def _game_stats_target(db):
+    # Вызывается один раз, до первой записи сервера: если статистику уже
+    # вела старая версия, пересчет задвоил бы ее. Дальше решение берется
+    # из migration_progress, новые игры в game_stats его не меняют
+    async with db.execute("SELECT EXISTS (SELECT 1 FROM game_stats)") as cursor:
+        if (await cursor.fetchone())[0]:
+            return 0
+    return await _max_game_rowid(db)
+
+
+async def _backfill_game_stats(db, start, end):
+    await db.execute("""
+        WITH players AS (
+            SELECT player1_id AS user_id, game_type, winner_id
+            FROM games
+            WHERE rowid > ? AND rowid <= ? AND finished_at IS NOT NULL AND player1_id IS NOT NULL
+            UNION ALL
+            SELECT player2_id, game_type, winner_id
+            FROM games
+            WHERE rowid > ? AND rowid <= ? AND finished_at IS NOT NULL AND player2_id IS NOT NULL
+        )
+        INSERT INTO game_stats (user_id, game_type, wins, losses, draws)
+        SELECT
+            user_id,
+            game_type,
+            SUM(winner_id = user_id),
+            SUM(winner_id IS NOT NULL AND winner_id != user_id),
+            SUM(winner_id IS NULL)
+        FROM players
+        GROUP BY user_id, game_type
+        ON CONFLICT (user_id, game_type) DO UPDATE SET
+            wins = wins + excluded.wins,
+            losses = losses + excluded.losses,
+            draws = draws + excluded.draws
+    """, (start, end, start, end))
+
+
+# Полная схема users (старая версия из dbs.py хранила только три колонки)
+USER_COLUMNS = {
+    'username': "TEXT",
+    'rating': "INTEGER DEFAULT 1000",
+    'wins': "INTEGER DEFAULT 0",
+    'losses': "INTEGER DEFAULT 0",
+    'draws': "INTEGER DEFAULT 0",
+}
+
+
+class AddUserColumns:
+    """Дополняет users колонками, которых нет в старых базах"""
+
+    online = False
+    version = 2
+    name = "users: недостающие колонки"
+
+    async def apply(self, pool, chunk_size):
+        async with pool.writer() as db:
+            async with db.execute("PRAGMA table_info(users)") as cursor:
+                existing = {row[1] async for row in cursor}
+            for column, definition in USER_COLUMNS.items():
+                if column not in existing:
+                    await db.execute(f"ALTER TABLE users ADD COLUMN {column} {definition}")
+            if 'username' not in existing:
+                # Как в add_user: имя по умолчанию
+                await db.execute("UPDATE users SET username = 'Player' || user_id")
+            await Migrator.mark_applied(db, self)
+            await db.commit()
+
+
+# Номера миграций не меняются и не переиспользуются, новые - только в конец
+MIGRATIONS = [
+    SchemaMigration(1, "базовые таблицы", [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            language TEXT,
+            username TEXT,
+            rating INTEGER DEFAULT 1000,
+            wins INTEGER DEFAULT 0,
+            losses INTEGER DEFAULT 0,
+            draws INTEGER DEFAULT 0,
+            registered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS games (
+            game_id TEXT PRIMARY KEY,
+            game_type TEXT,
+            player1_id INTEGER,
+            player2_id INTEGER,
+            winner_id INTEGER,
+            status TEXT,
+            moves_count INTEGER DEFAULT 0,
+            duration INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP,
+            FOREIGN KEY (player1_id) REFERENCES users (user_id),
+            FOREIGN KEY (player2_id) REFERENCES users (user_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS game_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            game_type TEXT,
+            wins INTEGER DEFAULT 0,
+            losses INTEGER DEFAULT 0,
+            draws INTEGER DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (user_id),
+            UNIQUE(user_id, game_type)
+        )
+        """,
+    ]),
+    AddUserColumns(),
+    SchemaMigration(3, "game_players: участники игр", [
+        # Одна строка на игрока, отсортирована по времени.
+        # История игрока читается одним диапазоном первичного ключа
+        """
+        CREATE TABLE IF NOT EXISTS game_players (
+            user_id INTEGER NOT NULL,
+            finished_at TIMESTAMP NOT NULL,
+            game_id TEXT NOT NULL,
+            opponent_id INTEGER,
+            game_type TEXT,
+            winner_id INTEGER,
+            PRIMARY KEY (user_id, finished_at, game_id)
+        ) WITHOUT ROWID
+        """,
+    ]),
+    SchemaMigration(4, "индекс рейтинга", [
+        # Холодный старт рейтинга без полной сортировки
+        "CREATE INDEX IF NOT EXISTS idx_users_rating ON users (rating DESC)",
+    ]),
+    BackfillMigration(5, "game_players из games", _max_game_rowid, _backfill_game_players),
+    BackfillMigration(6, "game_stats из games", _game_stats_target, _backfill_game_stats),
+    SchemaMigration(7, "снимки активных игр", [
+        # Последний снимок каждой активной игры
+        """
+        CREATE TABLE IF NOT EXISTS game_snapshots (
+            game_id TEXT PRIMARY KEY,
+            worker_id TEXT,
+            seq INTEGER NOT NULL,
+            board BLOB,
+            data TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # Ходы после снимка, дописываются по одному
+        """
+        CREATE TABLE IF NOT EXISTS game_moves (
+            game_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            move TEXT NOT NULL,
+            PRIMARY KEY (game_id, seq)
+        ) WITHOUT ROWID
+        """,
+    ]),
+    SchemaMigration(8, "users: отклонение и волатильность рейтинга", [
+        # Для Glicko-2; при Эло остаются значениями по умолчанию
+        "ALTER TABLE users ADD COLUMN rating_rd REAL DEFAULT 350",
+        "ALTER TABLE users ADD COLUMN rating_volatility REAL DEFAULT 0.06",
+    ]),
+    SchemaMigration(9, "турниры", [
+        """
+        CREATE TABLE IF NOT EXISTS tournaments (
+            tournament_id TEXT PRIMARY KEY,
+            name TEXT,
+            game_type TEXT,
+            format TEXT,
+            status TEXT,
+            round INTEGER DEFAULT 0,
+            rounds INTEGER,
+            players INTEGER DEFAULT 0,
+            standings TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # Партии турнира; у обычных игр пусто
+        "ALTER TABLE games ADD COLUMN tournament_id TEXT",
+        "CREATE INDEX IF NOT EXISTS idx_games_tournament ON games (tournament_id) WHERE tournament_id IS NOT NULL",
+    ]),
+]
+
+
+class Migrator:
+    """
+    Применяет недостающие миграции по номерам.
+    Схемные - сразу при старте, тяжелые заполнения - фоном кусками.
+    """
+
+    def __init__(self, pool, migrations=MIGRATIONS, chunk_size=MIGRATION_CHUNK_SIZE):
+        self.pool = pool
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+        self.chunk_size = chunk_size
+        self._task = None
+
+    @staticmethod
+    async def mark_applied(db, migration):
+        await db.execute(
+            "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+            (migration.version, migration.name)
+        )
+
+    async def _applied(self):
+        async with self.pool.writer() as db:
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            await db.execute("""
+                CREATE TABLE IF NOT EXISTS migration_progress (
+                    version INTEGER PRIMARY KEY,
+                    position INTEGER,
+                    target INTEGER
+                )
+            """)
+            await db.commit()
+            async with db.execute("SELECT version FROM schema_version") as cursor:
+                return {row[0] async for row in cursor}
+
+    async def pending(self):
+        applied = await self._applied()
+        known = {m.version for m in self.migrations}
+        unknown = applied - known
+        if unknown:
+            raise RuntimeError(
+                f"База новее кода: неизвестные миграции {sorted(unknown)}"
+            )
+        return [m for m in self.migrations if m.version not in applied]
+
+    async def run(self, background=True, on_complete=None):
+        """
+        Применить схемные миграции и запустить заполнения.
+        background=False - дождаться всех миграций.
+        on_complete - корутина, вызываемая после фоновых заполнений.
+        """
+        pending = await self.pending()
+        online = [m for m in pending if m.online]
+        for migration in pending:
+            if not migration.online:
+                await self._apply(migration)
+        # Границы заполнений - до первой записи сервера, а не когда до них дойдет очередь
+        for migration in online:
+            await migration.prepare(self.pool)
+
+        if not online:
+            return
+        if background:
+            self._task = asyncio.create_task(self._run_online(online, on_complete))
+        else:
+            await self._run_online(online, on_complete)
+
+    async def _run_online(self, migrations, on_complete):
+        for migration in migrations:
+            await self._apply(migration)
+        if on_complete is not None:
+            await on_complete()
+
+    async def _apply(self, migration):
+        print(f"Миграция {migration.version}: {migration.name}")
+        await migration.apply(self.pool, self.chunk_size)
+
+    async def wait(self):
+        """Дождаться фоновых заполнений"""
+        if self._task is not None:
+            await self._task
+
+    async def close(self):
+        """Остановить фоновые заполнения, продолжатся при следующем запуске"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
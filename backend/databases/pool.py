@@ -0,0 +1,80 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+from config import DB_POOL_SIZE, DB_BUSY_TIMEOUT, DB_CACHE_SIZE_KB, DB_MMAP_SIZE
+
+
+class ConnectionPool:
+    """
+    Долгоживущие соединения с SQLite в режиме WAL.
+    Одно соединение-писатель (под блокировкой) и несколько читателей.
+    """
+
+    def __init__(self, db_path, size=DB_POOL_SIZE):
+        self.db_path = db_path
+        # Одно соединение всегда уходит писателю, остальные - читателям
+        self.size = max(size, 2)
+        self._writer = None
+        self._writer_lock = asyncio.Lock()
+        self._readers = asyncio.Queue()
+        self._all = []
+        self._open_lock = asyncio.Lock()
+        self.is_open = False
+
+    async def _connect(self):
+        db = await aiosqlite.connect(self.db_path)
+        await db.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT}")
+        await db.execute("PRAGMA journal_mode = WAL")
+        # В WAL режиме NORMAL не теряет целостность, но экономит fsync
+        await db.execute("PRAGMA synchronous = NORMAL")
+        await db.execute("PRAGMA temp_store = MEMORY")
+        await db.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+        await db.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        await db.execute("PRAGMA foreign_keys = ON")
+        self._all.append(db)
+        return db
+
+    async def open(self):
+        if self.is_open:
+            return
+        async with self._open_lock:
+            if self.is_open:
+                return
+            self._writer = await self._connect()
+            for _ in range(self.size - 1):
+                self._readers.put_nowait(await self._connect())
+            self.is_open = True
+
+    async def close(self):
+        if not self.is_open:
+            return
+        # Дожидаемся завершения текущей записи
+        async with self._writer_lock:
+            for db in self._all:
+                await db.close()
+            self._all.clear()
+            self._writer = None
+            self._readers = asyncio.Queue()
+            self.is_open = False
+
+    @asynccontextmanager
+    async def reader(self):
+        await self.open()
+        db = await self._readers.get()
+        try:
+            yield db
+        finally:
+            self._readers.put_nowait(db)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Соединение для записи. При ошибке транзакция откатывается."""
+        await self.open()
+        async with self._writer_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
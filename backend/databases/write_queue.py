@@ -0,0 +1,137 @@
+import asyncio
+
+from config import DB_FLUSH_INTERVAL_MS, DB_FLUSH_BATCH, DB_WRITE_QUEUE_SIZE
+
+
+class WriteBehindQueue:
+    """
+    Очередь отложенной записи: изменения копятся и сбрасываются
+    одной транзакцией каждые flush_interval_ms или после flush_batch операций.
+    """
+
+    def __init__(self, pool, flush_interval_ms=DB_FLUSH_INTERVAL_MS,
+                 flush_batch=DB_FLUSH_BATCH, max_pending=DB_WRITE_QUEUE_SIZE):
+        self.pool = pool
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_batch = flush_batch
+        # Ограниченная очередь: при переполнении submit ждет (backpressure)
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._task = None
+        self._closed = False
+        # Группы, еще не зафиксированные в базе (включая уже взятые из очереди)
+        self._unconfirmed = 0
+
+    @property
+    def pending(self):
+        return self._unconfirmed
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, ops, wait=False):
+        """
+        Поставить группу операций [(sql, params), ...] в очередь.
+        Группа всегда попадает в одну транзакцию целиком.
+        wait=True - дождаться фиксации в базе.
+        """
+        if self._closed:
+            raise RuntimeError("Очередь записи закрыта")
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((ops, future))
+        self._unconfirmed += 1
+        if wait:
+            await future
+        return future
+
+    async def flush(self):
+        """Сбросить все накопленные изменения и дождаться фиксации"""
+        if self._task is None:
+            return
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((None, future))
+        await future
+
+    async def close(self):
+        """Записать все оставшиеся изменения и остановить очередь"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is not None:
+            await self.flush()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            barrier = batch[0][0] is None
+
+            while not barrier and len(batch) < self.flush_batch:
+                # Сначала забираем все, что уже лежит в очереди
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                batch.append(item)
+                barrier = item[0] is None
+
+            await self._commit(batch)
+
+    async def _commit(self, batch):
+        groups = [(ops, future) for ops, future in batch if ops is not None]
+        try:
+            if groups:
+                await self._execute(groups)
+        except Exception:
+            # Пакет откатился - повторяем по одной группе,
+            # чтобы ошибочная операция не потеряла чужие изменения
+            for group in groups:
+                try:
+                    await self._execute([group])
+                except Exception as e:
+                    self._resolve(group[1], e)
+                else:
+                    self._resolve(group[1])
+        else:
+            for _, future in groups:
+                self._resolve(future)
+
+        self._unconfirmed -= len(groups)
+
+        # Барьеры flush() снимаются после фиксации всего, что было до них
+        for ops, future in batch:
+            if ops is None:
+                self._resolve(future)
+
+    async def _execute(self, groups):
+        async with self.pool.writer() as db:
+            for ops, _ in groups:
+                for sql, params in ops:
+                    await db.execute(sql, params)
+            await db.commit()
+
+    @staticmethod
+    def _resolve(future, error=None):
+        if future.done():
+            return
+        if error is None:
+            future.set_result(None)
+        else:
+            print(f"Error writing to database: {error}")
+            future.set_exception(error)
+            # Ошибка уже залогирована, даже если подтверждения никто не ждет
+            future.exception()
@@ -0,0 +1,110 @@
+"""
+Акторы игр: у каждой активной игры своя задача asyncio и очередь входящих действий.
+Действия одной игры обрабатываются строго по очереди, без блокировок,
+разные игры - независимо друг от друга.
+"""
+import asyncio
+
+from config import GAME_INBOX_SIZE
+
+
+class GameActor:
+    """Задача, которая по одному передает действия игры обработчику"""
+
+    __slots__ = ('game_id', 'inbox', 'task', 'stopping', '_handler')
+
+    def __init__(self, game_id, handler, maxsize=GAME_INBOX_SIZE):
+        self.game_id = game_id
+        self.inbox = asyncio.Queue(maxsize)
+        self.task = None
+        # Завершиться после текущего действия
+        self.stopping = False
+        self._handler = handler
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    def tell(self, user_id, data):
+        """Положить действие в очередь. False - очередь полна, действие отброшено"""
+        try:
+            self.inbox.put_nowait((user_id, data))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def stop(self):
+        """Доработать уже принятые действия и завершиться"""
+        try:
+            self.inbox.put_nowait(None)
+        except asyncio.QueueFull:
+            if self.task is asyncio.current_task():
+                # Остановка из своего же обработчика: отмена прервала бы его на следующем await
+                self.stopping = True
+            else:
+                self.task.cancel()
+
+    async def _run(self):
+        while True:
+            item = await self.inbox.get()
+            if item is None:
+                return
+            user_id, data = item
+            try:
+                await self._handler(self.game_id, user_id, data)
+            except Exception as e:
+                print(f"Game {self.game_id} action error: {e}")
+            if self.stopping:
+                return
+
+
+class GameActors:
+    """
+    Акторы всех игр этого воркера.
+    handler(game_id, user_id, data) - корутина обработки одного действия.
+    """
+
+    def __init__(self, handler=None, maxsize=GAME_INBOX_SIZE):
+        self.handler = handler
+        self.maxsize = maxsize
+        self._actors = {}
+
+    def __len__(self):
+        return len(self._actors)
+
+    def __contains__(self, game_id):
+        return game_id in self._actors
+
+    def spawn(self, game_id):
+        actor = self._actors.get(game_id)
+        if actor is None:
+            actor = GameActor(game_id, self.handler, self.maxsize)
+            self._actors[game_id] = actor
+            actor.start()
+        return actor
+
+    def tell(self, game_id, user_id, data):
+        actor = self._actors.get(game_id)
+        if actor is None:
+            return False
+        if not actor.tell(user_id, data):
+            print(f"Game {game_id} inbox is full, action dropped")
+            return False
+        return True
+
+    def stop(self, game_id):
+        actor = self._actors.pop(game_id, None)
+        if actor is not None:
+            actor.stop()
+
+    async def close(self):
+        current = asyncio.current_task()
+        actors = []
+        for actor in self._actors.values():
+            if actor.task is current:
+                actor.stopping = True
+            else:
+                actors.append(actor)
+        self._actors.clear()
+        for actor in actors:
+            actor.task.cancel()
+        await asyncio.gather(*(actor.task for actor in actors), return_exceptions=True)
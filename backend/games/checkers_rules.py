@@ -0,0 +1,143 @@
+"""
+Правила шашек в варианте клиента (webapp/checkers.js) на битбордах:
+простая ходит и бьет только вперед, дамка - на одну клетку в любую сторону,
+за ход одно взятие, бить обязательно.
+"""
+from games.moves import IllegalMove
+
+DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+# Белые (w) идут к строке 0, черные (b) - к строке 7
+FORWARD = {True: ((-1, -1), (-1, 1)), False: ((1, -1), (1, 1))}
+
+
+def _tables():
+    steps = {direction: [0] * 64 for direction in DIRECTIONS}
+    jumps = {direction: [None] * 64 for direction in DIRECTIONS}
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        for dr, dc in DIRECTIONS:
+            r, c = row + dr, col + dc
+            if 0 <= r < 8 and 0 <= c < 8:
+                steps[dr, dc][sq] = 1 << (r * 8 + c)
+            r2, c2 = row + 2 * dr, col + 2 * dc
+            if 0 <= r2 < 8 and 0 <= c2 < 8:
+                jumps[dr, dc][sq] = (r * 8 + c, r2 * 8 + c2)
+    return steps, jumps
+
+
+# Соседняя клетка по направлению и (перепрыгиваемая, клетка приземления)
+STEPS, JUMPS = _tables()
+
+
+def _squares(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class CheckersRules:
+    """Битборды простых и дамок обоих цветов и очередь хода"""
+
+    __slots__ = ('pieces', 'white_to_move')
+
+    def __init__(self, board):
+        self.pieces = dict.fromkeys('wWbB', 0)
+        for sq, cell in enumerate(board.cells):
+            if cell != 32:
+                self.pieces[chr(cell)] |= 1 << sq
+        self.white_to_move = True
+
+    def state(self):
+        """Все, чего нет на доске: для снимка партии"""
+        return {'white_to_move': self.white_to_move}
+
+    def restore(self, state):
+        self.white_to_move = state['white_to_move']
+
+    def _own(self, white):
+        p = self.pieces
+        return p['w'] | p['W'] if white else p['b'] | p['B']
+
+    def _directions(self, piece):
+        return DIRECTIONS if piece in 'WB' else FORWARD[piece == 'w']
+
+    def _captures(self, sq, piece):
+        """Взятия фигуры: [(перепрыгиваемая клетка, клетка приземления)]"""
+        white = piece in 'wW'
+        enemy = self._own(not white)
+        occupied = enemy | self._own(white)
+        result = []
+        for direction in self._directions(piece):
+            jump = JUMPS[direction][sq]
+            if jump is not None and enemy >> jump[0] & 1 and not occupied >> jump[1] & 1:
+                result.append(jump)
+        return result
+
+    def _steps(self, sq, piece):
+        occupied = self._own(True) | self._own(False)
+        targets = 0
+        for direction in self._directions(piece):
+            targets |= STEPS[direction][sq]
+        return targets & ~occupied
+
+    def _side_pieces(self, white):
+        for piece in ('w', 'W') if white else ('b', 'B'):
+            for sq in _squares(self.pieces[piece]):
+                yield sq, piece
+
+    def must_capture(self, white):
+        return any(self._captures(sq, piece) for sq, piece in self._side_pieces(white))
+
+    def has_legal_move(self, white):
+        return any(
+            self._captures(sq, piece) or self._steps(sq, piece)
+            for sq, piece in self._side_pieces(white)
+        )
+
+    def play(self, move, board, white):
+        """
+        Проверить и сделать ход стороны white. Обновляет board и move['captures'].
+        Возвращает None или 'no_moves' - у соперника не осталось ходов, ходивший победил.
+        """
+        if white != self.white_to_move:
+            raise IllegalMove("Сейчас ход соперника")
+        frm = move['from'][0] * 8 + move['from'][1]
+        to = move['to'][0] * 8 + move['to'][1]
+        piece = chr(board.cells[frm])
+        if piece == ' ' or (piece in 'wW') != white:
+            raise IllegalMove("Не своя шашка")
+
+        captured = None
+        for over, land in self._captures(frm, piece):
+            if land == to:
+                captured = over
+        if captured is None:
+            if self.must_capture(white):
+                raise IllegalMove("Бить обязательно")
+            if not self._steps(frm, piece) >> to & 1:
+                raise IllegalMove("Шашка так не ходит")
+
+        p = self.pieces
+        p[piece] ^= 1 << frm
+        board.cells[frm] = 32
+        if captured is not None:
+            for enemy in ('b', 'B') if white else ('w', 'W'):
+                p[enemy] &= ~(1 << captured)
+            board.cells[captured] = 32
+            move['captures'] = [divmod(captured, 8)]
+        else:
+            move.pop('captures', None)
+
+        # Превращение в дамку на последней горизонтали
+        if piece == 'w' and to < 8:
+            piece = 'W'
+        elif piece == 'b' and to >= 56:
+            piece = 'B'
+        p[piece] |= 1 << to
+        board.cells[to] = ord(piece)
+
+        self.white_to_move = not white
+        if not self.has_legal_move(not white):
+            return 'no_moves'
+        return None
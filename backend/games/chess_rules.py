@@ -0,0 +1,298 @@
+"""
+Правила шахмат на битбордах.
+Клетка sq = row * 8 + col, строка 0 - сверху (сторона черных), как на клиенте.
+"""
+from games.moves import IllegalMove
+
+# (dr, dc) направлений; для "положительных" индекс клетки растет по лучу
+DIRECTIONS = {
+    'n': (-1, 0), 's': (1, 0), 'e': (0, 1), 'w': (0, -1),
+    'ne': (-1, 1), 'nw': (-1, -1), 'se': (1, 1), 'sw': (1, -1),
+}
+POSITIVE = {'s', 'e', 'se', 'sw'}
+ROOK_DIRECTIONS = ('n', 's', 'e', 'w')
+BISHOP_DIRECTIONS = ('ne', 'nw', 'se', 'sw')
+
+
+def _offsets_table(offsets):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bits = 0
+        for dr, dc in offsets:
+            r, c = row + dr, col + dc
+            if 0 <= r < 8 and 0 <= c < 8:
+                bits |= 1 << (r * 8 + c)
+        table.append(bits)
+    return table
+
+
+def _ray_table(dr, dc):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bits = 0
+        r, c = row + dr, col + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            bits |= 1 << (r * 8 + c)
+            r, c = r + dr, c + dc
+        table.append(bits)
+    return table
+
+
+# Таблицы атак считаются один раз при импорте
+KNIGHT_ATTACKS = _offsets_table([(-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)])
+KING_ATTACKS = _offsets_table([(dr, dc) for dr in (-1, 0, 1) for dc in (-1, 0, 1) if dr or dc])
+# Белые пешки бьют вверх (к строке 0), черные - вниз
+PAWN_ATTACKS = {
+    True: _offsets_table([(-1, -1), (-1, 1)]),
+    False: _offsets_table([(1, -1), (1, 1)]),
+}
+RAYS = {name: _ray_table(dr, dc) for name, (dr, dc) in DIRECTIONS.items()}
+
+WHITE_PIECES = 'PNBRQK'
+BLACK_PIECES = 'pnbrqk'
+
+# Рокировка: право -> (клетка короля, куда, ладья откуда, ладья куда, пустые, небитые)
+CASTLING = {
+    'K': (60, 62, 63, 61, (61, 62), (60, 61, 62)),
+    'Q': (60, 58, 56, 59, (57, 58, 59), (60, 59, 58)),
+    'k': (4, 6, 7, 5, (5, 6), (4, 5, 6)),
+    'q': (4, 2, 0, 3, (1, 2, 3), (4, 3, 2)),
+}
+# Клетки, уход с которых (или взятие на которых) снимает право рокировки
+CASTLING_SQUARES = {60: 'KQ', 63: 'K', 56: 'Q', 4: 'kq', 7: 'k', 0: 'q'}
+
+
+def _lsb(bits):
+    return (bits & -bits).bit_length() - 1
+
+
+def slider_attacks(sq, occupied, directions):
+    """Атаки дальнобойной фигуры: луч до первой блокирующей клетки включительно"""
+    attacks = 0
+    for name in directions:
+        ray = RAYS[name][sq]
+        blockers = ray & occupied
+        if blockers:
+            first = _lsb(blockers) if name in POSITIVE else blockers.bit_length() - 1
+            ray ^= RAYS[name][first]
+        attacks |= ray
+    return attacks
+
+
+def _squares(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class ChessRules:
+    """
+    Состояние партии для проверки ходов: битборды фигур, очередь хода,
+    права на рокировку и клетка взятия на проходе.
+    Доска Board обновляется вместе с битбордами.
+    """
+
+    __slots__ = ('pieces', 'white_to_move', 'castling', 'en_passant')
+
+    def __init__(self, board):
+        self.pieces = dict.fromkeys(WHITE_PIECES + BLACK_PIECES, 0)
+        for sq, cell in enumerate(board.cells):
+            if cell != 32:
+                self.pieces[chr(cell)] |= 1 << sq
+        self.white_to_move = True
+        self.castling = ''.join(
+            right for right, (king, _, rook, _, _, _) in CASTLING.items()
+            if board.cells[king] == ord('K' if right.isupper() else 'k')
+            and board.cells[rook] == ord('R' if right.isupper() else 'r')
+        )
+        self.en_passant = None
+
+    def _copy(self):
+        other = ChessRules.__new__(ChessRules)
+        other.pieces = dict(self.pieces)
+        other.white_to_move = self.white_to_move
+        other.castling = self.castling
+        other.en_passant = self.en_passant
+        return other
+
+    def state(self):
+        """Все, чего нет на доске: для снимка партии"""
+        return {'white_to_move': self.white_to_move, 'castling': self.castling,
+                'en_passant': self.en_passant}
+
+    def restore(self, state):
+        self.white_to_move = state['white_to_move']
+        self.castling = state['castling']
+        self.en_passant = state['en_passant']
+
+    def _occupancy(self, white):
+        p = self.pieces
+        if white:
+            return p['P'] | p['N'] | p['B'] | p['R'] | p['Q'] | p['K']
+        return p['p'] | p['n'] | p['b'] | p['r'] | p['q'] | p['k']
+
+    def is_attacked(self, sq, by_white):
+        p = self.pieces
+        occupied = self._occupancy(True) | self._occupancy(False)
+        if by_white:
+            pawn, knight, bishop, rook, queen, king = (p[c] for c in WHITE_PIECES)
+        else:
+            pawn, knight, bishop, rook, queen, king = (p[c] for c in BLACK_PIECES)
+        # Пешку, бьющую sq, ищем "обратной" атакой пешки противоположного цвета
+        return bool(
+            PAWN_ATTACKS[not by_white][sq] & pawn
+            or KNIGHT_ATTACKS[sq] & knight
+            or KING_ATTACKS[sq] & king
+            or slider_attacks(sq, occupied, ROOK_DIRECTIONS) & (rook | queen)
+            or slider_attacks(sq, occupied, BISHOP_DIRECTIONS) & (bishop | queen)
+        )
+
+    def in_check(self, white):
+        king = self.pieces['K' if white else 'k']
+        return bool(king) and self.is_attacked(_lsb(king), not white)
+
+    def _targets(self, sq, piece):
+        """Псевдолегальные клетки хода фигуры (без проверки шаха своему королю)"""
+        white = piece.isupper()
+        own = self._occupancy(white)
+        enemy = self._occupancy(not white)
+        occupied = own | enemy
+        kind = piece.upper()
+
+        if kind == 'N':
+            return KNIGHT_ATTACKS[sq] & ~own
+        if kind == 'B':
+            return slider_attacks(sq, occupied, BISHOP_DIRECTIONS) & ~own
+        if kind == 'R':
+            return slider_attacks(sq, occupied, ROOK_DIRECTIONS) & ~own
+        if kind == 'Q':
+            return slider_attacks(sq, occupied, ROOK_DIRECTIONS + BISHOP_DIRECTIONS) & ~own
+        if kind == 'K':
+            targets = KING_ATTACKS[sq] & ~own
+            for right in self.castling:
+                king, to, _, _, empty, safe = CASTLING[right]
+                if (right.isupper() == white and king == sq
+                        and not any(occupied >> s & 1 for s in empty)
+                        and not any(self.is_attacked(s, not white) for s in safe)):
+                    targets |= 1 << to
+            return targets
+
+        # Пешка
+        step = -8 if white else 8
+        targets = 0
+        one = sq + step
+        if 0 <= one < 64 and not occupied >> one & 1:
+            targets |= 1 << one
+            start_row = 6 if white else 1
+            two = one + step
+            if sq // 8 == start_row and not occupied >> two & 1:
+                targets |= 1 << two
+        capturable = enemy
+        if self.en_passant is not None:
+            capturable |= 1 << self.en_passant
+        return targets | (PAWN_ATTACKS[white][sq] & capturable)
+
+    def _make(self, frm, to, piece, promotion):
+        """Сделать псевдолегальный ход. Возвращает изменения доски [(sq, символ)]"""
+        p = self.pieces
+        white = piece.isupper()
+        changes = [(frm, ' ')]
+        p[piece] ^= 1 << frm
+
+        # Взятие обычное и на проходе
+        captured_sq = to
+        if piece in 'Pp' and to == self.en_passant:
+            captured_sq = to + (8 if white else -8)
+            changes.append((captured_sq, ' '))
+        for enemy in (BLACK_PIECES if white else WHITE_PIECES):
+            if p[enemy] >> captured_sq & 1:
+                p[enemy] ^= 1 << captured_sq
+                break
+
+        placed = promotion or piece
+        p[placed] |= 1 << to
+        changes.append((to, placed))
+
+        # Рокировка: ладья переходит вместе с королем
+        if piece in 'Kk' and abs(to - frm) == 2:
+            rook_piece = 'R' if white else 'r'
+            for right in ('K', 'Q') if white else ('k', 'q'):
+                king, king_to, rook, rook_to, _, _ = CASTLING[right]
+                if king == frm and king_to == to:
+                    p[rook_piece] ^= (1 << rook) | (1 << rook_to)
+                    changes += [(rook, ' '), (rook_to, rook_piece)]
+
+        for sq in (frm, to):
+            for right in CASTLING_SQUARES.get(sq, ''):
+                self.castling = self.castling.replace(right, '')
+
+        self.en_passant = (frm + to) // 2 if piece in 'Pp' and abs(to - frm) == 16 else None
+        self.white_to_move = not white
+        return changes
+
+    def _legal(self, frm, to, piece, promotion=None):
+        """Позиция после хода или None, если свой король остается под шахом"""
+        after = self._copy()
+        changes = after._make(frm, to, piece, promotion)
+        if after.in_check(piece.isupper()):
+            return None, None
+        return after, changes
+
+    def has_legal_move(self, white):
+        for piece in (WHITE_PIECES if white else BLACK_PIECES):
+            for frm in _squares(self.pieces[piece]):
+                for to in _squares(self._targets(frm, piece)):
+                    promotion = None
+                    if piece in 'Pp' and to // 8 in (0, 7):
+                        promotion = 'Q' if white else 'q'
+                    if self._legal(frm, to, piece, promotion)[0] is not None:
+                        return True
+        return False
+
+    def _insufficient_material(self):
+        p = self.pieces
+        return not any(p[c] for c in 'PNBRQpnbrq')
+
+    def play(self, move, board, white):
+        """
+        Проверить и сделать ход стороны white. Обновляет board.
+        Возвращает None или причину конца партии:
+        'checkmate' (победил ходивший), 'stalemate', 'insufficient_material' (ничья).
+        """
+        if white != self.white_to_move:
+            raise IllegalMove("Сейчас ход соперника")
+        frm = move['from'][0] * 8 + move['from'][1]
+        to = move['to'][0] * 8 + move['to'][1]
+        piece = chr(board.cells[frm])
+        if piece == ' ' or piece.isupper() != white:
+            raise IllegalMove("Не своя фигура")
+        if not self._targets(frm, piece) >> to & 1:
+            raise IllegalMove("Фигура так не ходит")
+
+        promotion = None
+        if piece in 'Pp' and to // 8 in (0, 7):
+            promotion = move.get('promotion', 'q')
+            promotion = promotion.upper() if white else promotion.lower()
+            move['promotion'] = promotion.lower()
+        else:
+            move.pop('promotion', None)
+
+        after, changes = self._legal(frm, to, piece, promotion)
+        if after is None:
+            raise IllegalMove("Король остается под шахом")
+
+        self.pieces = after.pieces
+        self.white_to_move = after.white_to_move
+        self.castling = after.castling
+        self.en_passant = after.en_passant
+        for sq, cell in changes:
+            board.cells[sq] = ord(cell)
+
+        if self._insufficient_material():
+            return 'insufficient_material'
+        if not self.has_legal_move(not white):
+            return 'checkmate' if self.in_check(not white) else 'stalemate'
+        return None
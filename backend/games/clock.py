@@ -0,0 +1,115 @@
+"""
+Шахматные часы на сервере. Время игроков считает только сервер,
+клиенту отдаются остатки в миллисекундах.
+
+Режимы:
+  increment - после каждого хода к остатку прибавляется increment (Фишер)
+  delay     - первые delay секунд хода не списываются (Бронштейн/US delay)
+"""
+import time
+
+MODES = ('increment', 'delay')
+
+
+class TimeControl:
+    __slots__ = ('initial', 'bonus', 'mode')
+
+    def __init__(self, initial, bonus=0, mode='increment'):
+        if initial <= 0 or bonus < 0 or mode not in MODES:
+            raise ValueError(f"Неверный контроль времени: {initial}+{bonus} {mode}")
+        self.initial = initial
+        self.bonus = bonus
+        self.mode = mode
+
+    @classmethod
+    def from_dict(cls, data):
+        """{'initial': секунды, 'increment'|'delay': секунды} от клиента, None - без часов"""
+        if not data:
+            return None
+        if data.get('delay'):
+            return cls(float(data['initial']), float(data['delay']), 'delay')
+        return cls(float(data['initial']), float(data.get('increment', 0)))
+
+    def to_dict(self):
+        return {'initial': self.initial, 'mode': self.mode, self.mode: self.bonus}
+
+
+class GameClock:
+    """
+    Остатки обоих игроков и чьи часы идут.
+    now - time.monotonic(), передается снаружи, чтобы все решения по одной
+    игре принимались для одного момента времени.
+    """
+
+    __slots__ = ('control', 'remaining', 'white_running', 'turn_started')
+
+    def __init__(self, control):
+        self.control = control
+        # [белые, черные], секунды
+        self.remaining = [control.initial, control.initial]
+        # None - часы стоят (игра еще не началась)
+        self.white_running = None
+        self.turn_started = 0.0
+
+    def start(self, now=None):
+        """Игра началась: пошли часы белых"""
+        self.white_running = True
+        self.turn_started = time.monotonic() if now is None else now
+
+    def _charged(self, now):
+        elapsed = max(0.0, now - self.turn_started)
+        if self.control.mode == 'delay':
+            return max(0.0, elapsed - self.control.bonus)
+        return elapsed
+
+    def left(self, white, now=None):
+        """Остаток стороны на момент now"""
+        now = time.monotonic() if now is None else now
+        left = self.remaining[0 if white else 1]
+        if self.white_running is white:
+            left -= self._charged(now)
+        return left
+
+    def flagged(self, now=None):
+        """Время идущей стороны вышло"""
+        return self.white_running is not None and self.left(self.white_running, now) <= 0
+
+    def press(self, now=None):
+        """Ход сделан: списать время ходившего, добавить прибавку, переключить часы"""
+        now = time.monotonic() if now is None else now
+        side = 0 if self.white_running else 1
+        self.remaining[side] -= self._charged(now)
+        if self.control.mode == 'increment':
+            self.remaining[side] += self.control.bonus
+        self.white_running = not self.white_running
+        self.turn_started = now
+
+    def deadline(self):
+        """Момент (по time.monotonic), когда упадет флаг идущей стороны"""
+        if self.white_running is None:
+            return None
+        left = self.remaining[0 if self.white_running else 1]
+        if self.control.mode == 'delay':
+            left += self.control.bonus
+        return self.turn_started + left
+
+    def to_dict(self, now=None):
+        now = time.monotonic() if now is None else now
+        return {
+            'white': max(0, int(self.left(True, now) * 1000)),
+            'black': max(0, int(self.left(False, now) * 1000)),
+            'running': None if self.white_running is None else ('white' if self.white_running else 'black')
+        }
+
+    def state(self):
+        """Для снимка: остатки без учета идущего хода (время простоя сервера не списывается)"""
+        return {'control': self.control.to_dict(), 'remaining': list(self.remaining),
+                'white_running': self.white_running}
+
+    @classmethod
+    def restore(cls, state, now=None):
+        clock = cls(TimeControl.from_dict(state['control']))
+        clock.remaining = list(state['remaining'])
+        clock.white_running = state['white_running']
+        clock.turn_started = time.monotonic() if now is None else now
+        return clock
@@ -0,0 +1,196 @@
+import asyncio
+import itertools
+import time
+
+from databases.leaderboard import SortedList
+from config import (
+    MATCH_BASE_WINDOW, MATCH_WINDOW_GROWTH, MATCH_MAX_WINDOW,
+    MATCH_QUEUE_TTL, MATCH_TICK_INTERVAL
+)
+
+
+class QueueEntry:
+    __slots__ = ('user_id', 'game_type', 'rating', 'joined_at', 'key')
+
+    def __init__(self, user_id, game_type, rating, joined_at, seq):
+        self.user_id = user_id
+        self.game_type = game_type
+        self.rating = rating
+        self.joined_at = joined_at
+        # Порядок в корзине: по рейтингу, при равенстве - кто раньше встал
+        self.key = (rating, seq, user_id)
+
+
+class Matchmaker:
+    """
+    Очереди поиска игры по типам, отсортированные по рейтингу.
+    Соперник - ближайший по рейтингу сосед, если разница укладывается
+    в окно того, кто ждет дольше. Окно растет со временем ожидания.
+    """
+
+    def __init__(self, game_types, on_match=None, on_evict=None, base_window=MATCH_BASE_WINDOW,
+                 window_growth=MATCH_WINDOW_GROWTH, max_window=MATCH_MAX_WINDOW,
+                 ttl=MATCH_QUEUE_TTL, tick_interval=MATCH_TICK_INTERVAL):
+        self._queues = {game_type: SortedList() for game_type in game_types}
+        # user_id -> QueueEntry: игрок стоит не больше чем в одной очереди
+        self._entries = {}
+        self._seq = itertools.count()
+        # on_match(game_type, user_id1, user_id2) - корутина, создающая игру
+        self.on_match = on_match
+        # on_evict(entry) - корутина: игрок простоял в очереди дольше ttl
+        self.on_evict = on_evict
+        # on_tick() - корутина в начале каждого тика фонового подбора
+        self.on_tick = None
+        self.base_window = base_window
+        self.window_growth = window_growth
+        self.max_window = max_window
+        self.ttl = ttl
+        self.tick_interval = tick_interval
+        self._task = None
+
+    def __contains__(self, user_id):
+        return user_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def queued(self, game_type):
+        return len(self._queues[game_type])
+
+    def window(self, entry, now):
+        waited = now - entry.joined_at
+        return min(self.base_window + self.window_growth * waited, self.max_window)
+
+    def enqueue(self, user_id, game_type, rating, now=None):
+        """
+        Встать в очередь. Сразу возвращает соперника, если он подходит,
+        иначе None. Повторный запрос не сбрасывает место в очереди.
+        """
+        now = time.monotonic() if now is None else now
+        queue = self._queues[game_type]
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.game_type != game_type:
+            self._remove(entry)
+            entry = None
+        if entry is None:
+            entry = QueueEntry(user_id, game_type, rating, now, next(self._seq))
+            self._entries[user_id] = entry
+            queue.add(entry.key)
+
+        opponent = self._best_opponent(entry, now)
+        if opponent is None:
+            return None
+        self._remove(entry)
+        self._remove(opponent)
+        return opponent
+
+    def cancel(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return False
+        self._remove(entry)
+        return True
+
+    def drain(self):
+        """Вынуть всех из очереди в порядке постановки"""
+        entries = list(self._entries.values())
+        for entry in entries:
+            self._remove(entry)
+        return entries
+
+    def requeue(self, entry):
+        """Вернуть игрока на прежнее место, если он еще не встал в очередь заново"""
+        if entry.user_id in self._entries:
+            return False
+        self._entries[entry.user_id] = entry
+        self._queues[entry.game_type].add(entry.key)
+        # Порядок словаря - порядок постановки: на нем держатся evict_stale и match_all.
+        # Возврат бывает только после ошибки, полная перестройка здесь допустима
+        self._entries = dict(sorted(self._entries.items(), key=lambda item: item[1].joined_at))
+        return True
+
+    def _remove(self, entry):
+        del self._entries[entry.user_id]
+        self._queues[entry.game_type].remove(entry.key)
+
+    def _best_opponent(self, entry, now):
+        queue = self._queues[entry.game_type]
+        best = None
+        best_diff = None
+        # Ближайший по рейтингу - один из двух соседей в отсортированной очереди
+        for key in (queue.prev(entry.key), queue.next(entry.key)):
+            if key is None:
+                continue
+            other = self._entries[key[2]]
+            diff = abs(other.rating - entry.rating)
+            if diff > max(self.window(entry, now), self.window(other, now)):
+                continue
+            if best is None or diff < best_diff:
+                best, best_diff = other, diff
+        return best
+
+    def match_all(self, now=None):
+        """Подбор пачкой: первыми получают пару те, кто ждет дольше"""
+        now = time.monotonic() if now is None else now
+        pairs = []
+        # Словарь хранит порядок вставки, то есть порядок постановки в очередь
+        for entry in list(self._entries.values()):
+            if entry.user_id not in self._entries:
+                continue
+            opponent = self._best_opponent(entry, now)
+            if opponent is not None:
+                self._remove(entry)
+                self._remove(opponent)
+                pairs.append((entry, opponent))
+        return pairs
+
+    def evict_stale(self, now=None):
+        """Убрать тех, кто ждет дольше ttl"""
+        now = time.monotonic() if now is None else now
+        stale = []
+        for entry in self._entries.values():
+            if now - entry.joined_at <= self.ttl:
+                # Дальше только те, кто встал позже
+                break
+            stale.append(entry)
+        for entry in stale:
+            self._remove(entry)
+        return stale
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            if self.on_tick is not None:
+                try:
+                    await self.on_tick()
+                except Exception as e:
+                    print(f"Matchmaking tick error: {e}")
+            for entry in self.evict_stale():
+                if self.on_evict is not None:
+                    try:
+                        await self.on_evict(entry)
+                    except Exception as e:
+                        print(f"Matchmaking evict error: {e}")
+            # Пары уже вынуты из очереди: ошибка одной не должна терять остальные
+            for entry, opponent in self.match_all():
+                if self.on_match is None:
+                    continue
+                try:
+                    await self.on_match(entry.game_type, entry.user_id, opponent.user_id)
+                except Exception as e:
+                    print(f"Matchmaking error: {e}")
+                    self.requeue(entry)
+                    self.requeue(opponent)
@@ -0,0 +1,129 @@
+import time
+from datetime import datetime
+
+EMPTY = ord(' ')
+
+
+class Player:
+    __slots__ = ('id', 'username')
+
+    def __init__(self, user_id, username=None):
+        self.id = user_id
+        self.username = username or f'Player{user_id}'
+
+    def to_dict(self):
+        return {'id': self.id, 'username': self.username}
+
+
+class Board:
+    """
+    Доска 8x8 в одном bytearray: клетка - ASCII-код фигуры, пробел - пусто.
+    Снаружи выглядит как список строк из односимвольных строк, как у клиента.
+    """
+
+    __slots__ = ('cells',)
+
+    def __init__(self, cells=None):
+        self.cells = bytearray(cells) if cells is not None else bytearray(b' ' * 64)
+
+    @classmethod
+    def from_rows(cls, rows):
+        if len(rows) != 8 or any(len(row) != 8 for row in rows):
+            raise ValueError("Доска должна быть 8x8")
+        return cls(''.join(cell or ' ' for row in rows for cell in row).encode('ascii'))
+
+    def to_rows(self):
+        text = self.cells.decode('ascii')
+        return [list(text[i:i + 8]) for i in range(0, 64, 8)]
+
+    def __getitem__(self, square):
+        row, col = square
+        return chr(self.cells[row * 8 + col])
+
+    def __setitem__(self, square, piece):
+        row, col = square
+        self.cells[row * 8 + col] = ord(piece)
+
+    def __eq__(self, other):
+        return isinstance(other, Board) and self.cells == other.cells
+
+
+class Game:
+    """Активная игра. to_dict() отдает тот же формат, что видит клиент"""
+
+    __slots__ = (
+        'id', 'code', 'type', 'player1', 'player2', 'status',
+        'current_player', 'created_at', 'started_at', 'board', 'rules', 'clock', 'seq', 'last_move',
+        'rps_choices'
+    )
+
+    def __init__(self, game_id, game_type, player1, player2=None, code=None,
+                 status='waiting', current_player=None, board=None, rules=None, clock=None):
+        self.id = game_id
+        self.code = code
+        self.type = game_type
+        self.player1 = player1
+        self.player2 = player2
+        self.status = status
+        self.current_player = current_player
+        # Время создания числом - втрое меньше строки ISO
+        self.created_at = time.time()
+        # Когда пришел второй игрок (time.time()), для длительности партии
+        self.started_at = None
+        # Доска сервера - единственная верная, клиенты присылают только ходы
+        self.board = board
+        # Проверка ходов по правилам (ChessRules / CheckersRules)
+        self.rules = rules
+        # Шахматные часы GameClock, None - игра без контроля времени
+        self.clock = clock
+        # Номер последнего хода
+        self.seq = 0
+        # Последний ход без доски: from/to/promotion/captures
+        self.last_move = None
+        self.rps_choices = None
+
+    def is_white(self, user_id):
+        # Первый игрок - белые и ходит первым
+        return self.player1.id == user_id
+
+    def player_ids(self):
+        if self.player2 is None:
+            return (self.player1.id,)
+        return (self.player1.id, self.player2.id)
+
+    def has_player(self, user_id):
+        return self.player1.id == user_id or (self.player2 is not None and self.player2.id == user_id)
+
+    def opponent_id(self, user_id):
+        if self.player1.id == user_id:
+            return self.player2.id if self.player2 is not None else None
+        return self.player1.id
+
+    def player_name(self, user_id):
+        if self.player1.id == user_id:
+            return self.player1.username
+        return self.player2.username
+
+    def to_dict(self):
+        data = {
+            'id': self.id,
+            'type': self.type,
+            'player1': self.player1.to_dict(),
+            'player2': self.player2.to_dict() if self.player2 is not None else None,
+            'status': self.status,
+            'created_at': datetime.fromtimestamp(self.created_at).isoformat()
+        }
+        if self.code is not None:
+            data['code'] = self.code
+        if self.current_player is not None:
+            data['currentPlayer'] = self.current_player
+        if self.board is not None:
+            state = dict(self.last_move or {})
+            state['board'] = self.board.to_rows()
+            state['seq'] = self.seq
+            data['state'] = state
+        if self.clock is not None:
+            data['clock'] = self.clock.to_dict()
+        if self.rps_choices is not None:
+            data['rps_choices'] = dict(self.rps_choices)
+        return data
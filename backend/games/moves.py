@@ -0,0 +1,81 @@
+from games.models import Board
+
+
+class IllegalMove(ValueError):
+    """Ход не проходит по правилам игры"""
+
+
+# Начальные позиции - как в webapp/chess.js и webapp/checkers.js
+INITIAL_POSITIONS = {
+    'chess': (
+        "rnbqkbnr"
+        "pppppppp"
+        "        "
+        "        "
+        "        "
+        "        "
+        "PPPPPPPP"
+        "RNBQKBNR"
+    ),
+    'checkers': (
+        " b b b b"
+        "b b b b "
+        " b b b b"
+        "        "
+        "        "
+        "w w w w "
+        " w w w w"
+        "w w w w "
+    ),
+}
+
+
+def initial_board(game_type):
+    """Доска для новой игры, None для игр без доски (КНБ)"""
+    position = INITIAL_POSITIONS.get(game_type)
+    return Board(position.encode('ascii')) if position is not None else None
+
+
+def board_hash(board):
+    """FNV-1a (32 бита) по 64 клеткам - та же функция, что boardHash в webapp/app.js"""
+    value = 0x811c9dc5
+    for cell in board.cells:
+        value = ((value ^ cell) * 0x01000193) & 0xffffffff
+    return value
+
+
+def _square(data):
+    row, col = data['row'], data['col']
+    if type(row) is not int or type(col) is not int or not (0 <= row < 8 and 0 <= col < 8):
+        raise IllegalMove(f"Неверная клетка: {data!r}")
+    return row, col
+
+
+def parse_move(data):
+    """
+    Ход от клиента: {from, to, promotion?, captures?}.
+    Возвращает компактный ход в том же формате без лишних полей.
+    """
+    move = {'from': _square(data['from']), 'to': _square(data['to'])}
+    promotion = data.get('promotion')
+    if promotion is not None:
+        if not isinstance(promotion, str) or len(promotion) != 1 or promotion not in 'QRBNqrbn':
+            raise IllegalMove(f"Неверное превращение: {promotion!r}")
+        move['promotion'] = promotion
+    captures = data.get('captures')
+    if captures:
+        move['captures'] = [_square(square) for square in captures]
+    return move
+
+
+def move_to_wire(move):
+    """Ход для отправки клиенту: клетки снова в виде {row, col}"""
+    data = {
+        'from': {'row': move['from'][0], 'col': move['from'][1]},
+        'to': {'row': move['to'][0], 'col': move['to'][1]}
+    }
+    if 'promotion' in move:
+        data['promotion'] = move['promotion']
+    if 'captures' in move:
+        data['captures'] = [{'row': row, 'col': col} for row, col in move['captures']]
+    return data
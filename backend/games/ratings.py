@@ -0,0 +1,103 @@
+"""
+Рейтинг игроков после партии: Эло или Glicko-2 (RATING_SYSTEM).
+Одна партия - один рейтинговый период, рейтинг меняется сразу после игры.
+"""
+import math
+
+from config import RATING_SYSTEM, ELO_K, GLICKO_TAU
+
+DEFAULT_RATING = 1000
+DEFAULT_RD = 350.0
+DEFAULT_VOLATILITY = 0.06
+# Перевод в шкалу Glicko-2; центр шкалы - стартовый рейтинг
+GLICKO_SCALE = 173.7178
+GLICKO_EPSILON = 0.000001
+
+
+class PlayerRating:
+    """Рейтинг, его отклонение (RD) и волатильность. RD и волатильность нужны только Glicko-2"""
+
+    __slots__ = ('rating', 'rd', 'volatility')
+
+    def __init__(self, rating=DEFAULT_RATING, rd=DEFAULT_RD, volatility=DEFAULT_VOLATILITY):
+        self.rating = rating
+        self.rd = rd
+        self.volatility = volatility
+
+    def __repr__(self):
+        return f"PlayerRating({self.rating:.1f}, rd={self.rd:.1f}, vol={self.volatility:.4f})"
+
+
+def expected_score(rating, opponent_rating):
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def elo(player, opponent, score, k=ELO_K):
+    """score: 1 - победа, 0.5 - ничья, 0 - поражение"""
+    rating = player.rating + k * (score - expected_score(player.rating, opponent.rating))
+    return PlayerRating(rating, player.rd, player.volatility)
+
+
+def _g(phi):
+    return 1 / math.sqrt(1 + 3 * phi * phi / (math.pi * math.pi))
+
+
+def glicko2(player, opponent, score, tau=GLICKO_TAU):
+    """Одна партия по Glicko-2 (Glickman, 2012), волатильность - методом Иллинойса"""
+    mu = (player.rating - DEFAULT_RATING) / GLICKO_SCALE
+    phi = player.rd / GLICKO_SCALE
+    mu_j = (opponent.rating - DEFAULT_RATING) / GLICKO_SCALE
+    g = _g(opponent.rd / GLICKO_SCALE)
+    expected = 1 / (1 + math.exp(-g * (mu - mu_j)))
+    v = 1 / (g * g * expected * (1 - expected))
+    delta = v * g * (score - expected)
+
+    a = math.log(player.volatility ** 2)
+
+    def f(x):
+        ex = math.exp(x)
+        return (ex * (delta * delta - phi * phi - v - ex) / (2 * (phi * phi + v + ex) ** 2)
+                - (x - a) / (tau * tau))
+
+    A = a
+    if delta * delta > phi * phi + v:
+        B = math.log(delta * delta - phi * phi - v)
+    else:
+        k = 1
+        while f(a - k * tau) < 0:
+            k += 1
+        B = a - k * tau
+    f_a, f_b = f(A), f(B)
+    while abs(B - A) > GLICKO_EPSILON:
+        C = A + (A - B) * f_a / (f_b - f_a)
+        f_c = f(C)
+        if f_c * f_b <= 0:
+            A, f_a = B, f_b
+        else:
+            f_a /= 2
+        B, f_b = C, f_c
+    volatility = math.exp(A / 2)
+
+    phi_star = math.sqrt(phi * phi + volatility * volatility)
+    phi_new = 1 / math.sqrt(1 / (phi_star * phi_star) + 1 / v)
+    mu_new = mu + phi_new * phi_new * g * (score - expected)
+    return PlayerRating(
+        GLICKO_SCALE * mu_new + DEFAULT_RATING,
+        GLICKO_SCALE * phi_new,
+        volatility
+    )
+
+
+SYSTEMS = {
+    'elo': elo,
+    'glicko2': glicko2,
+}
+
+
+def rate(player1, player2, score, system=RATING_SYSTEM):
+    """
+    Новые рейтинги обоих игроков.
+    score - результат первого игрока: 1, 0.5 или 0
+    """
+    update = SYSTEMS[system]
+    return update(player1, player2, score), update(player2, player1, 1 - score)
@@ -0,0 +1,101 @@
+class GameRegistry:
+    """
+    Активные игры с индексами по коду приглашения, игрокам и статусу.
+    Все изменения идут через методы реестра, поэтому индексы
+    всегда согласованы с самими играми.
+    """
+
+    def __init__(self):
+        self._games = {}
+        # code -> game_id (только ожидающие игры)
+        self._by_code = {}
+        # user_id -> {game_id}
+        self._by_user = {}
+        # status -> {game_id: game}
+        self._by_status = {}
+
+    def __len__(self):
+        return len(self._games)
+
+    def __contains__(self, game_id):
+        return game_id in self._games
+
+    def __getitem__(self, game_id):
+        return self._games[game_id]
+
+    def get(self, game_id):
+        return self._games.get(game_id)
+
+    def items(self):
+        return self._games.items()
+
+    def values(self):
+        return self._games.values()
+
+    def has_code(self, code):
+        return code in self._by_code
+
+    def add(self, game):
+        game_id = game.id
+        if game_id in self._games:
+            self.remove(game_id)
+        self._games[game_id] = game
+        self._index(game)
+        return game
+
+    def join(self, game_id, player):
+        """Второй игрок присоединяется к ожидающей игре"""
+        game = self._games[game_id]
+        self._unindex(game)
+        game.player2 = player
+        game.status = 'active'
+        game.current_player = game.player1.id
+        self._index(game)
+        return game
+
+    def set_status(self, game_id, status):
+        game = self._games[game_id]
+        self._unindex(game)
+        game.status = status
+        self._index(game)
+
+    def remove(self, game_id):
+        game = self._games.pop(game_id, None)
+        if game is not None:
+            self._unindex(game)
+        return game
+
+    def find_by_code(self, code):
+        """Ожидающая игра по коду приглашения"""
+        game_id = self._by_code.get(code)
+        return self._games[game_id] if game_id is not None else None
+
+    def user_games(self, user_id):
+        return [self._games[game_id] for game_id in self._by_user.get(user_id, ())]
+
+    def by_status(self, status):
+        return list(self._by_status.get(status, {}).values())
+
+    def _index(self, game):
+        game_id = game.id
+        if game.code and game.status == 'waiting':
+            self._by_code[game.code] = game_id
+        for user_id in game.player_ids():
+            self._by_user.setdefault(user_id, set()).add(game_id)
+        self._by_status.setdefault(game.status, {})[game_id] = game
+
+    def _unindex(self, game):
+        game_id = game.id
+        if self._by_code.get(game.code) == game_id:
+            del self._by_code[game.code]
+        for user_id in game.player_ids():
+            games = self._by_user.get(user_id)
+            if games is not None:
+                games.discard(game_id)
+                if not games:
+                    del self._by_user[user_id]
+        games = self._by_status.get(game.status)
+        if games is not None:
+            games.pop(game_id, None)
+            if not games:
+                del self._by_status[game.status]
@@ -0,0 +1,13 @@
+from games.chess_rules import ChessRules
+from games.checkers_rules import CheckersRules
+
+RULES = {
+    'chess': ChessRules,
+    'checkers': CheckersRules,
+}
+
+
+def create_rules(game_type, board):
+    """Проверка ходов для игры с доской, None для остальных"""
+    rules = RULES.get(game_type)
+    return rules(board) if rules is not None and board is not None else None
@@ -0,0 +1,182 @@
+"""
+Восстановление активных игр после перезапуска сервера.
+
+Каждый ход сразу дописывается в журнал game_moves, снимок игры
+(игроки, статус, доска, состояние правил и часов) - раз в SNAPSHOT_INTERVAL
+и только для игр, изменившихся с прошлого снимка. Снимок заодно
+удаляет из журнала покрытые им ходы.
+Запись идет через очередь отложенной записи базы: SQL выполняется
+в потоке соединения, а не в цикле событий.
+"""
+import asyncio
+
+from config import SNAPSHOT_INTERVAL
+from games.clock import GameClock
+from games.models import Board, Game, Player
+from games.moves import parse_move, move_to_wire
+from games.rules import create_rules
+from realtime.codec import dumps, loads
+
+
+def game_snapshot(game):
+    """Все состояние игры, кроме доски, в JSON"""
+    return dumps({
+        'type': game.type,
+        'player1': game.player1.to_dict(),
+        'player2': game.player2.to_dict() if game.player2 is not None else None,
+        'code': game.code,
+        'status': game.status,
+        'current_player': game.current_player,
+        'created_at': game.created_at,
+        'started_at': game.started_at,
+        'last_move': game.last_move,
+        'rules': game.rules.state() if game.rules is not None else None,
+        'clock': game.clock.state() if game.clock is not None else None
+    })
+
+
+def restore_game(game_id, seq, board, data, moves):
+    """Игра из снимка и ходов, сделанных после него"""
+    data = loads(data)
+    player2 = data['player2']
+    board = Board(board) if board is not None else None
+    game = Game(
+        game_id, data['type'],
+        Player(data['player1']['id'], data['player1']['username']),
+        Player(player2['id'], player2['username']) if player2 is not None else None,
+        code=data['code'], status=data['status'], current_player=data['current_player'],
+        board=board, rules=create_rules(data['type'], board)
+    )
+    game.created_at = data['created_at']
+    game.started_at = data.get('started_at')
+    game.seq = seq
+    game.last_move = data['last_move']
+    if game.rules is not None:
+        game.rules.restore(data['rules'])
+    if data.get('clock') is not None:
+        # Время, пока сервер лежал, игрокам не списывается
+        game.clock = GameClock.restore(data['clock'])
+
+    # Ходы проверяются заново теми же правилами
+    for entry in moves:
+        entry = loads(entry)
+        move = parse_move(entry)
+        game.rules.play(move, game.board, game.is_white(game.current_player))
+        game.seq += 1
+        game.current_player = game.opponent_id(game.current_player)
+        game.last_move = move_to_wire(move)
+        if game.clock is not None and 'clock' in entry:
+            game.clock.remaining = entry['clock']
+            game.clock.white_running = not game.clock.white_running
+    return game
+
+
+class GameSnapshots:
+    def __init__(self, db, worker_id=None, interval=SNAPSHOT_INTERVAL):
+        self.db = db
+        # Воркер, чьи игры в снимках; None - один воркер, все игры его
+        self.worker_id = worker_id
+        self.interval = interval
+        # Игры, изменившиеся с прошлого снимка: game_id -> game
+        self._dirty = {}
+        self._task = None
+
+    def mark(self, game):
+        """Игра изменилась - попадет в ближайший снимок"""
+        self._dirty[game.id] = game
+
+    async def log_move(self, game):
+        """Дописать последний ход игры в журнал"""
+        self._dirty[game.id] = game
+        entry = game.last_move
+        if game.clock is not None:
+            # Остатки часов после хода
+            entry = {**entry, 'clock': game.clock.remaining}
+        await self.db.writes.submit([(
+            "INSERT OR REPLACE INTO game_moves (game_id, seq, move) VALUES (?, ?, ?)",
+            (game.id, game.seq, dumps(entry))
+        )])
+
+    async def drop(self, game_id):
+        """Игра закончилась - снимок и журнал больше не нужны"""
+        self._dirty.pop(game_id, None)
+        await self.db.writes.submit([
+            ("DELETE FROM game_snapshots WHERE game_id = ?", (game_id,)),
+            ("DELETE FROM game_moves WHERE game_id = ?", (game_id,))
+        ])
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Последний снимок перед остановкой"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.save()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.save()
+            except Exception as e:
+                print(f"Error saving game snapshots: {e}")
+
+    async def save(self):
+        """Снимок изменившихся игр одной группой записи"""
+        if not self._dirty:
+            return
+        # Забираем накопленное целиком, новые изменения копятся в новом словаре
+        dirty, self._dirty = self._dirty, {}
+        ops = []
+        for game_id, game in dirty.items():
+            ops.append(("""
+                INSERT INTO game_snapshots (game_id, worker_id, seq, board, data, updated_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT (game_id) DO UPDATE SET
+                    worker_id = excluded.worker_id,
+                    seq = excluded.seq,
+                    board = excluded.board,
+                    data = excluded.data,
+                    updated_at = excluded.updated_at
+            """, (
+                game_id,
+                self.worker_id,
+                game.seq,
+                bytes(game.board.cells) if game.board is not None else None,
+                game_snapshot(game)
+            )))
+            # Ходы до снимка уже в нем
+            ops.append(("DELETE FROM game_moves WHERE game_id = ? AND seq <= ?", (game_id, game.seq)))
+        await self.db.writes.submit(ops)
+
+    async def load(self):
+        """Игры этого воркера из последних снимков и журнала ходов"""
+        await self.db.flush()
+        query = "SELECT game_id, seq, board, data FROM game_snapshots"
+        params = ()
+        if self.worker_id is not None:
+            query += " WHERE worker_id = ?"
+            params = (self.worker_id,)
+
+        games = []
+        async with self.db.pool.reader() as db:
+            async with db.execute(query, params) as cursor:
+                snapshots = await cursor.fetchall()
+            for game_id, seq, board, data in snapshots:
+                async with db.execute(
+                    "SELECT move FROM game_moves WHERE game_id = ? AND seq > ? ORDER BY seq",
+                    (game_id, seq)
+                ) as cursor:
+                    moves = [row[0] async for row in cursor]
+                try:
+                    games.append(restore_game(game_id, seq, board, data, moves))
+                except (KeyError, TypeError, ValueError) as e:
+                    print(f"Error restoring game {game_id}: {e}")
+        return games
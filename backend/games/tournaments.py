@@ -0,0 +1,336 @@
+"""
+Турниры: швейцарская система, круговой и на выбывание.
+
+Турнир только составляет пары и считает очки, партии создает и
+завершает сервер игр. Таблица обновляется после каждой партии:
+меняются очки двух игроков и коэффициент Бухгольца их соперников.
+
+Швейцарская система: игроки делятся на группы по очкам, внутри группы
+верхняя половина играет с нижней (i-й с i-м), повторные встречи
+обходятся сдвигом по нижней половине. Кому не нашлось пары, спускается
+в следующую группу. Пары на 5000 игроков - за O(n log n).
+"""
+import math
+from itertools import groupby
+
+from databases.leaderboard import Leaderboard
+
+FORMATS = ('swiss', 'round_robin', 'knockout')
+# Очки за победу, ничью и пропуск тура
+WIN, DRAW, BYE = 1.0, 0.5, 1.0
+
+
+class Entrant:
+    __slots__ = (
+        'id', 'username', 'rating', 'score', 'buchholz', 'opponents',
+        'color_balance', 'last_white', 'had_bye'
+    )
+
+    def __init__(self, user_id, username, rating):
+        self.id = user_id
+        self.username = username
+        self.rating = rating
+        self.score = 0.0
+        # Сумма очков соперников
+        self.buchholz = 0.0
+        self.opponents = []
+        # Белых минус черных
+        self.color_balance = 0
+        self.last_white = None
+        self.had_bye = False
+
+    def entry(self):
+        return {
+            'user_id': self.id,
+            'username': self.username,
+            'rating': self.rating,
+            'score': self.score,
+            'buchholz': self.buchholz
+        }
+
+
+class Pairing:
+    __slots__ = ('white', 'black', 'slot')
+
+    def __init__(self, white, black, slot=None):
+        self.white = white
+        self.black = black
+        # Место в сетке турнира на выбывание
+        self.slot = slot
+
+
+def _standing_key(entry):
+    return (-entry['score'], -entry['buchholz'], -entry['rating'])
+
+
+def _colors(a, b):
+    """Белые - тому, у кого их было меньше; при равенстве - чередование, иначе старшему"""
+    if a.color_balance != b.color_balance:
+        return (a, b) if a.color_balance < b.color_balance else (b, a)
+    if a.last_white is not None and a.last_white == b.last_white:
+        return (b, a) if a.last_white else (a, b)
+    if a.last_white:
+        return b, a
+    return a, b
+
+
+def _pair_group(pool):
+    """Верхняя половина группы с нижней; (пары, оставшиеся без пары)"""
+    half = len(pool) // 2
+    top, bottom = pool[:half], pool[half:]
+    used = [False] * len(bottom)
+    pairs = []
+    rest = []
+    for i, player in enumerate(top):
+        played = set(player.opponents)
+        # Сначала свой соперник по порядку, потом ниже, потом выше
+        for j in (*range(i, len(bottom)), *range(i - 1, -1, -1)):
+            if not used[j] and bottom[j].id not in played:
+                used[j] = True
+                pairs.append((player, bottom[j]))
+                break
+        else:
+            rest.append(player)
+    rest += [player for j, player in enumerate(bottom) if not used[j]]
+    return pairs, rest
+
+
+def _pair_leftovers(players):
+    """Последние без пары: сначала без повторных встреч, если не выйдет - как есть"""
+    pairs = []
+    players = list(players)
+    while players:
+        player = players.pop(0)
+        played = set(player.opponents)
+        index = next((i for i, other in enumerate(players) if other.id not in played), 0)
+        pairs.append((player, players.pop(index)))
+    return pairs
+
+
+def swiss_pairs(entrants):
+    """Пары тура по швейцарской системе: ([(a, b), ...], пропускающий тур или None)"""
+    order = sorted(entrants, key=lambda e: (-e.score, -e.rating, e.id))
+    bye = None
+    if len(order) % 2:
+        # Пропуск - нижнему в таблице из тех, кто еще не пропускал
+        index = next((i for i in range(len(order) - 1, -1, -1) if not order[i].had_bye), len(order) - 1)
+        bye = order.pop(index)
+
+    pairs = []
+    floaters = []
+    for _, group in groupby(order, key=lambda e: e.score):
+        pool = floaters + list(group)
+        floaters = [pool.pop()] if len(pool) % 2 else []
+        paired, rest = _pair_group(pool)
+        pairs += paired
+        floaters = rest + floaters
+    pairs += _pair_leftovers(floaters)
+    return pairs, bye
+
+
+def round_robin_pairs(ids, round_index):
+    """Тур round_index (с нуля) кругового турнира методом круга; None - пропуск"""
+    ids = list(ids)
+    if len(ids) % 2:
+        ids.append(None)
+    n = len(ids)
+    shift = round_index % (n - 1)
+    rotating = ids[1:]
+    circle = [ids[0]] + rotating[n - 1 - shift:] + rotating[:n - 1 - shift]
+    pairs = []
+    for i in range(n // 2):
+        a, b = circle[i], circle[n - 1 - i]
+        # Цвета чередуются по турам
+        pairs.append((b, a) if (round_index + i) % 2 else (a, b))
+    return pairs
+
+
+def bracket_order(size):
+    """Посев по сетке: 1-й и 2-й встречаются только в финале"""
+    order = [0]
+    while len(order) < size:
+        total = len(order) * 2
+        order = [seed for pair in ((s, total - 1 - s) for s in order) for seed in pair]
+    return order
+
+
+class Tournament:
+    def __init__(self, tournament_id, game_type, format='swiss', rounds=None, time_control=None, name=None):
+        if format not in FORMATS:
+            raise ValueError(f"Неизвестный формат турнира: {format}")
+        self.id = tournament_id
+        self.game_type = game_type
+        self.format = format
+        self.name = name
+        self.time_control = time_control
+        # None - по числу игроков при старте
+        self.rounds = rounds
+        self.status = 'registration'
+        self.round = 0
+        self.players = {}
+        self.standings = Leaderboard(_standing_key)
+        # Партии текущего тура: game_id -> Pairing
+        self.games = {}
+        # Пропускающие текущий тур
+        self.byes = []
+        # Сетка на выбывание: игроки в порядке сетки, None - пустое место
+        self.bracket = None
+        self._winners = None
+        # Порядок посева кругового турнира
+        self._seeds = None
+
+    def __len__(self):
+        return len(self.players)
+
+    def join(self, user_id, username, rating):
+        if self.status != 'registration':
+            raise ValueError("Регистрация закрыта")
+        if user_id not in self.players:
+            entrant = self.players[user_id] = Entrant(user_id, username, rating)
+            self.standings.put(entrant.entry())
+        return self.players[user_id]
+
+    def leave(self, user_id):
+        if self.status != 'registration':
+            raise ValueError("Турнир уже идет")
+        if self.players.pop(user_id, None) is not None:
+            self.standings.remove(user_id)
+
+    def start(self):
+        """Закрыть регистрацию и составить первый тур"""
+        if self.status != 'registration':
+            raise ValueError("Турнир уже начат")
+        if len(self.players) < 2:
+            raise ValueError("Нужно хотя бы два игрока")
+        count = len(self.players)
+        seeded = sorted(self.players.values(), key=lambda e: (-e.rating, e.id))
+        if self.format == 'round_robin':
+            self.rounds = count - 1 if count % 2 == 0 else count
+            self._seeds = [e.id for e in seeded]
+        elif self.format == 'knockout':
+            size = 1 << (count - 1).bit_length()
+            self.rounds = size.bit_length() - 1
+            self.bracket = [seeded[seed].id if seed < count else None for seed in bracket_order(size)]
+        elif self.rounds is None:
+            self.rounds = math.ceil(math.log2(count))
+        self.status = 'active'
+        return self.next_round()
+
+    def next_round(self):
+        """Пары следующего тура: [(белые, черные)], пропуски тура уже засчитаны"""
+        self.round += 1
+        self.games = {}
+        self.byes = []
+        if self.format == 'swiss':
+            pairs, bye = swiss_pairs(self.players.values())
+            pairings = [Pairing(*(p.id for p in _colors(a, b))) for a, b in pairs]
+            if bye is not None:
+                self._bye(bye.id)
+        elif self.format == 'round_robin':
+            pairings = []
+            for a, b in round_robin_pairs(self._seeds, self.round - 1):
+                if a is None or b is None:
+                    self._bye(a if b is None else b)
+                else:
+                    pairings.append(Pairing(a, b))
+        else:
+            pairings = []
+            self._winners = [None] * (len(self.bracket) // 2)
+            for slot in range(len(self._winners)):
+                a, b = self.bracket[2 * slot], self.bracket[2 * slot + 1]
+                if a is None or b is None:
+                    # Пустое место в сетке: игрок проходит дальше без игры
+                    self._winners[slot] = a if b is None else b
+                    if self._winners[slot] is not None:
+                        self._bye(self._winners[slot])
+                else:
+                    white, black = _colors(self.players[a], self.players[b])
+                    pairings.append(Pairing(white.id, black.id, slot))
+        return pairings
+
+    def bind(self, game_id, pairing):
+        """Партия пары создана сервером"""
+        self.games[game_id] = pairing
+        white, black = self.players[pairing.white], self.players[pairing.black]
+        white.color_balance += 1
+        black.color_balance -= 1
+        white.last_white, black.last_white = True, False
+
+    def record(self, game_id, winner_id):
+        """
+        Итог партии тура, winner_id None - ничья.
+        Возвращает пару для переигровки (ничья на выбывание) или None
+        """
+        pairing = self.games.pop(game_id, None)
+        if pairing is None:
+            return None
+        if self.format == 'knockout' and winner_id is None:
+            # Ничья на выбывание переигрывается со сменой цвета
+            return Pairing(pairing.black, pairing.white, pairing.slot)
+
+        white, black = self.players[pairing.white], self.players[pairing.black]
+        white.opponents.append(black.id)
+        black.opponents.append(white.id)
+        # Бухгольц новых соперников - их текущие очки
+        white.buchholz += black.score
+        black.buchholz += white.score
+        if winner_id is None:
+            self._add_score(white, DRAW)
+            self._add_score(black, DRAW)
+        else:
+            self._add_score(self.players[winner_id], WIN)
+            self._update(white.id if winner_id == black.id else black.id)
+        if self.format == 'knockout':
+            self._winners[pairing.slot] = winner_id
+        return None
+
+    def round_over(self):
+        return self.status == 'active' and not self.games
+
+    def advance(self):
+        """Тур сыгран: пары следующего или [] - турнир окончен"""
+        if self.format == 'knockout':
+            self.bracket = self._winners
+        if self.round >= self.rounds:
+            self.status = 'finished'
+            return []
+        return self.next_round()
+
+    def _bye(self, user_id):
+        entrant = self.players[user_id]
+        entrant.had_bye = True
+        self.byes.append(user_id)
+        if self.format != 'knockout':
+            self._add_score(entrant, BYE)
+
+    def _add_score(self, entrant, points):
+        """Очки игроку и его вклад в Бухгольц соперников"""
+        entrant.score += points
+        self._update(entrant.id)
+        for opponent_id in entrant.opponents:
+            opponent = self.players[opponent_id]
+            opponent.buchholz += points
+            self._update(opponent_id)
+
+    def _update(self, user_id):
+        self.standings.put(self.players[user_id].entry())
+
+    def table(self, limit=None):
+        """Таблица: лучшие limit игроков с местами"""
+        top = self.standings.top(limit if limit is not None else len(self.standings))
+        for place, entry in enumerate(top, 1):
+            entry['place'] = place
+        return top
+
+    def to_dict(self, limit=10):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'type': self.game_type,
+            'format': self.format,
+            'status': self.status,
+            'round': self.round,
+            'rounds': self.rounds,
+            'players': len(self.players),
+            'standings': self.table(limit)
+        }
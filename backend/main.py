@@ -1,27 +1,42 @@
-from aiogram import Bot, Dispatcher
 import asyncio
 import os
 from dotenv import load_dotenv
-from databases.dbs import Database
-from handlers import start
-
-db = Database("database.db")
 
+# До импорта config: настройки читаются из окружения при импорте
 load_dotenv()
 
+from databases.dbs import Database
+from bot.client import create_bot, create_dispatcher
+from bot.sender import SendScheduler
+from config import BOT_DATABASE
+
+db = Database(BOT_DATABASE)
+
 TOKEN = os.getenv("TOKEN")
 
-bot = Bot(token=TOKEN)
-dp = Dispatcher()
+# Ответы бота с лимитами Telegram
+sender = SendScheduler()
+bot = create_bot(TOKEN, scheduler=sender)
+# Обработчики используют тот же пул соединений
+dp = create_dispatcher(db)
 
 async def main():
     print("⚙️ Инициализация базы данных...")
     await db.init_db()
     print("✅ База данных готова!")
 
-    dp.include_router(start.router)
+    sender.start()
     print("✅ Бот запущен!")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await sender.close()
+        await db.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if os.getenv("BOT_MODE", "polling") == "webhook":
+        # Обновления принимает игровой сервер: бот и WebSocket в одном процессе
+        import uvicorn
+        uvicorn.run("websocket_server:app", host="0.0.0.0", port=8000)
+    else:
+        asyncio.run(main())
\ No newline at end of file
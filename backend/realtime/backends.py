@@ -0,0 +1,367 @@
+"""
+Общее состояние нескольких воркеров websocket_server.
+
+Игра живет в памяти одного воркера (владельца). Через бэкенд воркеры узнают,
+где чей сокет и чья игра, пересылают друг другу сообщения и запросы,
+и выбирают один воркер, который ведет очередь подбора соперников.
+
+MemoryBackend - один процесс, без накладных расходов.
+SharedBackend - поверх Redis (или LocalRedis для проверки нескольких
+воркеров в одном процессе).
+"""
+import asyncio
+import itertools
+import os
+import socket
+import time
+
+from config import STATE_BACKEND, REDIS_URL, WORKER_ID, BACKEND_REQUEST_TIMEOUT, MATCHMAKER_LEASE
+from realtime.codec import dumps, loads
+
+PREFIX = 'boardly'
+
+
+def default_worker_id():
+    return WORKER_ID or f"{socket.gethostname()}:{os.getpid()}"
+
+
+class MemoryBackend:
+    """Один воркер: все игры и сокеты локальные, пересылать некуда"""
+
+    shared = False
+
+    def __init__(self, worker_id=None):
+        self.worker_id = worker_id or default_worker_id()
+        self._on_message = None
+        self._on_request = None
+
+    async def start(self, on_message, on_request):
+        """
+        on_message(message) - корутина для сообщений этому воркеру,
+        on_request(payload) - корутина, результат которой уходит ответом
+        """
+        self._on_message = on_message
+        self._on_request = on_request
+
+    async def close(self):
+        pass
+
+    async def register_user(self, user_id):
+        pass
+
+    async def unregister_user(self, user_id):
+        pass
+
+    async def locate_user(self, user_id):
+        return None
+
+    async def register_game(self, game_id, code=None):
+        pass
+
+    async def unregister_game(self, game_id, code=None):
+        pass
+
+    async def locate_game(self, game_id):
+        return None
+
+    async def find_code(self, code):
+        return None
+
+    async def send(self, worker_id, message):
+        await self._on_message(message)
+
+    async def broadcast(self, message):
+        await self._on_message(message)
+
+    async def request(self, worker_id, payload, timeout=BACKEND_REQUEST_TIMEOUT):
+        return await self._on_request(payload)
+
+    async def request_others(self, payload, timeout=BACKEND_REQUEST_TIMEOUT):
+        return []
+
+    async def matchmaker_worker(self):
+        return self.worker_id
+
+
+class SharedBackend:
+    """
+    Состояние в Redis-совместимом хранилище:
+      boardly:users  (hash) user_id -> воркер с сокетом
+      boardly:games  (hash) game_id -> воркер-владелец
+      boardly:codes  (hash) код приглашения -> game_id
+      boardly:workers (set) живые воркеры
+      boardly:matchmaker - воркер с очередью подбора (аренда с истечением)
+    Канал boardly:worker:<id> у каждого воркера и общий boardly:broadcast.
+    Для восстановления игр после перезапуска WORKER_ID должен быть постоянным.
+    """
+
+    shared = True
+
+    def __init__(self, client, worker_id=None, lease=MATCHMAKER_LEASE):
+        self.client = client
+        self.worker_id = worker_id or default_worker_id()
+        self.lease = lease
+        self._pubsub = None
+        self._listener = None
+        self._on_message = None
+        self._on_request = None
+        self._pending = {}
+        self._request_ids = itertools.count()
+        self._leader_until = 0
+
+    def _channel(self, worker_id):
+        return f"{PREFIX}:worker:{worker_id}"
+
+    async def start(self, on_message, on_request):
+        self._on_message = on_message
+        self._on_request = on_request
+        self._pubsub = self.client.pubsub()
+        await self._pubsub.subscribe(self._channel(self.worker_id), f"{PREFIX}:broadcast")
+        await self.client.sadd(f"{PREFIX}:workers", self.worker_id)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        await self.client.srem(f"{PREFIX}:workers", self.worker_id)
+        if await self.client.get(f"{PREFIX}:matchmaker") == self.worker_id:
+            await self.client.delete(f"{PREFIX}:matchmaker")
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.unsubscribe()
+            await self._pubsub.aclose()
+            self._pubsub = None
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+
+    async def _listen(self):
+        while True:
+            raw = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if raw is None:
+                continue
+            try:
+                message = loads(raw['data'])
+                kind = message.get('kind')
+                if kind == 'reply':
+                    future = self._pending.pop(message['id'], None)
+                    if future is not None and not future.done():
+                        future.set_result(message['result'])
+                elif kind == 'request':
+                    # Запрос может сам ждать ответа другого воркера - не блокируем канал
+                    asyncio.create_task(self._answer(message))
+                else:
+                    # Сообщения обрабатываются по порядку: ходы не переставляются
+                    await self._on_message(message)
+            except Exception as e:
+                print(f"Backend message error: {e}")
+
+    async def _answer(self, message):
+        try:
+            result = await self._on_request(message['payload'])
+        except Exception as e:
+            print(f"Backend request error: {e}")
+            result = None
+        await self.client.publish(self._channel(message['reply_to']), dumps({
+            'kind': 'reply',
+            'id': message['id'],
+            'result': result
+        }))
+
+    # Где чей сокет
+    async def register_user(self, user_id):
+        await self.client.hset(f"{PREFIX}:users", str(user_id), self.worker_id)
+
+    async def unregister_user(self, user_id):
+        # Пользователь мог уже переподключиться к другому воркеру
+        key = f"{PREFIX}:users"
+        if await self.client.hget(key, str(user_id)) == self.worker_id:
+            await self.client.hdel(key, str(user_id))
+
+    async def locate_user(self, user_id):
+        return await self.client.hget(f"{PREFIX}:users", str(user_id))
+
+    # Где чья игра
+    async def register_game(self, game_id, code=None):
+        await self.client.hset(f"{PREFIX}:games", game_id, self.worker_id)
+        if code:
+            await self.client.hset(f"{PREFIX}:codes", code, game_id)
+
+    async def unregister_game(self, game_id, code=None):
+        await self.client.hdel(f"{PREFIX}:games", game_id)
+        if code and await self.client.hget(f"{PREFIX}:codes", code) == game_id:
+            await self.client.hdel(f"{PREFIX}:codes", code)
+
+    async def locate_game(self, game_id):
+        return await self.client.hget(f"{PREFIX}:games", game_id)
+
+    async def find_code(self, code):
+        return await self.client.hget(f"{PREFIX}:codes", code)
+
+    # Пересылка
+    async def send(self, worker_id, message):
+        await self.client.publish(self._channel(worker_id), dumps(message))
+
+    async def broadcast(self, message):
+        await self.client.publish(f"{PREFIX}:broadcast", dumps(message))
+
+    async def request(self, worker_id, payload, timeout=BACKEND_REQUEST_TIMEOUT):
+        """Выполнить payload на другом воркере и дождаться результата"""
+        if worker_id == self.worker_id:
+            return await self._on_request(payload)
+        request_id = f"{self.worker_id}:{next(self._request_ids)}"
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self.client.publish(self._channel(worker_id), dumps({
+                'kind': 'request',
+                'id': request_id,
+                'reply_to': self.worker_id,
+                'payload': payload
+            }))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def request_others(self, payload, timeout=BACKEND_REQUEST_TIMEOUT):
+        """Тот же запрос всем остальным воркерам. Не ответившие пропускаются"""
+        workers = await self.client.smembers(f"{PREFIX}:workers")
+        others = [worker for worker in workers if worker != self.worker_id]
+        results = await asyncio.gather(
+            *(self.request(worker, payload, timeout) for worker in others),
+            return_exceptions=True
+        )
+        return [result for result in results if not isinstance(result, BaseException)]
+
+    async def matchmaker_worker(self):
+        """
+        Воркер с очередью подбора. Первый спросивший берет аренду
+        и продлевает ее, пока жив; после его падения аренду заберет другой
+        """
+        key = f"{PREFIX}:matchmaker"
+        now = time.monotonic()
+        if self._leader_until > now:
+            return self.worker_id
+        if await self.client.set(key, self.worker_id, nx=True, ex=self.lease):
+            self._leader_until = now + self.lease / 2
+            return self.worker_id
+        leader = await self.client.get(key)
+        if leader == self.worker_id:
+            await self.client.expire(key, self.lease)
+            self._leader_until = now + self.lease / 2
+        return leader
+
+
+class LocalRedis:
+    """
+    Заглушка Redis в памяти процесса: только команды, нужные SharedBackend.
+    Несколько SharedBackend с одним LocalRedis ведут себя как воркеры
+    с общим Redis - для проверки без сервера.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._expires = {}
+        self._subscribers = {}
+
+    def _alive(self, name):
+        expires = self._expires.get(name)
+        if expires is not None and expires <= time.monotonic():
+            self._data.pop(name, None)
+            del self._expires[name]
+        return name in self._data
+
+    async def get(self, name):
+        return self._data[name] if self._alive(name) else None
+
+    async def set(self, name, value, nx=False, ex=None):
+        if nx and self._alive(name):
+            return None
+        self._data[name] = value
+        self._expires.pop(name, None)
+        if ex is not None:
+            self._expires[name] = time.monotonic() + ex
+        return True
+
+    async def expire(self, name, seconds):
+        if not self._alive(name):
+            return False
+        self._expires[name] = time.monotonic() + seconds
+        return True
+
+    async def delete(self, *names):
+        return sum(self._data.pop(name, None) is not None for name in names)
+
+    async def hset(self, name, key, value):
+        self._data.setdefault(name, {})[key] = value
+        return 1
+
+    async def hget(self, name, key):
+        return self._data.get(name, {}).get(key)
+
+    async def hdel(self, name, *keys):
+        values = self._data.get(name, {})
+        return sum(values.pop(key, None) is not None for key in keys)
+
+    async def sadd(self, name, *members):
+        self._data.setdefault(name, set()).update(members)
+        return len(members)
+
+    async def srem(self, name, *members):
+        values = self._data.get(name, set())
+        removed = len(values & set(members))
+        values.difference_update(members)
+        return removed
+
+    async def smembers(self, name):
+        return set(self._data.get(name, set()))
+
+    async def publish(self, channel, message):
+        subscribers = self._subscribers.get(channel, ())
+        for pubsub in subscribers:
+            pubsub.queue.put_nowait({'type': 'message', 'channel': channel, 'data': message})
+        return len(subscribers)
+
+    def pubsub(self):
+        return LocalPubSub(self)
+
+    async def aclose(self):
+        pass
+
+
+class LocalPubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.channels = set()
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, *channels):
+        for channel in channels:
+            self.redis._subscribers.setdefault(channel, set()).add(self)
+            self.channels.add(channel)
+
+    async def unsubscribe(self, *channels):
+        for channel in channels or list(self.channels):
+            self.redis._subscribers.get(channel, set()).discard(self)
+            self.channels.discard(channel)
+
+    async def get_message(self, ignore_subscribe_messages=True, timeout=None):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        await self.unsubscribe()
+
+
+def create_backend():
+    """Бэкенд по настройке STATE_BACKEND: memory или redis"""
+    if STATE_BACKEND == 'redis':
+        import redis.asyncio as redis
+        return SharedBackend(redis.from_url(REDIS_URL, decode_responses=True))
+    return MemoryBackend()
@@ -0,0 +1,70 @@
+"""
+Кодирование сообщений WebSocket.
+JSON через orjson, если он установлен, иначе стандартный json.
+Клиенты с ?format=msgpack получают и шлют бинарные кадры msgpack.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+FORMATS = ('json', 'msgpack') if msgpack is not None else ('json',)
+
+
+def dumps(obj):
+    if orjson is not None:
+        # OPT_NON_STR_KEYS: ключи-числа (user_id) как у json.dumps
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
+
+def loads(text):
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+class Encoded:
+    """
+    Сообщение, которое кодируется не больше одного раза на формат,
+    сколько бы получателей его ни отправляли.
+    """
+
+    __slots__ = ('message', '_text', '_binary')
+
+    def __init__(self, message):
+        self.message = message
+        self._text = None
+        self._binary = None
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = dumps(self.message)
+        return self._text
+
+    @property
+    def binary(self):
+        if self._binary is None:
+            self._binary = msgpack.packb(self.message)
+        return self._binary
+
+
+def decode_frame(frame):
+    """Входящий кадр ASGI ({'text': ...} или {'bytes': ...}) в словарь"""
+    if frame.get('text') is not None:
+        data = loads(frame['text'])
+    elif msgpack is None:
+        raise ValueError("msgpack не установлен")
+    else:
+        data = msgpack.unpackb(frame['bytes'], strict_map_key=False)
+    if not isinstance(data, dict):
+        raise ValueError("Сообщение должно быть объектом")
+    return data
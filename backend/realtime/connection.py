@@ -0,0 +1,115 @@
+import asyncio
+
+from config import WS_SEND_QUEUE_SIZE, WS_MAX_QUEUED_BYTES
+from realtime.codec import Encoded
+
+
+class Connection:
+    """
+    WebSocket клиента с собственной очередью исходящих сообщений.
+    Отправка не ждет сети: сообщение кладется в очередь, отдельная задача
+    пишет их в сокет по порядку. Медленный клиент задерживает только себя.
+    """
+
+    __slots__ = (
+        'user_id', 'websocket', 'binary', 'queue', 'max_bytes', 'queued_bytes',
+        'on_overflow', 'closed', '_resyncing', '_task'
+    )
+
+    def __init__(self, user_id, websocket, maxsize=WS_SEND_QUEUE_SIZE, on_overflow=None, binary=False,
+                 max_bytes=WS_MAX_QUEUED_BYTES):
+        self.user_id = user_id
+        self.websocket = websocket
+        # True - кадры msgpack вместо текстового JSON
+        self.binary = binary
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        # Память под неотправленные кадры: очередь ограничена и по числу, и по байтам
+        self.max_bytes = max_bytes
+        self.queued_bytes = 0
+        # on_overflow(connection, dropped) - заново положить в очередь полное состояние;
+        # dropped - выброшенные из очереди сообщения, включая то, что не влезло
+        self.on_overflow = on_overflow
+        self.closed = False
+        self._resyncing = False
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._writer())
+
+    def send(self, message):
+        """
+        Поставить сообщение (dict или Encoded) в очередь. False - клиент отключен.
+        Для рассылки нескольким получателям передавайте один Encoded
+        """
+        if self.closed:
+            return False
+        if not isinstance(message, Encoded):
+            message = Encoded(message)
+        # Кадр кодируется здесь, а не в писателе: кодирование кэшируется в Encoded
+        size = len(self._frame(message))
+        if self.queued_bytes + size <= self.max_bytes:
+            try:
+                self.queue.put_nowait(message)
+                self.queued_bytes += size
+                return True
+            except asyncio.QueueFull:
+                pass
+
+        # Клиент не успевает читать: очередь заменяется полным состоянием
+        dropped = self._clear()
+        dropped.append(message)
+        if self.on_overflow is None or self._resyncing:
+            self.close()
+            return False
+        self._resyncing = True
+        self.on_overflow(self, dropped)
+        return True
+
+    def _frame(self, message):
+        return message.binary if self.binary else message.text
+
+    def _clear(self):
+        """Опустошить очередь; возвращает выброшенные сообщения"""
+        dropped = []
+        while not self.queue.empty():
+            dropped.append(self.queue.get_nowait())
+        self.queued_bytes = 0
+        return dropped
+
+    async def _writer(self):
+        try:
+            while True:
+                message = await self.queue.get()
+                frame = self._frame(message)
+                if self.binary:
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+                self.queued_bytes = max(0, self.queued_bytes - len(frame))
+                if self.queue.empty():
+                    # Клиент догнал очередь после пересинхронизации
+                    self._resyncing = False
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Сокет уже мертв - цикл чтения в websocket_endpoint увидит отключение
+            self.close()
+
+    def close(self, code=1013):
+        """
+        Остановить отправку и закрыть сокет, не дожидаясь сети.
+        1013 (попробуйте позже) - клиент переподключится сам
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self._clear()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
+        asyncio.create_task(self._close_socket(code))
+
+    async def _close_socket(self, code):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
@@ -0,0 +1,56 @@
+"""
+Отключившиеся игроки: их игры ждут переподключения RECONNECT_GRACE секунд,
+а сообщения игры копятся в кольцевом буфере и досылаются при возврате.
+"""
+from collections import deque
+
+from config import RECONNECT_GRACE, REPLAY_BUFFER_SIZE
+
+
+class AwaySessions:
+    def __init__(self, wheel, grace=RECONNECT_GRACE, buffer_size=REPLAY_BUFFER_SIZE):
+        self.wheel = wheel
+        self.grace = grace
+        self.buffer_size = buffer_size
+        # (user_id, game_id) -> сообщения, пропущенные игроком в этой игре
+        self._missed = {}
+
+    def __len__(self):
+        return len(self._missed)
+
+    def is_away(self, user_id, game_id):
+        return (user_id, game_id) in self._missed
+
+    def leave(self, user_id, game_id, on_expire):
+        """
+        Игрок отключился. Если он не вернется за grace секунд,
+        вызывается on_expire() (через колесо таймеров)
+        """
+        key = (user_id, game_id)
+        if key not in self._missed:
+            # Старые сообщения вытесняются: при возврате доску все равно пришлем целиком
+            self._missed[key] = deque(maxlen=self.buffer_size)
+
+        def expire():
+            self._missed.pop(key, None)
+            return on_expire()
+
+        self.wheel.schedule(key, self.grace, expire)
+
+    def record(self, user_id, game_id, message):
+        """Сообщение игры для игрока, которого сейчас нет"""
+        missed = self._missed.get((user_id, game_id))
+        if missed is not None:
+            missed.append(message)
+
+    def resume(self, user_id, game_id):
+        """Игрок вернулся: пропущенные сообщения по порядку или None, если он не отлучался"""
+        key = (user_id, game_id)
+        self.wheel.cancel(key)
+        return self._missed.pop(key, None)
+
+    def forget(self, user_id, game_id):
+        """Игра закончилась - ждать игрока больше незачем"""
+        key = (user_id, game_id)
+        self.wheel.cancel(key)
+        self._missed.pop(key, None)
@@ -0,0 +1,248 @@
+"""
+Зрители активных игр.
+
+Ход игрока только кладет новое состояние игры в ленту (O(1), сколько бы
+ни было зрителей), рассылает его отдельная задача ленты:
+  - состояние кодируется один раз на всех зрителей (Encoded);
+  - у зрителя одно место под последнее состояние: если его соединение
+    не успевает читать, промежуточные состояния пропускаются;
+  - SPECTATOR_DELAY - задержка трансляции в секундах;
+  - на каждые SPECTATOR_BATCH зрителей задача уступает цикл событий,
+    действия игроков не ждут конца рассылки.
+
+Если воркеров несколько, воркер игры шлет состояние один раз каждому
+воркеру со зрителями (ретранслятору), а тот раздает его своим зрителям.
+"""
+import asyncio
+import time
+from collections import deque
+
+from config import SPECTATOR_DELAY, SPECTATOR_QUEUE_SIZE, SPECTATOR_RETRY, SPECTATOR_BATCH
+from realtime.codec import Encoded
+
+# Сколько задержанных состояний хранит лента; старые все равно вытеснит последнее
+FEED_BACKLOG = 64
+
+
+class Watcher:
+    __slots__ = ('connection', 'latest', 'active')
+
+    def __init__(self, connection):
+        self.connection = connection
+        # Последнее состояние, которое еще не влезло в очередь соединения
+        self.latest = None
+        self.active = True
+
+
+class GameFeed:
+    __slots__ = ('game_id', 'watchers', 'relays', 'updates', 'shown', 'lagging', 'event', 'task')
+
+    def __init__(self, game_id):
+        self.game_id = game_id
+        # user_id -> Watcher
+        self.watchers = {}
+        # Воркеры, раздающие игру своим зрителям
+        self.relays = set()
+        # (когда показать, Encoded)
+        self.updates = deque(maxlen=FEED_BACKLOG)
+        # Последнее разосланное состояние - его сразу получает новый зритель
+        self.shown = None
+        # Есть зрители с неотправленным состоянием
+        self.lagging = False
+        self.event = asyncio.Event()
+        self.task = None
+
+
+class Spectators:
+    def __init__(self, wheel, delay=SPECTATOR_DELAY, queue_size=SPECTATOR_QUEUE_SIZE,
+                 retry=SPECTATOR_RETRY, batch=SPECTATOR_BATCH):
+        self.wheel = wheel
+        self.delay = delay
+        # Больше стольких сообщений в очереди соединения - зритель отстает
+        self.queue_size = queue_size
+        self.retry = retry
+        self.batch = batch
+        # async on_relay(worker_id, game_id, message) - состояние воркеру-ретранслятору
+        self.on_relay = None
+        self._feeds = {}
+        # user_id -> игры, которые он смотрит
+        self._watching = {}
+
+    def __contains__(self, game_id):
+        return game_id in self._feeds
+
+    def __len__(self):
+        return sum(len(feed.watchers) for feed in self._feeds.values())
+
+    def watchers(self, game_id):
+        feed = self._feeds.get(game_id)
+        return len(feed.watchers) if feed is not None else 0
+
+    def _feed(self, game_id):
+        feed = self._feeds.get(game_id)
+        if feed is None:
+            feed = self._feeds[game_id] = GameFeed(game_id)
+            feed.task = asyncio.create_task(self._run(feed))
+        return feed
+
+    def watch(self, game_id, user_id, connection):
+        """Зритель подписался. True - лента новая, ей нужно текущее состояние"""
+        new = game_id not in self._feeds
+        feed = self._feed(game_id)
+        old = feed.watchers.get(user_id)
+        if old is not None:
+            old.active = False
+        watcher = feed.watchers[user_id] = Watcher(connection)
+        self._watching.setdefault(user_id, set()).add(game_id)
+        if feed.shown is not None:
+            watcher.latest = feed.shown
+            if not self._deliver(feed, watcher):
+                feed.lagging = True
+                self._wake_at(feed, time.monotonic() + self.retry)
+        return new
+
+    def unwatch(self, game_id, user_id):
+        """Зритель ушел. True - у ленты не осталось своих зрителей"""
+        games = self._watching.get(user_id)
+        if games is not None:
+            games.discard(game_id)
+            if not games:
+                del self._watching[user_id]
+        feed = self._feeds.get(game_id)
+        if feed is None:
+            return False
+        watcher = feed.watchers.pop(user_id, None)
+        if watcher is not None:
+            watcher.active = False
+        if feed.watchers:
+            return False
+        if not feed.relays:
+            self._drop(game_id)
+        return True
+
+    def unwatch_all(self, user_id):
+        """Зритель отключился: игры, у лент которых не осталось своих зрителей"""
+        return [
+            game_id for game_id in list(self._watching.get(user_id, ()))
+            if self.unwatch(game_id, user_id)
+        ]
+
+    def add_relay(self, game_id, worker_id):
+        """Воркер со зрителями этой игры. True - лента новая, ей нужно текущее состояние"""
+        new = game_id not in self._feeds
+        feed = self._feed(game_id)
+        feed.relays.add(worker_id)
+        if feed.shown is not None and self.on_relay is not None:
+            asyncio.create_task(self.on_relay(worker_id, game_id, feed.shown.message))
+        return new
+
+    def remove_relay(self, game_id, worker_id):
+        feed = self._feeds.get(game_id)
+        if feed is None:
+            return
+        feed.relays.discard(worker_id)
+        if not feed.watchers and not feed.relays:
+            self._drop(game_id)
+
+    def publish(self, game_id, message, delay=None):
+        """Новое состояние игры; зрители получат его через delay секунд"""
+        feed = self._feeds.get(game_id)
+        if feed is None:
+            return
+        delay = self.delay if delay is None else delay
+        if not isinstance(message, Encoded):
+            message = Encoded(message)
+        feed.updates.append((time.monotonic() + delay, message))
+        if delay > 0:
+            self._wake_at(feed, feed.updates[0][0])
+        else:
+            feed.event.set()
+
+    async def end(self, game_id, message):
+        """Игра закончилась: последнее сообщение всем зрителям и ретрансляторам, лента закрывается"""
+        feed = self._feeds.get(game_id)
+        if feed is None:
+            return
+        self._drop(game_id)
+        message = Encoded(message)
+        # Итог не должен потеряться: в обход ограничения очереди
+        for user_id, watcher in feed.watchers.items():
+            watcher.connection.send(message)
+            games = self._watching.get(user_id)
+            if games is not None:
+                games.discard(game_id)
+                if not games:
+                    del self._watching[user_id]
+        for worker_id in feed.relays:
+            await self.on_relay(worker_id, game_id, message.message)
+
+    async def close(self):
+        feeds = list(self._feeds.values())
+        for game_id in list(self._feeds):
+            self._drop(game_id)
+        await asyncio.gather(*(feed.task for feed in feeds), return_exceptions=True)
+        self._watching.clear()
+
+    def _drop(self, game_id):
+        feed = self._feeds.pop(game_id, None)
+        if feed is not None:
+            feed.task.cancel()
+            self.wheel.cancel(('spectate', game_id))
+
+    def _wake_at(self, feed, when):
+        self.wheel.schedule(('spectate', feed.game_id), when - time.monotonic(), feed.event.set)
+
+    async def _run(self, feed):
+        while True:
+            await feed.event.wait()
+            feed.event.clear()
+            now = time.monotonic()
+            message = None
+            # Из созревших состояний нужно только последнее
+            while feed.updates and feed.updates[0][0] <= now:
+                message = feed.updates.popleft()[1]
+            if message is not None:
+                feed.shown = message
+                for worker_id in list(feed.relays):
+                    try:
+                        await self.on_relay(worker_id, feed.game_id, message.message)
+                    except Exception as e:
+                        print(f"Error relaying game {feed.game_id} to {worker_id}: {e}")
+            await self._fan_out(feed, message)
+
+            wake = []
+            if feed.updates:
+                wake.append(feed.updates[0][0])
+            if feed.lagging:
+                wake.append(time.monotonic() + self.retry)
+            if wake:
+                self._wake_at(feed, min(wake))
+
+    async def _fan_out(self, feed, message):
+        """Новое состояние всем зрителям; None - повторить отстающим"""
+        if message is not None:
+            targets = list(feed.watchers.values())
+        else:
+            targets = [watcher for watcher in feed.watchers.values() if watcher.latest is not None]
+        lagging = False
+        for i, watcher in enumerate(targets, 1):
+            if watcher.active:
+                if message is not None:
+                    # Более старое неотправленное состояние больше не нужно
+                    watcher.latest = message
+                lagging = not self._deliver(feed, watcher) or lagging
+            if i % self.batch == 0:
+                await asyncio.sleep(0)
+        feed.lagging = lagging
+
+    def _deliver(self, feed, watcher):
+        """Отправить зрителю его последнее состояние. False - его очередь занята"""
+        connection = watcher.connection
+        if connection.closed:
+            watcher.latest = None
+            return True
+        if connection.queue.qsize() >= self.queue_size:
+            return False
+        connection.send(watcher.latest)
+        watcher.latest = None
+        return True
@@ -0,0 +1,94 @@
+"""
+Колесо таймеров: одна задача asyncio на все таймауты сервера
+вместо отдельной задачи или call_later на каждый.
+"""
+import asyncio
+import math
+
+from config import TIMER_TICK, TIMER_SLOTS
+
+
+class TimerWheel:
+    """
+    Хешированное колесо: слот на каждый тик, таймер лежит в слоте,
+    куда стрелка придет к моменту срабатывания (с учетом полных оборотов).
+    Постановка и отмена - O(1), точность - один тик.
+
+    Таймер задается ключом: повторный schedule с тем же ключом
+    переносит таймер, cancel(key) отменяет.
+    callback() вызывается без аргументов; если он вернул корутину,
+    она запускается отдельной задачей.
+    """
+
+    def __init__(self, tick=TIMER_TICK, slots=TIMER_SLOTS):
+        self.tick = tick
+        # slot -> {key: [оставшиеся обороты, callback]}
+        self._slots = [{} for _ in range(slots)]
+        # key -> slot
+        self._where = {}
+        self._position = 0
+        self._task = None
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def schedule(self, key, delay, callback):
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        size = len(self._slots)
+        slot = (self._position + ticks) % size
+        self._slots[slot][key] = [(ticks - 1) // size, callback]
+        self._where[key] = slot
+
+    def cancel(self, key):
+        slot = self._where.pop(key, None)
+        if slot is None:
+            return False
+        del self._slots[slot][key]
+        return True
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        while True:
+            # Тики отсчитываются от старта, задержки цикла не накапливаются
+            deadline += self.tick
+            await asyncio.sleep(max(0, deadline - loop.time()))
+            self.advance()
+
+    def advance(self):
+        """Сдвинуть стрелку на один тик и вызвать наступившие таймеры"""
+        self._position = (self._position + 1) % len(self._slots)
+        slot = self._slots[self._position]
+        due = []
+        for key, entry in slot.items():
+            if entry[0]:
+                entry[0] -= 1
+            else:
+                due.append((key, entry[1]))
+        for key, _ in due:
+            del slot[key]
+            del self._where[key]
+        for key, callback in due:
+            try:
+                result = callback()
+                if asyncio.iscoroutine(result):
+                    asyncio.create_task(result)
+            except Exception as e:
+                print(f"Timer {key!r} error: {e}")
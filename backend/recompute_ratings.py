@@ -0,0 +1,23 @@
+import asyncio
+import sys
+from database_extended import Database
+from config import RATING_SYSTEM
+
+# Пересчет рейтингов по всей истории игр: python recompute_ratings.py [elo|glicko2]
+# Запускать при остановленном websocket_server - иначе его рейтинги в памяти устареют
+
+async def main():
+    system = sys.argv[1] if len(sys.argv) > 1 else RATING_SYSTEM
+    db = Database()
+    print("⚙️ Инициализация базы данных...")
+    await db.init_db()
+    # Пересчет читает games - дожидаемся фоновых миграций
+    await db.migrator.wait()
+    try:
+        games = await db.recompute_ratings(system)
+        print(f"✅ Рейтинги ({system}) пересчитаны по {games} играм")
+    finally:
+        await db.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
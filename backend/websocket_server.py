@@ -1,12 +1,29 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from typing import Dict, List
-import json
+from typing import Dict
 import asyncio
 import random
 import string
-from datetime import datetime
+import time
+import itertools
+from games.registry import GameRegistry
+from games.models import Game, Player
+from games.moves import IllegalMove, initial_board, board_hash, parse_move, move_to_wire
+from games.rules import create_rules
+from games.matchmaking import Matchmaker
+from games.actors import GameActors
+from games.snapshots import GameSnapshots
+from games.clock import GameClock, TimeControl
+from games.tournaments import Tournament, FORMATS as TOURNAMENT_FORMATS
+from database_extended import Database
+from config import BOT_MODE, HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, WAITING_GAME_TTL, CLOCK_INITIAL, CLOCK_INCREMENT, CLOCK_DELAY, TOURNAMENT_RESULTS_TTL
+from realtime.connection import Connection
+from realtime.codec import Encoded, FORMATS, decode_frame
+from realtime.backends import create_backend
+from realtime.timers import TimerWheel
+from realtime.sessions import AwaySessions
+from realtime.spectators import Spectators
 
 app = FastAPI()
 
@@ -16,51 +33,211 @@ app.mount("/webapp", StaticFiles(directory="webapp"), name="webapp")
 # Активные WebSocket соединения
 active_connections: Dict[int, WebSocket] = {}
 
-# Активные игры
-active_games: Dict[str, dict] = {}
+# Активные игры с индексами по коду, игрокам и статусу
+active_games = GameRegistry()
 
-# Очередь поиска игр
-game_queue: Dict[str, List[dict]] = {
-    'chess': [],
-    'checkers': [],
-    'rps': []
-}
+# Турниры этого воркера и их партии: game_id -> турнир
+tournaments: Dict[str, Tournament] = {}
+tournament_games: Dict[str, Tournament] = {}
+tournament_game_numbers = itertools.count(1)
+
+GAME_TYPES = ('chess', 'checkers', 'rps')
+DEFAULT_RATING = 1000
+# Контроль времени игр из подбора
+MATCH_TIME_CONTROL = (
+    {'initial': CLOCK_INITIAL, 'increment': CLOCK_INCREMENT, 'delay': CLOCK_DELAY}
+    if CLOCK_INITIAL > 0 else None
+)
+
+# База: рейтинг для подбора соперника
+db = Database()
+
+# Очереди поиска игр по рейтингу, пары подбираются и фоном
+matchmaker = Matchmaker(GAME_TYPES)
+
+# Где чьи сокеты и игры, если воркеров несколько (STATE_BACKEND)
+backend = create_backend()
+
+# Действия каждой игры выполняются по очереди ее актором
+actors = GameActors()
+
+# Снимки и журнал ходов: игры переживают перезапуск сервера
+snapshots = GameSnapshots(db, backend.worker_id if backend.shared else None)
+
+# Все таймауты сервера - в одном колесе таймеров
+timers = TimerWheel()
+
+# Отключившиеся игроки: игра ждет их RECONNECT_GRACE секунд
+sessions = AwaySessions(timers)
+
+# Зрители игр: рассылка отдельно от ходов, отстающим - только последнее состояние
+spectators = Spectators(timers)
+
+# Бот в режиме вебхука обслуживается этим же процессом
+webhook = None
+if BOT_MODE == 'webhook':
+    from bot.webhook import create_webhook
+    webhook = create_webhook()
+    webhook.mount(app)
+
+@app.on_event("startup")
+async def startup():
+    await db.init_db()
+    matchmaker.on_match = start_matched_game
+    matchmaker.on_evict = search_expired
+    matchmaker.on_tick = keep_matchmaker_lease
+    matchmaker.start()
+    actors.handler = run_game_action
+    spectators.on_relay = relay_spectators
+    timers.start()
+    timers.schedule('heartbeat', HEARTBEAT_INTERVAL, send_pings)
+    for game in await snapshots.load():
+        await add_game(game)
+        schedule_flag(game)
+        if game.status == 'waiting':
+            # Таймер ожидания соперника не переживает перезапуск - ставим заново
+            schedule_waiting_expiry(game.id)
+        # После перезапуска все игроки восстановленных игр отключены
+        for player_id in game.player_ids():
+            mark_away(game, player_id)
+    snapshots.start()
+    await backend.start(handle_backend_message, handle_backend_request)
+    if webhook is not None:
+        await webhook.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    if webhook is not None:
+        await webhook.close()
+    await backend.close()
+    await matchmaker.close()
+    await actors.close()
+    await spectators.close()
+    await timers.close()
+    await snapshots.close()
+    await db.close()
 
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: Dict[int, WebSocket] = {}
+        self.active_connections: Dict[int, Connection] = {}
     
-    async def connect(self, user_id: int, websocket: WebSocket):
+    async def connect(self, user_id: int, websocket: WebSocket, binary: bool = False) -> Connection:
         await websocket.accept()
-        self.active_connections[user_id] = websocket
+        connection = Connection(user_id, websocket, on_overflow=resync_connection, binary=binary)
+        # Новое соединение того же пользователя вытесняет старое
+        old = self.active_connections.get(user_id)
+        if old is not None:
+            old.close(code=1000)
+        self.active_connections[user_id] = connection
+        connection.start()
+        return connection
     
-    def disconnect(self, user_id: int):
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
+    def disconnect(self, user_id: int, connection: Connection = None) -> bool:
+        """Убрать соединение. False - его уже вытеснило новое"""
+        current = self.active_connections.get(user_id)
+        if current is None or (connection is not None and current is not connection):
+            if connection is not None:
+                connection.close(code=1000)
+            return False
+        del self.active_connections[user_id]
+        current.close(code=1000)
+        return True
     
-    async def send_personal_message(self, message: dict, user_id: int):
-        if user_id in self.active_connections:
-            await self.active_connections[user_id].send_json(message)
+    async def send_personal_message(self, message, user_id: int, game_id: str = None):
+        if game_id is not None:
+            # Игрок отключен - сообщение дошлем, когда он вернется
+            sessions.record(user_id, game_id, message)
+        # Только постановка в очередь соединения, сеть не ждем
+        connection = self.active_connections.get(user_id)
+        if connection is not None:
+            connection.send(message)
+            return
+        # Сокет пользователя может быть на другом воркере
+        worker_id = await backend.locate_user(user_id)
+        if worker_id is not None and worker_id != backend.worker_id:
+            if isinstance(message, Encoded):
+                message = message.message
+            await backend.send(worker_id, {'kind': 'deliver', 'user_id': user_id, 'message': message})
     
     async def broadcast_to_game(self, game_id: str, message: dict, exclude_user: int = None):
-        if game_id in active_games:
-            game = active_games[game_id]
-            for player_id in [game['player1']['id'], game['player2']['id']]:
-                if player_id != exclude_user and player_id in self.active_connections:
-                    await self.active_connections[player_id].send_json(message)
+        game = active_games.get(game_id)
+        if game is not None:
+            # Кодируется один раз на всех получателей
+            message = Encoded(message)
+            for player_id in game.player_ids():
+                if player_id != exclude_user:
+                    await self.send_personal_message(message, player_id, game_id)
+
+# Сообщения, которые нельзя восстановить из состояния игр: при переполнении не выбрасываются
+RESYNC_KEEP = frozenset((
+    'game_started', 'game_ended', 'game_expired', 'search_expired',
+    'opponent_left', 'tournament_bye', 'tournament_ended'
+))
+
+def resync_connection(connection: Connection, dropped: list):
+    """
+    Очередь клиента переполнилась - вместо пропущенных ходов шлем состояние целиком.
+    Итоги и начала игр повторяются как есть: закончившихся игр уже нет в реестре
+    """
+    for message in dropped:
+        if message.message.get('type') in RESYNC_KEEP:
+            connection.send(message)
+    for game in active_games.user_games(connection.user_id):
+        connection.send(game_sync_message(game, connection.user_id))
 
 manager = ConnectionManager()
 
+PING = Encoded({'type': 'ping'})
+
+def send_pings():
+    """Один проход по всем соединениям; следующий - через HEARTBEAT_INTERVAL"""
+    for connection in manager.active_connections.values():
+        connection.send(PING)
+    timers.schedule('heartbeat', HEARTBEAT_INTERVAL, send_pings)
+
+def touch(user_id: int, connection: Connection):
+    # Клиент жив: срок соединения отодвигается, это один перенос в колесе таймеров
+    timers.schedule(('idle', user_id), HEARTBEAT_TIMEOUT, lambda: reap(user_id, connection))
+
+async def reap(user_id: int, connection: Connection):
+    """От клиента давно ничего не было - соединение считаем мертвым"""
+    if manager.disconnect(user_id, connection):
+        await handle_user_disconnect(user_id)
+
 @app.websocket("/ws/{user_id}")
-async def websocket_endpoint(websocket: WebSocket, user_id: int):
-    await manager.connect(user_id, websocket)
+async def websocket_endpoint(websocket: WebSocket, user_id: int, format: str = 'json'):
+    # ?format=msgpack - бинарные кадры в обе стороны
+    binary = format == 'msgpack' and 'msgpack' in FORMATS
+    connection = await manager.connect(user_id, websocket, binary)
+    await backend.register_user(user_id)
+    # Игры пользователя могут ждать его на любом воркере
+    await backend.broadcast({'kind': 'user_connected', 'user_id': user_id})
+    restarting = False
+    touch(user_id, connection)
     try:
         while True:
-            data = await websocket.receive_json()
+            frame = await websocket.receive()
+            if frame['type'] == 'websocket.disconnect':
+                # 1012 - сервер перезапускается: игры остаются в снимках
+                restarting = frame.get('code') == 1012
+                break
+            # Любой кадр, включая pong, подтверждает, что клиент жив
+            touch(user_id, connection)
+            try:
+                data = decode_frame(frame)
+            except ValueError:
+                # Битый кадр не роняет соединение
+                continue
             await handle_websocket_message(user_id, data)
-    except WebSocketDisconnect:
-        manager.disconnect(user_id)
-        await handle_user_disconnect(user_id)
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError - сокет уже закрыт с нашей стороны
+        pass
+    finally:
+        await stop_spectating(user_id)
+        if manager.disconnect(user_id, connection):
+            timers.cancel(('idle', user_id))
+            if not restarting:
+                await handle_user_disconnect(user_id)
 
 async def handle_websocket_message(user_id: int, data: dict):
     message_type = data.get('type')
@@ -69,80 +246,208 @@ async def handle_websocket_message(user_id: int, data: dict):
         await handle_game_action(user_id, data)
     elif message_type == 'chat_message':
         await handle_chat_message(user_id, data)
+    elif message_type == 'spectate':
+        await spectate(user_id, data.get('gameId'))
+    elif message_type == 'unspectate':
+        await unspectate(user_id, data.get('gameId'))
+
+async def forward_to_owner(game_id: str, message: dict) -> bool:
+    """Переслать сообщение воркеру, в памяти которого живет игра"""
+    worker_id = await backend.locate_game(game_id)
+    if worker_id is None or worker_id == backend.worker_id:
+        return False
+    await backend.send(worker_id, message)
+    return True
 
-async def handle_game_action(user_id: int, data: dict):
+async def handle_game_action(user_id: int, data: dict, forwarded: bool = False):
     game_id = data.get('gameId')
-    action = data.get('action')
-    action_data = data.get('data', {})
     
     if game_id not in active_games:
+        if not forwarded:
+            await forward_to_owner(game_id, {'kind': 'action', 'user_id': user_id, 'data': data})
         return
     
-    game = active_games[game_id]
+    # Не трогаем игру из корутины соединения: действие выполнит актор игры
+    actors.tell(game_id, user_id, data)
+
+async def run_game_action(game_id: str, user_id: int, data: dict):
+    """Одно действие игры; вызывается только актором этой игры"""
+    game = active_games.get(game_id)
+    if game is None:
+        return
+    if data is None:
+        # Время ожидания вышло; игрок мог успеть вернуться
+        if user_id not in manager.active_connections and await backend.locate_user(user_id) is None:
+            await player_disconnected(game, user_id)
+        return
+    if user_id is not None and not game.has_player(user_id):
+        # Зрители и посторонние не могут ходить, сдаваться или предлагать ничью;
+        # user_id None - действия таймеров сервера
+        print(f"User {user_id} is not a player of game {game_id}, action ignored")
+        return
+    
+    action = data.get('action')
+    action_data = data.get('data', {})
+    
+    opponent_id = game.opponent_id(user_id)
     
     if action == 'move':
-        # Обрабатываем ход
-        game['state'] = action_data
-        game['currentPlayer'] = get_opponent_id(game, user_id)
+        # Клиент присылает только ход, доску ведет и проверяет сервер
+        if game.rules is None or game.status != 'active':
+            return
+        now = time.monotonic()
+        if game.clock is not None and game.clock.flagged(now):
+            # Ход пришел после падения флага
+            await flag_fall(game)
+            return
+        try:
+            move = parse_move(action_data)
+            if user_id != game.current_player:
+                raise IllegalMove("Сейчас ход соперника")
+            if action_data.get('seq') != game.seq + 1:
+                raise IllegalMove("Неверный номер хода")
+            outcome = game.rules.play(move, game.board, game.is_white(user_id))
+        except (KeyError, TypeError, ValueError):
+            # Ход не прошел или клиент разошелся с сервером - возвращаем ему доску сервера
+            await send_game_sync(game, user_id)
+            return
+        
+        game.seq += 1
+        game.current_player = opponent_id
+        game.last_move = move_to_wire(move)
+        checksum = board_hash(game.board)
+        wire_move = {**game.last_move, 'seq': game.seq, 'hash': checksum}
+        if game.clock is not None:
+            game.clock.press(now)
+            wire_move['clock'] = game.clock.to_dict(now)
+            if outcome is None:
+                schedule_flag(game)
+        await snapshots.log_move(game)
         
         # Отправляем ход сопернику
-        opponent_id = get_opponent_id(game, user_id)
         await manager.send_personal_message({
             'type': 'opponent_move',
-            'move': action_data
-        }, opponent_id)
+            'move': wire_move
+        }, opponent_id, game_id)
+        publish_game(game)
+        
+        # Доска отправителя после хода не совпала с серверной
+        if action_data.get('hash') not in (None, checksum):
+            await send_game_sync(game, user_id)
         
+        if outcome in ('checkmate', 'no_moves'):
+            await end_game(game_id, user_id, outcome)
+        elif outcome is not None:
+            await end_game(game_id, 'draw', outcome)
+    
+    elif action == 'sync':
+        await send_game_sync(game, user_id)
+    
+    elif action == 'flag':
+        # Флаг проверяет сервер по своим часам - от таймера или по заявке клиента
+        if game.clock is not None and game.status == 'active':
+            if game.clock.flagged():
+                await flag_fall(game)
+            elif user_id is None:
+                # Колесо срабатывает с точностью до тика и могло опередить часы
+                schedule_flag(game)
+
     elif action == 'rps_choice':
         # Обработка КНБ
         round_num = action_data.get('round')
         choice = action_data.get('choice')
         
-        if 'rps_choices' not in game:
-            game['rps_choices'] = {}
+        if game.rps_choices is None:
+            game.rps_choices = {}
         
-        game['rps_choices'][user_id] = choice
+        game.rps_choices[user_id] = choice
         
         # Проверяем, сделали ли оба игрока выбор
-        if len(game['rps_choices']) == 2:
-            opponent_id = get_opponent_id(game, user_id)
-            
+        if len(game.rps_choices) == 2:
             # Отправляем выборы обоим игрокам
             await manager.send_personal_message({
                 'type': 'opponent_move',
-                'choice': game['rps_choices'][opponent_id]
-            }, user_id)
+                'choice': game.rps_choices[opponent_id]
+            }, user_id, game_id)
             
             await manager.send_personal_message({
                 'type': 'opponent_move',
-                'choice': game['rps_choices'][user_id]
-            }, opponent_id)
+                'choice': game.rps_choices[user_id]
+            }, opponent_id, game_id)
             
-            game['rps_choices'] = {}
+            choices = game.rps_choices
+            game.rps_choices = {}
+            game.seq += 1
+            publish_game(game, choices=choices)
     
     elif action == 'offer_draw':
-        opponent_id = get_opponent_id(game, user_id)
         await manager.send_personal_message({
             'type': 'draw_offer'
-        }, opponent_id)
+        }, opponent_id, game_id)
     
     elif action == 'resign':
-        opponent_id = get_opponent_id(game, user_id)
         await end_game(game_id, opponent_id, 'resignation')
     
     elif action == 'leave':
-        opponent_id = get_opponent_id(game, user_id)
         await manager.send_personal_message({
             'type': 'opponent_left'
-        }, opponent_id)
+        }, opponent_id, game_id)
         await end_game(game_id, opponent_id, 'opponent_left')
 
-async def handle_chat_message(user_id: int, data: dict):
+def game_sync_message(game: Game, user_id: int = None) -> dict:
+    state = {
+        'gameId': game.id,
+        'status': game.status,
+        'seq': game.seq,
+        'currentPlayer': game.current_player
+    }
+    if game.board is not None:
+        state['board'] = game.board.to_rows()
+    if game.clock is not None:
+        state['clock'] = game.clock.to_dict()
+    if game.rps_choices is not None and user_id is not None:
+        # В КНБ - только свой выбор в текущем раунде, выбор соперника не раскрываем
+        state['rpsChoice'] = game.rps_choices.get(user_id)
+    return {'type': 'game_sync', 'state': state}
+
+def new_clock(time_control) -> GameClock:
+    control = TimeControl.from_dict(time_control)
+    return GameClock(control) if control is not None else None
+
+def start_game(game: Game):
+    """Оба игрока на месте: пошло время партии и часы белых"""
+    game.started_at = time.time()
+    if game.clock is not None:
+        game.clock.start()
+        schedule_flag(game)
+
+def schedule_flag(game: Game):
+    # Один таймер на игру в общем колесе, переносится после каждого хода
+    deadline = game.clock.deadline() if game.clock is not None else None
+    if deadline is None:
+        return
+    game_id = game.id
+    timers.schedule(('flag', game_id), deadline - time.monotonic(),
+                    lambda: actors.tell(game_id, None, {'action': 'flag'}))
+
+async def flag_fall(game: Game):
+    # Время вышло у того, чьи часы идут
+    loser_id = game.player1.id if game.clock.white_running else game.player2.id
+    await end_game(game.id, game.opponent_id(loser_id), 'timeout')
+
+async def send_game_sync(game: Game, user_id: int):
+    """Полное состояние доски - только при расхождении с клиентом"""
+    await manager.send_personal_message(game_sync_message(game, user_id), user_id, game.id)
+
+async def handle_chat_message(user_id: int, data: dict, forwarded: bool = False):
     game_id = data.get('gameId')
     text = data.get('text')
     
-    if game_id in active_games:
-        game = active_games[game_id]
-        sender_name = get_player_name(game, user_id)
+    game = active_games.get(game_id)
+    if game is None and not forwarded:
+        await forward_to_owner(game_id, {'kind': 'chat', 'user_id': user_id, 'data': data})
+    elif game is not None:
+        sender_name = game.player_name(user_id)
         
         await manager.broadcast_to_game(game_id, {
             'type': 'chat_message',
@@ -150,42 +455,232 @@ async def handle_chat_message(user_id: int, data: dict):
             'text': text
         })
 
+def spectator_state(game: Game, **extra) -> dict:
+    data = game.to_dict()
+    # Выбор в КНБ до ответа соперника зрителям не показываем
+    data.pop('rps_choices', None)
+    return {'type': 'spectate_state', 'gameId': game.id, 'game': data, **extra}
+
+def publish_game(game: Game, **extra):
+    """Новое состояние игры - зрителям, если они есть. Ход игрока рассылки не ждет"""
+    if game.id in spectators:
+        spectators.publish(game.id, spectator_state(game, **extra))
+
+async def spectate(user_id: int, game_id: str):
+    connection = manager.active_connections.get(user_id)
+    if connection is None:
+        return
+    game = active_games.get(game_id)
+    if game is not None:
+        if game.status != 'active':
+            connection.send({'type': 'spectate_error', 'gameId': game_id})
+        elif spectators.watch(game_id, user_id, connection):
+            spectators.publish(game_id, spectator_state(game))
+        return
+    # Игра на другом воркере: он шлет состояния этому воркеру, а тот - своим зрителям
+    worker_id = await backend.locate_game(game_id)
+    if worker_id is None or worker_id == backend.worker_id:
+        connection.send({'type': 'spectate_error', 'gameId': game_id})
+    elif spectators.watch(game_id, user_id, connection):
+        await backend.send(worker_id, {'kind': 'watch', 'game_id': game_id, 'worker_id': backend.worker_id})
+
+async def unspectate(user_id: int, game_id: str):
+    if spectators.unwatch(game_id, user_id):
+        await stop_relay(game_id)
+
+async def stop_spectating(user_id: int):
+    for game_id in spectators.unwatch_all(user_id):
+        await stop_relay(game_id)
+
+async def stop_relay(game_id: str):
+    """Своих зрителей у игры с другого воркера не осталось"""
+    if game_id not in active_games:
+        worker_id = await backend.locate_game(game_id)
+        if worker_id is not None and worker_id != backend.worker_id:
+            await backend.send(worker_id, {'kind': 'unwatch', 'game_id': game_id, 'worker_id': backend.worker_id})
+
+async def relay_spectators(worker_id: str, game_id: str, message: dict):
+    await backend.send(worker_id, {'kind': 'spectate', 'game_id': game_id, 'message': message})
+
 async def handle_user_disconnect(user_id: int):
-    # Найти все игры пользователя и уведомить соперников
-    for game_id, game in list(active_games.items()):
-        if user_id in [game['player1']['id'], game['player2']['id']]:
-            opponent_id = get_opponent_id(game, user_id)
+    await backend.unregister_user(user_id)
+    # Очередь подбора и игры пользователя могут быть на любом воркере
+    await backend.broadcast({'kind': 'user_disconnected', 'user_id': user_id})
+
+async def cleanup_user_games(user_id: int):
+    # Ушедший игрок больше не ищет соперника
+    matchmaker.cancel(user_id)
+    
+    # Игры ждут возвращения игрока, сопернику сообщаем
+    for game in active_games.user_games(user_id):
+        mark_away(game, user_id)
+        opponent_id = game.opponent_id(user_id)
+        if opponent_id is not None:
             await manager.send_personal_message({
-                'type': 'opponent_left'
-            }, opponent_id)
-            del active_games[game_id]
+                'type': 'opponent_away'
+            }, opponent_id, game.id)
+
+def mark_away(game: Game, user_id: int):
+    # Не вернулся вовремя - игру закрывает ее актор, после уже принятых ходов
+    game_id = game.id
+    sessions.leave(user_id, game_id, lambda: actors.tell(game_id, user_id, None))
 
-def get_opponent_id(game: dict, user_id: int) -> int:
-    if game['player1']['id'] == user_id:
-        return game['player2']['id']
-    return game['player1']['id']
+async def resume_user_games(user_id: int):
+    """Игрок переподключился: досылаем пропущенное и текущие доски"""
+    for game in active_games.user_games(user_id):
+        missed = sessions.resume(user_id, game.id)
+        if missed is not None:
+            for message in missed:
+                await manager.send_personal_message(message, user_id)
+            opponent_id = game.opponent_id(user_id)
+            if opponent_id is not None:
+                await manager.send_personal_message({
+                    'type': 'opponent_back'
+                }, opponent_id, game.id)
+        if game.board is not None:
+            await send_game_sync(game, user_id)
 
-def get_player_name(game: dict, user_id: int) -> str:
-    if game['player1']['id'] == user_id:
-        return game['player1']['username']
-    return game['player2']['username']
+async def player_disconnected(game: Game, user_id: int):
+    # Игра закрывается, сопернику сообщаем
+    opponent_id = game.opponent_id(user_id)
+    if opponent_id is None:
+        await remove_game(game.id)
+        return
+    await manager.send_personal_message({
+        'type': 'opponent_left'
+    }, opponent_id)
+    # Не вернулся - как сдался: партия засчитывается сопернику
+    await end_game(game.id, opponent_id, 'opponent_left')
 
 async def end_game(game_id: str, winner_id: int, reason: str):
-    if game_id in active_games:
-        game = active_games[game_id]
-        
-        # Отправляем результат обоим игрокам
-        await manager.broadcast_to_game(game_id, {
-            'type': 'game_ended',
-            'result': {
-                'winner': winner_id,
-                'reason': reason,
-                'ratingChange': 25,
-                'duration': 300  # TODO: посчитать реальное время
-            }
+    game = active_games.get(game_id)
+    if game is not None:
+        started_at = game.started_at or game.created_at
+        duration = int(time.time() - started_at)
+        await spectators.end(game_id, {
+            'type': 'spectate_ended',
+            'gameId': game_id,
+            'result': {'winner': winner_id, 'reason': reason}
         })
+        await remove_game(game_id)
+        tournament = tournament_games.pop(game_id, None)
+        
+        # Рейтинг считает сервер; игра, рейтинг и статистика пишутся одной транзакцией
+        rating_changes = {}
+        if game.player2 is not None:
+            try:
+                rating_changes = await db.finish_game({
+                    'game_id': game_id,
+                    'game_type': game.type,
+                    'player1_id': game.player1.id,
+                    'player2_id': game.player2.id,
+                    'winner_id': winner_id if winner_id != 'draw' else None,
+                    'status': 'finished',
+                    'moves_count': game.seq,
+                    'duration': duration,
+                    'tournament_id': tournament.id if tournament is not None else None
+                })
+            except Exception as e:
+                # Игроки все равно узнают результат, даже если запись не удалась
+                print(f"Error saving game {game_id}: {e}")
         
-        del active_games[game_id]
+        # Отправляем результат обоим игрокам, у каждого свое изменение рейтинга
+        for player_id in game.player_ids():
+            await manager.send_personal_message({
+                'type': 'game_ended',
+                'result': {
+                    'winner': winner_id,
+                    'reason': reason,
+                    'ratingChange': rating_changes.get(player_id, 0),
+                    'duration': duration
+                }
+            }, player_id)
+        
+        if tournament is not None:
+            await tournament_game_ended(tournament, game_id, winner_id if winner_id != 'draw' else None)
+
+async def add_game(game: Game) -> Game:
+    """Игра в реестре этого воркера и в общем каталоге"""
+    active_games.add(game)
+    actors.spawn(game.id)
+    snapshots.mark(game)
+    await backend.register_game(game.id, game.code if game.status == 'waiting' else None)
+    return game
+
+async def remove_game(game_id: str):
+    game = active_games.remove(game_id)
+    actors.stop(game_id)
+    timers.cancel(('waiting', game_id))
+    timers.cancel(('flag', game_id))
+    await spectators.end(game_id, {'type': 'spectate_ended', 'gameId': game_id})
+    if game is not None:
+        for player_id in game.player_ids():
+            sessions.forget(player_id, game_id)
+        await snapshots.drop(game_id)
+        await backend.unregister_game(game_id, game.code)
+    return game
+
+async def handle_backend_message(message: dict):
+    """Сообщения от других воркеров"""
+    kind = message.get('kind')
+    if kind == 'deliver':
+        connection = manager.active_connections.get(message['user_id'])
+        if connection is not None:
+            connection.send(message['message'])
+    elif kind == 'action':
+        await handle_game_action(message['user_id'], message['data'], forwarded=True)
+    elif kind == 'chat':
+        await handle_chat_message(message['user_id'], message['data'], forwarded=True)
+    elif kind == 'user_disconnected':
+        await cleanup_user_games(message['user_id'])
+    elif kind == 'user_connected':
+        await resume_user_games(message['user_id'])
+    elif kind == 'watch':
+        # У воркера появились зрители нашей игры
+        game = active_games.get(message['game_id'])
+        if game is None:
+            await relay_spectators(message['worker_id'], message['game_id'], {
+                'type': 'spectate_ended', 'gameId': message['game_id']
+            })
+        elif spectators.add_relay(game.id, message['worker_id']):
+            spectators.publish(game.id, spectator_state(game))
+    elif kind == 'unwatch':
+        spectators.remove_relay(message['game_id'], message['worker_id'])
+    elif kind == 'spectate':
+        # Состояние чужой игры для своих зрителей, задержку уже выдержал воркер игры
+        if message['message'].get('type') == 'spectate_ended':
+            await spectators.end(message['game_id'], message['message'])
+        else:
+            spectators.publish(message['game_id'], message['message'], delay=0)
+
+async def handle_backend_request(payload: dict):
+    """Запросы других воркеров к играм и очереди подбора этого воркера"""
+    op = payload.get('op')
+    if op == 'find':
+        return await find_game_local(payload['user_id'], payload['game_type'])
+    if op == 'cancel_find':
+        matchmaker.cancel(payload['user_id'])
+        return True
+    if op == 'join':
+        return await join_game_local(payload['user_id'], payload['code'])
+    if op == 'cancel':
+        return await remove_game(payload['game_id']) is not None
+    if op == 'get':
+        game = active_games.get(payload['game_id'])
+        return game.to_dict() if game is not None else None
+    if op == 'user_games':
+        return user_games_local(payload['user_id'])
+    return None
+
+async def ask_worker(worker_id, payload: dict):
+    """Запрос другому воркеру; None, если он не ответил вовремя"""
+    if worker_id is None:
+        return None
+    try:
+        return await backend.request(worker_id, payload)
+    except asyncio.TimeoutError:
+        print(f"Worker {worker_id} did not answer {payload.get('op')}")
+        return None
 
 # API endpoints
 @app.post("/api/games/create")
@@ -193,116 +688,331 @@ async def create_game(data: dict):
     user_id = data['userId']
     game_type = data['gameType']
     
-    # Генерируем уникальный код игры
+    board = initial_board(game_type)
+    try:
+        # Часы - только у игр с доской
+        clock = new_clock(data.get('timeControl')) if board is not None else None
+    except (KeyError, TypeError, ValueError):
+        return {'error': 'Invalid time control'}, 400
+    
+    # Генерируем уникальный среди ожидающих игр код (на всех воркерах)
     code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
+    while active_games.has_code(code) or await backend.find_code(code):
+        code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
     game_id = f"{game_type}_{code}_{user_id}"
     
-    active_games[game_id] = {
-        'id': game_id,
-        'code': code,
-        'type': game_type,
-        'player1': {'id': user_id, 'username': f'Player{user_id}'},
-        'player2': None,
-        'status': 'waiting',
-        'created_at': datetime.now().isoformat()
-    }
+    await add_game(Game(game_id, game_type, Player(user_id), code=code,
+                        board=board, rules=create_rules(game_type, board), clock=clock))
+    schedule_waiting_expiry(game_id)
     
     return {
         'gameId': game_id,
         'code': code
     }
 
+def schedule_waiting_expiry(game_id: str):
+    # Никто не пришел по коду - игра закрывается сама
+    timers.schedule(('waiting', game_id), WAITING_GAME_TTL, lambda: expire_waiting_game(game_id))
+
+async def expire_waiting_game(game_id: str):
+    game = active_games.get(game_id)
+    if game is not None and game.status == 'waiting':
+        await remove_game(game_id)
+        await manager.send_personal_message({
+            'type': 'game_expired'
+        }, game.player1.id)
+
 @app.post("/api/games/find")
 async def find_game(data: dict):
     user_id = data['userId']
     game_type = data['gameType']
     
-    # Добавляем в очередь
-    game_queue[game_type].append({
-        'userId': user_id,
-        'timestamp': datetime.now()
-    })
+    if game_type not in GAME_TYPES:
+        return {'error': 'Unknown game type'}, 400
     
-    # Проверяем, есть ли еще кто-то в очереди
-    if len(game_queue[game_type]) >= 2:
-        player1 = game_queue[game_type].pop(0)
-        player2 = game_queue[game_type].pop(0)
-        
+    # Очередь подбора одна на все воркеры - у того, кто держит аренду
+    worker_id = await backend.matchmaker_worker()
+    if worker_id != backend.worker_id:
+        result = await ask_worker(worker_id, {'op': 'find', 'user_id': user_id, 'game_type': game_type})
+        return result if result is not None else ({'error': 'Matchmaking unavailable'}, 503)
+    return await find_game_local(user_id, game_type)
+
+async def find_game_local(user_id: int, game_type: str) -> dict:
+    # Встаем в очередь, сразу берем соперника, если он подходит по рейтингу.
+    # Остальных сведет фоновый подбор
+    opponent = matchmaker.enqueue(user_id, game_type, get_rating(user_id))
+    if opponent is not None:
+        game = await start_matched_game(game_type, opponent.user_id, user_id)
+        return {'gameId': game.id}
+    
+    return {'status': 'queued'}
+
+@app.post("/api/games/find/cancel")
+async def cancel_find(data: dict):
+    worker_id = await backend.matchmaker_worker()
+    if worker_id != backend.worker_id:
+        await ask_worker(worker_id, {'op': 'cancel_find', 'user_id': data['userId']})
+    else:
+        matchmaker.cancel(data['userId'])
+    return {'status': 'cancelled'}
+
+async def keep_matchmaker_lease():
+    """
+    Аренда очереди подбора продлевается, пока в ней кто-то ждет: иначе
+    ее заберет другой воркер и очередь разделится. Если аренда все же
+    ушла, ожидающие переходят к новому ведущему
+    """
+    if not len(matchmaker):
+        return
+    worker_id = await backend.matchmaker_worker()
+    if worker_id is None or worker_id == backend.worker_id:
+        return
+    for entry in matchmaker.drain():
+        result = await ask_worker(worker_id, {'op': 'find', 'user_id': entry.user_id, 'game_type': entry.game_type})
+        if result is None:
+            # Новый ведущий не ответил - игрок остается здесь до следующего тика
+            matchmaker.requeue(entry)
+
+async def search_expired(entry):
+    # Соперник не нашелся за MATCH_QUEUE_TTL - игрок выбывает из очереди
+    await manager.send_personal_message({
+        'type': 'search_expired'
+    }, entry.user_id)
+
+def get_rating(user_id: int) -> int:
+    # Рейтинг из таблицы в памяти базы, без запроса к диску
+    entry = db.leaderboard.get(user_id)
+    return entry['rating'] if entry else DEFAULT_RATING
+
+async def start_matched_game(game_type: str, player1_id: int, player2_id: int) -> Game:
+    """Игра для пары из очереди: первый - кто ждал дольше, он играет белыми"""
+    game_id = f"{game_type}_{random.randint(1000, 9999)}"
+    while game_id in active_games or await backend.locate_game(game_id):
         game_id = f"{game_type}_{random.randint(1000, 9999)}"
-        
-        game = {
-            'id': game_id,
-            'type': game_type,
-            'player1': {'id': player1['userId'], 'username': f'Player{player1["userId"]}'},
-            'player2': {'id': player2['userId'], 'username': f'Player{player2["userId"]}'},
-            'status': 'active',
-            'currentPlayer': player1['userId'],
-            'created_at': datetime.now().isoformat()
-        }
-        
-        active_games[game_id] = game
-        
-        # Уведомляем обоих игроков
-        await manager.send_personal_message({
-            'type': 'game_started',
-            'game': game
-        }, player1['userId'])
-        
+    
+    board = initial_board(game_type)
+    game = Game(
+        game_id, game_type,
+        Player(player1_id), Player(player2_id),
+        status='active', current_player=player1_id,
+        board=board, rules=create_rules(game_type, board),
+        clock=new_clock(MATCH_TIME_CONTROL) if board is not None else None
+    )
+    start_game(game)
+    await add_game(game)
+    
+    # Уведомляем обоих игроков
+    game_data = game.to_dict()
+    await manager.send_personal_message({
+        'type': 'game_started',
+        'game': game_data
+    }, player1_id)
+    
+    await manager.send_personal_message({
+        'type': 'game_started',
+        'game': game_data
+    }, player2_id)
+    
+    return game
+
+async def tournament_game_ended(tournament: Tournament, game_id: str, winner_id):
+    """Итог партии в таблицу турнира; сыгран весь тур - следующий тур или конец"""
+    replay = tournament.record(game_id, winner_id)
+    if replay is not None:
+        await start_tournament_games(tournament, [replay])
+        return
+    if not tournament.round_over():
+        return
+    pairings = tournament.advance()
+    if pairings:
+        await start_tournament_round(tournament, pairings)
+    else:
+        await finish_tournament(tournament)
+
+async def start_tournament_round(tournament: Tournament, pairings: list):
+    await start_tournament_games(tournament, pairings)
+    for user_id in tournament.byes:
         await manager.send_personal_message({
-            'type': 'game_started',
-            'game': game
-        }, player2['userId'])
-        
-        return {'gameId': game_id}
+            'type': 'tournament_bye',
+            'tournamentId': tournament.id,
+            'round': tournament.round
+        }, user_id)
+    await db.save_tournament(tournament)
+
+async def start_tournament_games(tournament: Tournament, pairings: list):
+    """Партии тура создаются все сразу, уведомления - после"""
+    games = []
+    for pairing in pairings:
+        game_id = f"{tournament.id}_{next(tournament_game_numbers)}"
+        board = initial_board(tournament.game_type)
+        white = tournament.players[pairing.white]
+        black = tournament.players[pairing.black]
+        game = Game(
+            game_id, tournament.game_type,
+            Player(white.id, white.username), Player(black.id, black.username),
+            status='active', current_player=white.id,
+            board=board, rules=create_rules(tournament.game_type, board),
+            clock=new_clock(tournament.time_control) if board is not None else None
+        )
+        tournament.bind(game_id, pairing)
+        tournament_games[game_id] = tournament
+        start_game(game)
+        await add_game(game)
+        games.append(game)
     
-    return {'status': 'queued'}
+    for game in games:
+        game_data = game.to_dict()
+        game_data['tournament'] = {'id': tournament.id, 'round': tournament.round}
+        message = Encoded({'type': 'game_started', 'game': game_data})
+        for player_id in game.player_ids():
+            if player_id not in manager.active_connections and await backend.locate_user(player_id) is None:
+                # Не в сети: партия ждет игрока RECONNECT_GRACE секунд, как после обрыва связи
+                mark_away(game, player_id)
+            await manager.send_personal_message(message, player_id, game.id)
+
+async def finish_tournament(tournament: Tournament):
+    await db.save_tournament(tournament)
+    message = Encoded({'type': 'tournament_ended', 'tournament': tournament.to_dict()})
+    for user_id in tournament.players:
+        await manager.send_personal_message(message, user_id)
+    # Итоги еще доступны по API, потом - только в базе
+    tournament_id = tournament.id
+    timers.schedule(('tournament', tournament_id), TOURNAMENT_RESULTS_TTL,
+                    lambda: tournaments.pop(tournament_id, None))
 
 @app.post("/api/games/join")
 async def join_game(data: dict):
     user_id = data['userId']
     code = data['code']
     
-    # Ищем игру по коду
-    game = None
-    game_id = None
+    result = await join_game_local(user_id, code)
+    if result is None:
+        # Игра могла быть создана на другом воркере
+        game_id = await backend.find_code(code)
+        if game_id is not None:
+            worker_id = await backend.locate_game(game_id)
+            if worker_id != backend.worker_id:
+                result = await ask_worker(worker_id, {'op': 'join', 'user_id': user_id, 'code': code})
     
-    for gid, g in active_games.items():
-        if g.get('code') == code and g['status'] == 'waiting':
-            game = g
-            game_id = gid
-            break
+    if result is None:
+        return {'error': 'Game not found'}, 404
+    return result
+
+async def join_game_local(user_id: int, code: str):
+    # Ищем ожидающую игру по коду
+    game = active_games.find_by_code(code)
     
     if not game:
-        return {'error': 'Game not found'}, 404
+        return None
     
-    # Добавляем второго игрока
-    game['player2'] = {'id': user_id, 'username': f'Player{user_id}'}
-    game['status'] = 'active'
-    game['currentPlayer'] = game['player1']['id']
+    # Добавляем второго игрока; код больше не нужен
+    game_id = game.id
+    active_games.join(game_id, Player(user_id))
+    timers.cancel(('waiting', game_id))
+    start_game(game)
+    snapshots.mark(game)
+    await backend.unregister_game(game_id, code)
+    await backend.register_game(game_id)
     
     # Уведомляем обоих игроков
+    game_data = game.to_dict()
     await manager.send_personal_message({
         'type': 'game_started',
-        'game': game
-    }, game['player1']['id'])
+        'game': game_data
+    }, game.player1.id)
     
     return {
         'gameId': game_id,
-        'game': game
+        'game': game_data
     }
 
 @app.post("/api/games/{game_id}/cancel")
 async def cancel_game(game_id: str, data: dict):
-    if game_id in active_games:
-        del active_games[game_id]
+    if game_id in tournament_games:
+        # Партию турнира можно только доиграть или проиграть
+        return {'error': 'Tournament games cannot be cancelled'}, 400
+    if await remove_game(game_id) is None:
+        await ask_worker(await backend.locate_game(game_id), {'op': 'cancel', 'game_id': game_id})
     return {'status': 'cancelled'}
 
 @app.get("/api/games/{game_id}")
 async def get_game(game_id: str):
     if game_id in active_games:
-        return active_games[game_id]
+        return active_games[game_id].to_dict()
+    game_data = await ask_worker(await backend.locate_game(game_id), {'op': 'get', 'game_id': game_id})
+    if game_data is not None:
+        return game_data
     return {'error': 'Game not found'}, 404
 
+@app.post("/api/tournaments/create")
+async def create_tournament(data: dict):
+    game_type = data.get('gameType')
+    if game_type not in GAME_TYPES:
+        return {'error': 'Unknown game type'}, 400
+    tournament_format = data.get('format', 'swiss')
+    if tournament_format not in TOURNAMENT_FORMATS:
+        return {'error': 'Unknown tournament format'}, 400
+    try:
+        time_control = data.get('timeControl')
+        # Проверяем контроль времени сразу, а не при старте тура
+        TimeControl.from_dict(time_control)
+        rounds = int(data['rounds']) if data.get('rounds') else None
+        tournament_id = 'T' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+        while tournament_id in tournaments:
+            tournament_id = 'T' + ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+        tournament = Tournament(
+            tournament_id, game_type, tournament_format,
+            rounds=rounds, time_control=time_control, name=data.get('name')
+        )
+    except (KeyError, TypeError, ValueError):
+        return {'error': 'Invalid tournament settings'}, 400
+    
+    tournaments[tournament_id] = tournament
+    await db.save_tournament(tournament)
+    return tournament.to_dict()
+
+@app.post("/api/tournaments/{tournament_id}/join")
+async def join_tournament(tournament_id: str, data: dict):
+    tournament = tournaments.get(tournament_id)
+    if tournament is None:
+        return {'error': 'Tournament not found'}, 404
+    user_id = data['userId']
+    try:
+        tournament.join(user_id, data.get('username') or f'Player{user_id}', get_rating(user_id))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    return {'status': 'joined', 'players': len(tournament)}
+
+@app.post("/api/tournaments/{tournament_id}/leave")
+async def leave_tournament(tournament_id: str, data: dict):
+    tournament = tournaments.get(tournament_id)
+    if tournament is None:
+        return {'error': 'Tournament not found'}, 404
+    try:
+        tournament.leave(data['userId'])
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    return {'status': 'left', 'players': len(tournament)}
+
+@app.post("/api/tournaments/{tournament_id}/start")
+async def start_tournament(tournament_id: str):
+    tournament = tournaments.get(tournament_id)
+    if tournament is None:
+        return {'error': 'Tournament not found'}, 404
+    try:
+        pairings = tournament.start()
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    await start_tournament_round(tournament, pairings)
+    return tournament.to_dict()
+
+@app.get("/api/tournaments/{tournament_id}")
+async def get_tournament(tournament_id: str, limit: int = 10):
+    tournament = tournaments.get(tournament_id)
+    if tournament is None:
+        return {'error': 'Tournament not found'}, 404
+    return tournament.to_dict(limit)
+
 @app.get("/api/users/{user_id}")
 async def get_user(user_id: int):
     # TODO: получить из базы данных
@@ -315,18 +1025,36 @@ async def get_user(user_id: int):
 
 @app.get("/api/users/{user_id}/games")
 async def get_user_games(user_id: int):
+    user_games = user_games_local(user_id)
+    for games in await backend.request_others({'op': 'user_games', 'user_id': user_id}):
+        user_games.extend(games)
+    return user_games
+
+def user_games_local(user_id: int) -> list:
     user_games = []
-    for game_id, game in active_games.items():
-        if user_id in [game['player1']['id'], game.get('player2', {}).get('id')]:
-            opponent = game['player2'] if game['player1']['id'] == user_id else game['player1']
-            user_games.append({
-                'id': game_id,
-                'type': game['type'],
-                'opponentName': opponent.get('username', 'Waiting...'),
-                'status': 'Ваш ход' if game.get('currentPlayer') == user_id else 'Ход соперника'
-            })
+    for game in active_games.user_games(user_id):
+        opponent = game.player2 if game.player1.id == user_id else game.player1
+        user_games.append({
+            'id': game.id,
+            'type': game.type,
+            'opponentName': opponent.username if opponent else 'Waiting...',
+            'status': 'Ваш ход' if game.current_player == user_id else 'Ход соперника'
+        })
     return user_games
 
+@app.get("/api/health")
+async def health():
+    return {
+        'connections': len(manager.active_connections),
+        'queuedBytes': sum(c.queued_bytes for c in manager.active_connections.values()),
+        'games': len(active_games),
+        'awayPlayers': len(sessions),
+        'timers': len(timers),
+        'matchmaking': len(matchmaker),
+        'tournaments': len(tournaments),
+        'spectators': len(spectators)
+    }
+
 @app.get("/")
 async def root():
     return FileResponse("webapp/index.html")
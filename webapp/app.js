@@ -9,6 +9,8 @@ let currentGame = null;
 let selectedGameType = null;
 let ws = null;
 let gameState = null;
+// Номер последнего хода в текущей игре
+let moveSeq = 0;
 
 // Инициализация
 document.addEventListener('DOMContentLoaded', async () => {
@@ -85,6 +87,8 @@ function connectWebSocket() {
 function handleWebSocketMessage(message) {
     switch (message.type) {
         case 'game_started':
+            // Соперник найден подбором - id игры приходит только здесь
+            currentGame = message.game.id;
             startGameSession(message.game);
             break;
         case 'opponent_move':
@@ -93,6 +97,9 @@ function handleWebSocketMessage(message) {
         case 'game_update':
             updateGameState(message.state);
             break;
+        case 'game_sync':
+            handleGameSync(message.state);
+            break;
         case 'game_ended':
             showGameResult(message.result);
             break;
@@ -102,6 +109,35 @@ function handleWebSocketMessage(message) {
         case 'opponent_left':
             handleOpponentLeft();
             break;
+        case 'opponent_away':
+            addChatMessage('⚠️', 'Соперник отключился, ждем его возвращения');
+            break;
+        case 'opponent_back':
+            addChatMessage('✅', 'Соперник вернулся');
+            break;
+        case 'ping':
+            // Сервер проверяет, что соединение живо
+            ws.send(JSON.stringify({ type: 'pong' }));
+            break;
+        case 'game_expired':
+            currentGame = null;
+            tg.showAlert('Никто не присоединился к игре');
+            showScreen('main-menu');
+            break;
+        case 'search_expired':
+            tg.showAlert('Соперник не найден, попробуйте позже');
+            showScreen('main-menu');
+            break;
+        case 'tournament_bye':
+            tg.showAlert(`Тур ${message.round}: вы пропускаете тур и получаете очко`);
+            break;
+        case 'tournament_ended': {
+            const place = message.tournament.standings.find(p => p.user_id === currentUser.id);
+            tg.showAlert(place
+                ? `Турнир окончен! Ваше место: ${place.place}, очки: ${place.score}`
+                : 'Турнир окончен!');
+            break;
+        }
     }
 }
 
@@ -265,6 +301,21 @@ async function cancelWaiting() {
         } catch (error) {
             console.error('Ошибка отмены:', error);
         }
+    } else {
+        // Ждали подбора соперника - выходим из очереди
+        try {
+            await fetch('/api/games/find/cancel', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    userId: currentUser.id
+                })
+            });
+        } catch (error) {
+            console.error('Ошибка отмены:', error);
+        }
     }
     
     currentGame = null;
@@ -282,8 +333,14 @@ function startGameSession(game) {
         game.player2.id === currentUser.id ? 'Вы' : game.player2.username;
     
     // Загружаем соответствующую игру
+    moveSeq = 0;
     loadGameBoard(game.type);
     
+    // Игра уже идет - берем доску сервера
+    if (game.state && game.state.seq > 0) {
+        handleGameSync({ ...game.state, currentPlayer: game.currentPlayer });
+    }
+    
     showScreen('game-screen');
     
     tg.HapticFeedback.notificationOccurred('success');
@@ -310,8 +367,10 @@ function loadGameBoard(gameType) {
 function handleOpponentMove(move) {
     if (selectedGameType === 'chess') {
         handleChessMove(move);
+        checkBoardSync(chessBoard, move);
     } else if (selectedGameType === 'checkers') {
         handleCheckersMove(move);
+        checkBoardSync(checkersBoard, move);
     } else if (selectedGameType === 'rps') {
         handleRPSMove(move);
     }
@@ -320,6 +379,55 @@ function handleOpponentMove(move) {
     tg.HapticFeedback.impactOccurred('medium');
 }
 
+// Хэш доски (FNV-1a) - та же функция, что board_hash на сервере
+function boardHash(board) {
+    let hash = 0x811c9dc5;
+    for (const row of board) {
+        for (const cell of row) {
+            hash ^= cell.charCodeAt(0);
+            hash = Math.imul(hash, 0x01000193) >>> 0;
+        }
+    }
+    return hash;
+}
+
+function getOpponentId() {
+    return gameState.player1.id === currentUser.id ? gameState.player2.id : gameState.player1.id;
+}
+
+// Отправка своего хода: только from/to/promotion/captures, без доски
+function sendMove(move, board) {
+    moveSeq++;
+    gameState.currentPlayer = getOpponentId();
+    sendGameAction('move', { ...move, seq: moveSeq, hash: boardHash(board) });
+}
+
+// После хода соперника сверяем доску с серверной
+function checkBoardSync(board, move) {
+    gameState.currentPlayer = currentUser.id;
+    if (move.seq !== moveSeq + 1 || boardHash(board) !== move.hash) {
+        sendGameAction('sync');
+        return;
+    }
+    moveSeq = move.seq;
+}
+
+// Полное состояние от сервера при расхождении
+function handleGameSync(state) {
+    moveSeq = state.seq;
+    gameState.currentPlayer = state.currentPlayer;
+    
+    if (selectedGameType === 'chess') {
+        chessBoard = state.board;
+        renderChessBoard();
+    } else if (selectedGameType === 'checkers') {
+        checkersBoard = state.board;
+        renderCheckersBoard();
+    }
+    
+    updateTurnIndicator();
+}
+
 // Обновление индикатора хода
 function updateTurnIndicator() {
     const indicator = document.getElementById('turn-indicator');
@@ -450,21 +558,21 @@ function showGameResult(result) {
         resultIcon.textContent = '🤝';
         resultTitle.textContent = 'Ничья';
         resultDesc.textContent = 'Хорошая игра!';
-        ratingChange.textContent = '0';
     } else if (isWinner) {
         resultIcon.textContent = '🏆';
         resultTitle.textContent = 'Победа!';
         resultDesc.textContent = 'Поздравляем!';
-        ratingChange.textContent = `+${result.ratingChange || 25}`;
-        ratingChange.classList.remove('negative');
     } else {
         resultIcon.textContent = '😔';
         resultTitle.textContent = 'Поражение';
         resultDesc.textContent = 'В следующий раз повезет!';
-        ratingChange.textContent = `-${result.ratingChange || 15}`;
-        ratingChange.classList.add('negative');
     }
     
+    // Изменение рейтинга со знаком считает сервер (при ничьей тоже может быть не 0)
+    const change = result.ratingChange || 0;
+    ratingChange.textContent = change > 0 ? `+${change}` : `${change}`;
+    ratingChange.classList.toggle('negative', change < 0);
+    
     document.getElementById('game-duration').textContent = 
         formatDuration(result.duration || 0);
     
@@ -118,6 +118,12 @@ function calculateCheckersMove(row, col, piece) {
         return captures;
     }
     
+    // Бить обязательно: если может бить другая шашка, эта не ходит
+    if (hasAnyCapture(isWhite)) {
+        mustCapture = true;
+        return [];
+    }
+    
     // Обычные ходы (если нет обязательных взятий)
     mustCapture = false;
     
@@ -148,6 +154,19 @@ function calculateCheckersMove(row, col, piece) {
     return moves;
 }
 
+function hasAnyCapture(isWhite) {
+    for (let row = 0; row < 8; row++) {
+        for (let col = 0; col < 8; col++) {
+            const piece = checkersBoard[row][col];
+            if (piece === ' ' || (piece.toLowerCase() === 'w') !== isWhite) continue;
+            if (findCaptures(row, col, piece, piece === piece.toUpperCase(), isWhite).length > 0) {
+                return true;
+            }
+        }
+    }
+    return false;
+}
+
 function findCaptures(row, col, piece, isKing, isWhite) {
     const captures = [];
     const directions = [[1, 1], [1, -1], [-1, 1], [-1, -1]];
@@ -198,39 +217,44 @@ function isOpponentChecker(target, myPiece) {
     return target.toLowerCase() !== myPiece.toLowerCase();
 }
 
-function makeCheckersMove(fromRow, fromCol, toRow, toCol, captures) {
-    let piece = checkersBoard[fromRow][fromCol];
+function applyCheckersMove(move) {
+    let piece = checkersBoard[move.from.row][move.from.col];
     
     // Убираем взятые шашки
-    if (captures && captures.length > 0) {
-        captures.forEach(capture => {
+    if (move.captures && move.captures.length > 0) {
+        move.captures.forEach(capture => {
             checkersBoard[capture.row][capture.col] = ' ';
         });
     }
     
     // Превращение в дамку
-    if (piece === 'w' && toRow === 0) {
+    if (piece === 'w' && move.to.row === 0) {
         piece = 'W';
-    } else if (piece === 'b' && toRow === 7) {
+    } else if (piece === 'b' && move.to.row === 7) {
         piece = 'B';
     }
     
     // Перемещаем шашку
-    checkersBoard[toRow][toCol] = piece;
-    checkersBoard[fromRow][fromCol] = ' ';
-    
-    // Отправляем ход на сервер
-    sendGameAction('move', {
+    checkersBoard[move.to.row][move.to.col] = piece;
+    checkersBoard[move.from.row][move.from.col] = ' ';
+}
+
+function makeCheckersMove(fromRow, fromCol, toRow, toCol, captures) {
+    const move = {
         from: { row: fromRow, col: fromCol },
         to: { row: toRow, col: toCol },
-        captures: captures,
-        board: checkersBoard
-    });
+        captures: captures
+    };
+    
+    applyCheckersMove(move);
+    
+    // Отправляем на сервер только ход
+    sendMove(move, checkersBoard);
     
     tg.HapticFeedback.impactOccurred('medium');
 }
 
 function handleCheckersMove(move) {
-    checkersBoard = move.board;
+    applyCheckersMove(move);
     renderCheckersBoard();
 }
\ No newline at end of file
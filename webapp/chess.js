@@ -264,22 +264,39 @@ function isOpponentPiece(target, myPiece) {
     return (myPiece === myPiece.toUpperCase()) !== (target === target.toUpperCase());
 }
 
+function applyChessMove(move) {
+    let piece = chessBoard[move.from.row][move.from.col];
+    
+    // Превращение пешки: регистр по цвету фигуры
+    if (move.promotion) {
+        piece = piece === piece.toUpperCase() ? move.promotion.toUpperCase() : move.promotion.toLowerCase();
+    }
+    
+    chessBoard[move.to.row][move.to.col] = piece;
+    chessBoard[move.from.row][move.from.col] = ' ';
+}
+
 function makeChessMove(fromRow, fromCol, toRow, toCol) {
     const piece = chessBoard[fromRow][fromCol];
-    chessBoard[toRow][toCol] = piece;
-    chessBoard[fromRow][fromCol] = ' ';
-    
-    // Отправляем ход на сервер
-    sendGameAction('move', {
+    const move = {
         from: { row: fromRow, col: fromCol },
-        to: { row: toRow, col: toCol },
-        board: chessBoard
-    });
+        to: { row: toRow, col: toCol }
+    };
+    
+    // Пешка на последней горизонтали становится ферзем
+    if (piece.toLowerCase() === 'p' && (toRow === 0 || toRow === 7)) {
+        move.promotion = 'q';
+    }
+    
+    applyChessMove(move);
+    
+    // Отправляем на сервер только ход
+    sendMove(move, chessBoard);
     
     tg.HapticFeedback.impactOccurred('medium');
 }
 
 function handleChessMove(move) {
-    chessBoard = move.board;
+    applyChessMove(move);
     renderChessBoard();
 }
\ No newline at end of file